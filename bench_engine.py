@@ -0,0 +1,411 @@
+"""
+bench_engine.py
+
+Microbenchmarks for the hot functions in game_engine.py and how they
+scale with the size of the game.
+
+Three sweeps, each varying one dimension with the others at their
+defaults (100 teams, 10 commodities, 1000 trades already recorded):
+
+- teams:        10 .. 10,000
+- commodities:  10 .. 500
+- trades:       100 .. 100,000 (length of the game so far)
+
+For every function and point it reports the time per call (best of
+--repeat timing runs, timeit-style) and the peak memory allocated by one
+call (tracemalloc). For every sweep it fits t ~ n^k on the log-log
+points: k near 0 means the cost does not grow with that dimension, near 1
+means linear.
+
+    python bench_engine.py                        # full sweeps
+    python bench_engine.py --quick                # smaller maxima
+    python bench_engine.py --save base.json       # keep results
+    python bench_engine.py --baseline base.json --threshold 0.25
+
+With --baseline the run exits with status 1 if any function got slower
+than the baseline by more than --threshold (relative) at any point that
+exists in both runs. Points that look slower are measured again first
+(fresh game, best of both), so one noisy timing run does not fail the
+comparison.
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import game_engine
+from game_engine import (
+    Commodity,
+    GameState,
+    Team,
+    apply_round_penalties,
+    compute_net_demand,
+    generate_initial_portfolios_with_ranges,
+    update_prices_from_ratios,
+    update_ratios_auto,
+)
+
+
+DEFAULTS = {"teams": 100, "commodities": 10, "trades": 1000}
+SWEEPS = {
+    "teams": [10, 100, 1000, 10_000],
+    "commodities": [10, 50, 100, 500],
+    "trades": [100, 1000, 10_000, 100_000],
+}
+QUICK_SWEEPS = {
+    "teams": [10, 100, 1000],
+    "commodities": [10, 50, 100],
+    "trades": [100, 1000, 10_000],
+}
+TARGET_VALUE = 2_000_000.0
+
+
+# ---------------------------------------------------------------------
+# Game states
+# ---------------------------------------------------------------------
+
+def new_game(n_teams: int, n_commodities: int) -> GameState:
+    """
+    Fresh game set up like /admin/init_game, before portfolio generation.
+    """
+    rng = random.Random(n_commodities)
+    gs = GameState(max_trades_per_pair=10 ** 9)
+    for i in range(n_commodities):
+        name = f"C{i}"
+        gs.commodities[name] = Commodity(name=name, price=0.0, base_ratio=1 if i == 0 else rng.randint(2, 30))
+    gs.base_commodity = "C0"
+    update_prices_from_ratios(gs)
+    gs.teams = {f"Team {i + 1}": Team(name=f"Team {i + 1}") for i in range(n_teams)}
+    return gs
+
+
+class TradeSource:
+    """
+    Endless valid one-for-one trades between random teams.
+    """
+
+    def __init__(self, gs: GameState, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.teams = list(gs.teams.keys())
+        self.commodities = list(gs.commodities.keys())
+
+    def __call__(self) -> Tuple[str, str, Dict[str, int], Dict[str, int]]:
+        a, b = self.rng.sample(self.teams, 2)
+        give, receive = self.rng.sample(self.commodities, 2)
+        return a, b, {give: 1}, {receive: 1}
+
+
+def build_game(n_teams: int, n_commodities: int, n_trades: int) -> Tuple[GameState, TradeSource]:
+    """
+    Game in round 1 with n_trades recorded, prices updated after each one.
+    """
+    gs = new_game(n_teams, n_commodities)
+    generate_initial_portfolios_with_ranges(gs, TARGET_VALUE)
+    gs.enable_holdings_matrix()
+    gs.start_round("Benchmark")
+    source = TradeSource(gs)
+    for _ in range(n_trades):
+        gs.record_trade(*source())
+        update_ratios_auto(gs)
+        update_prices_from_ratios(gs)
+    return gs, source
+
+
+# ---------------------------------------------------------------------
+# Benchmarked calls
+# ---------------------------------------------------------------------
+# Each case takes (game, trade source, sizes) and returns the callable
+# to time. Cases may mutate the game (it only grows by a few trades).
+
+def case_record_trade(gs, source, sizes):
+    return lambda: gs.record_trade(*source())
+
+
+def case_compute_net_demand(gs, source, sizes):
+    return lambda: compute_net_demand(gs, gs.current_round)
+
+
+def case_update_ratios_auto(gs, source, sizes):
+    return lambda: update_ratios_auto(gs)
+
+
+def case_update_prices_from_ratios(gs, source, sizes):
+    return lambda: update_prices_from_ratios(gs)
+
+
+def case_leaderboard(gs, source, sizes):
+    # As after a trade: two teams changed and the prices moved
+    def call():
+        a, b, _, _ = source()
+        gs.leaderboard_index.mark_teams(a, b)
+        update_prices_from_ratios(gs)
+        return gs.leaderboard()
+    return call
+
+
+def case_leaderboard_full(gs, source, sizes):
+    # Full recompute, as at every round start
+    def call():
+        gs.leaderboard_index.mark_all()
+        return gs.leaderboard()
+    return call
+
+
+def case_apply_round_penalties(gs, source, sizes):
+    return lambda: apply_round_penalties(gs, gs.current_round)
+
+
+def case_generate_portfolios(gs, source, sizes):
+    def call():
+        game_engine._PORTFOLIO_CACHE.clear()  # measure generation, not the cache
+        fresh = new_game(sizes["teams"], sizes["commodities"])
+        return generate_initial_portfolios_with_ranges(fresh, TARGET_VALUE)
+    return call
+
+
+# name -> (case, sweeps it depends on)
+CASES: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {
+    "record_trade": (case_record_trade, ("teams", "commodities", "trades")),
+    "compute_net_demand": (case_compute_net_demand, ("teams", "commodities", "trades")),
+    "update_ratios_auto": (case_update_ratios_auto, ("teams", "commodities", "trades")),
+    "update_prices_from_ratios": (case_update_prices_from_ratios, ("teams", "commodities", "trades")),
+    "leaderboard": (case_leaderboard, ("teams", "commodities", "trades")),
+    "leaderboard_full": (case_leaderboard_full, ("teams", "commodities", "trades")),
+    "apply_round_penalties": (case_apply_round_penalties, ("teams", "commodities", "trades")),
+    "generate_initial_portfolios_with_ranges": (case_generate_portfolios, ("teams", "commodities")),
+}
+
+
+# ---------------------------------------------------------------------
+# Measuring
+# ---------------------------------------------------------------------
+
+def time_per_call(fn: Callable, min_time: float, repeat: int) -> Tuple[float, int]:
+    """
+    Best-of-`repeat` seconds per call; each run loops until min_time.
+    Returns (seconds per call, calls per run).
+    """
+    # Calibrate the loop count like timeit.autorange
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best, number
+
+
+def peak_memory(fn: Callable) -> int:
+    """
+    Peak bytes allocated during one call (tracemalloc; timing is done separately).
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - base)
+
+
+def fit_exponent(points: List[Tuple[int, float]]) -> Optional[float]:
+    """
+    Least-squares slope of log(t) against log(n).
+    """
+    if len(points) < 2:
+        return None
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(max(t, 1e-12)) for _, t in points]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    if var == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+
+
+def run(sweeps: Dict[str, List[int]], functions: List[str], min_time: float,
+        repeat: int, log=print) -> List[Dict[str, Any]]:
+    results = []
+    for axis, values in sweeps.items():
+        names = [f for f in functions if axis in CASES[f][1]]
+        if not names:
+            continue
+        for n in values:
+            sizes = dict(DEFAULTS, **{axis: n})
+            started = time.perf_counter()
+            gs, source = build_game(sizes["teams"], sizes["commodities"], sizes["trades"])
+            log(f"[{axis}={n}] game built in {time.perf_counter() - started:.1f}s")
+            for name in names:
+                fn = CASES[name][0](gs, source, sizes)
+                per_call, calls = time_per_call(fn, min_time, repeat)
+                results.append({
+                    "function": name,
+                    "axis": axis,
+                    "n": n,
+                    "sizes": sizes,
+                    "per_call_s": per_call,
+                    "calls_per_run": calls,
+                    "peak_bytes": peak_memory(fn),
+                })
+    return results
+
+
+def scaling(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Optional[float]]]:
+    fits: Dict[str, Dict[str, Optional[float]]] = {}
+    for r in results:
+        fits.setdefault(r["function"], {}).setdefault(r["axis"], None)
+    for name, axes in fits.items():
+        for axis in axes:
+            points = [(r["n"], r["per_call_s"]) for r in results
+                      if r["function"] == name and r["axis"] == axis]
+            axes[axis] = fit_exponent(points)
+    return fits
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any],
+            threshold: float, min_delta_s: float,
+            remeasure: Optional[Callable[[Dict[str, Any]], float]] = None) -> List[str]:
+    """
+    Regressions: points slower than baseline * (1 + threshold), ignoring
+    absolute differences below min_delta_s (timer noise on tiny calls).
+    remeasure(result) is asked for a second timing of suspect points;
+    the faster of the two counts.
+    """
+    old = {(r["function"], r["axis"], r["n"]): r["per_call_s"] for r in baseline["results"]}
+
+    def regressed(before: float, after: float) -> bool:
+        return after > before * (1 + threshold) and after - before > min_delta_s
+
+    regressions = []
+    for r in results:
+        before = old.get((r["function"], r["axis"], r["n"]))
+        if before is None or not regressed(before, r["per_call_s"]):
+            continue
+        if remeasure is not None:
+            r["per_call_s"] = min(r["per_call_s"], remeasure(r))
+        after = r["per_call_s"]
+        if regressed(before, after):
+            regressions.append(
+                f"{r['function']} [{r['axis']}={r['n']}]: {_fmt_time(before)} -> "
+                f"{_fmt_time(after)} ({after / before - 1:+.0%})"
+            )
+    return regressions
+
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+
+def _fmt_time(seconds: float) -> str:
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:.0f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def print_report(results: List[Dict[str, Any]], fits: Dict[str, Dict[str, Optional[float]]]):
+    for axis in SWEEPS:
+        rows = [r for r in results if r["axis"] == axis]
+        if not rows:
+            continue
+        values = sorted({r["n"] for r in rows})
+        print()
+        print(f"{axis} sweep (time per call / peak KiB per call)")
+        print(f"{'function':42}" + "".join(f"{n:>22,}" for n in values) + f"{'~n^k':>8}")
+        for name in CASES:
+            by_n = {r["n"]: r for r in rows if r["function"] == name}
+            if not by_n:
+                continue
+            cells = "".join(
+                f"{_fmt_time(by_n[n]['per_call_s']) + ' / ' + format(by_n[n]['peak_bytes'] / 1024, '.0f'):>22}"
+                if n in by_n else f"{'-':>22}"
+                for n in values
+            )
+            k = fits[name].get(axis)
+            print(f"{name:42}{cells}{(f'{k:.2f}' if k is not None else '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--quick", action="store_true", help="smaller sweep maxima")
+    parser.add_argument("--axis", action="append", choices=list(SWEEPS),
+                        help="only this sweep (repeatable)")
+    parser.add_argument("--function", action="append", choices=list(CASES),
+                        help="only this function (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per point (best is kept)")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown vs the baseline")
+    parser.add_argument("--min-delta-us", type=float, default=1.0,
+                        help="ignore slowdowns smaller than this (microseconds)")
+    args = parser.parse_args()
+
+    sweeps = QUICK_SWEEPS if args.quick else SWEEPS
+    if args.axis:
+        sweeps = {axis: sweeps[axis] for axis in args.axis}
+    functions = args.function or list(CASES)
+
+    results = run(sweeps, functions, args.min_time, args.repeat)
+    fits = scaling(results)
+    print_report(results, fits)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "numpy": game_engine.np is not None,
+                    "min_time": args.min_time,
+                    "repeat": args.repeat,
+                },
+                "results": results,
+                "scaling": fits,
+            }, f, indent=2)
+        print(f"\nresults written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        def remeasure(r):
+            again = run({r["axis"]: [r["n"]]}, [r["function"]], args.min_time, args.repeat,
+                        log=lambda msg: None)
+            return again[0]["per_call_s"]
+
+        regressions = compare(results, baseline, args.threshold, args.min_delta_us * 1e-6, remeasure)
+        print()
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+bench_replay.py
+
+Benchmark for command-journal crash recovery (see command_journal.py
+and checkpoint.py).
+
+Plays a synthetic event through the server's command functions with the
+journal and checkpoints on, leaving the last round open so the journal
+has a tail after the last checkpoint. Then recovers into a fresh state
+twice, the same way server startup does: once by replaying the whole
+journal, once from the checkpoint plus the tail. Both must rebuild the
+identical state.
+
+    python bench_replay.py --teams 60 --rounds 6 --trades-per-round 500
+
+Everything is written to a temporary directory.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+
+COMMODITIES = [
+    ("Land", 1), ("Gold", 4), ("Oil", 8), ("Wheat", 20), ("Steel", 10),
+    ("Copper", 12), ("Cotton", 25), ("Silver", 6), ("Coal", 30), ("Rice", 18),
+]
+
+
+def state_fingerprint(server) -> str:
+    gs = server.game_state
+    return json.dumps({
+        "holdings": {tname: dict(t.holdings) for tname, t in gs.teams.items()},
+        "prices": {cname: c.price for cname, c in gs.commodities.items()},
+        "ratios": {cname: c.base_ratio for cname, c in gs.commodities.items()},
+        "penalties": gs.penalties_rs,
+        "round": gs.current_round,
+        "trades": len(gs.trades),
+        "price_history": server.price_history.as_columns(),
+        "trade_counter": server.global_trade_counter,
+        "ended_rounds": sorted(server.ended_rounds),
+    }, sort_keys=True)
+
+
+def play_round(server, rng: random.Random, names: List[str], cnames: List[str],
+               n_trades: int) -> int:
+    applied = 0
+    pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+    rng.shuffle(pairs)
+    for a, b in pairs[:n_trades]:
+        give, receive = rng.sample(cnames, 2)
+        req = server.TradeRequest(
+            from_team=a, to_team=b,
+            give=[{"commodity": give, "qty": rng.randint(1, 5)}],
+            receive=[{"commodity": receive, "qty": rng.randint(1, 5)}],
+        )
+        try:
+            server.run_command(server.CMD_TRADE, req)
+            applied += 1
+        except server.HTTPException:
+            pass  # rejected trades are not journaled
+    return applied
+
+
+def play_event(server, n_teams: int, n_rounds: int, trades_per_round: int,
+               tail_trades: int, seed: int) -> int:
+    rng = random.Random(seed)
+    server.run_command(server.CMD_INIT_GAME, server.InitGameRequest(
+        commodities=[{"name": n, "ratio": r} for n, r in COMMODITIES],
+        base_commodity="Land",
+        num_teams=n_teams,
+        target_value_hint=2_000_000,
+    ))
+    names = list(server.game_state.teams.keys())
+    cnames = [n for n, _ in COMMODITIES]
+
+    applied = 0
+    for rnd in range(1, n_rounds + 1):
+        server.run_command(server.CMD_START_ROUND, server.StartRoundRequest(news=f"Round {rnd}"))
+        applied += play_round(server, rng, names, cnames, trades_per_round)
+        server.run_command(server.CMD_END_ROUND)
+
+    # Open round: these commands are only in the journal tail
+    server.run_command(server.CMD_START_ROUND, server.StartRoundRequest(news="Open round"))
+    applied += play_round(server, rng, names, cnames, tail_trades)
+    return applied
+
+
+def reset_process_state(server):
+    """
+    Drop everything a restarted server would not have.
+    """
+    server.command_journal.close()
+    server.command_journal = None
+    server.excel_logger.close()
+    server.excel_logger = None
+    server.game_state = None
+    server.state_snapshot = None
+    server.ended_rounds.clear()
+
+
+def recover(server, use_checkpoint: bool) -> Dict[str, Any]:
+    reset_process_state(server)
+    path = server.CHECKPOINT_PATH
+    if not use_checkpoint:
+        server.CHECKPOINT_PATH = ""
+    try:
+        server.recover_from_journal()
+    finally:
+        server.CHECKPOINT_PATH = path
+    return server.last_replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--teams", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--trades-per-round", type=int, default=500)
+    parser.add_argument("--tail-trades", type=int, default=200,
+                        help="trades in the final, still open round")
+    parser.add_argument("--checkpoint-every", type=int, default=500,
+                        help="commands between checkpoints (plus every round end)")
+    parser.add_argument("--fsync-every", type=int, default=0,
+                        help="journal fsync batching while playing (0 = never)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="barter_replay_")
+    os.chdir(workdir)
+    os.environ["BARTER_JOURNAL"] = os.path.join(workdir, "commands.jsonl")
+    os.environ["BARTER_JOURNAL_FSYNC_EVERY"] = str(args.fsync_every)
+    os.environ["BARTER_CHECKPOINT"] = os.path.join(workdir, "checkpoint.bin")
+    os.environ["BARTER_CHECKPOINT_EVERY"] = str(args.checkpoint_every)
+
+    import server
+
+    started = time.perf_counter()
+    applied = play_event(server, args.teams, args.rounds, args.trades_per_round,
+                         args.tail_trades, args.seed)
+    play_s = time.perf_counter() - started
+    server.command_journal.sync()
+    server.checkpoint_writer.wait_idle()
+    expected = state_fingerprint(server)
+    journal_bytes = os.path.getsize(server.JOURNAL_PATH)
+    checkpoint = server.checkpoint_writer.stats()
+
+    # Capture cost under state_lock (what each checkpoint adds to a command)
+    with server.state_lock:
+        started = time.perf_counter()
+        server.capture_checkpoint(server.game_state, server.state_snapshot, meta={})
+        capture_s = time.perf_counter() - started
+    server.checkpoint_writer.close()
+    server.checkpoint_writer = None
+
+    full = recover(server, use_checkpoint=False)
+    full_identical = state_fingerprint(server) == expected
+    tail = recover(server, use_checkpoint=True)
+    tail_identical = state_fingerprint(server) == expected
+    server.excel_logger.close()
+    server.command_journal.close()
+
+    print(f"teams={args.teams} rounds={args.rounds} trades applied={applied}")
+    print(f"journal: {full['records']} commands, {journal_bytes / 1024:.1f} KiB")
+    print(f"checkpoint: {checkpoint['checkpoints_written']} written, last at seq "
+          f"{checkpoint['journal_seq']}, {checkpoint['size_bytes'] / 1024:.1f} KiB, "
+          f"write {checkpoint['last_write_duration_s'] * 1e3:.1f} ms (background, incl. Excel flush), "
+          f"capture {capture_s * 1e3:.2f} ms (under lock)")
+    print(f"live play:         {play_s:.3f}s")
+    print(f"full replay:       {full['duration_s']:.3f}s "
+          f"({full['duration_s'] / max(1, full['records']) * 1e6:.1f} us/command)")
+    print(f"checkpoint + tail: {tail['duration_s']:.3f}s "
+          f"(load {tail['checkpoint_load_s']:.3f}s, {tail['replayed']} commands replayed)")
+    print(f"state identical: full replay {full_identical}, checkpoint + tail {tail_identical}")
+    print(f"work dir: {workdir}")
+    if not (full_identical and tail_identical) or full["failed"] or tail["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ chart_console.py
 Standalone live market chart viewer for Barter Charter.
 
 - Connects to the FastAPI server's /state/prices endpoint.
+- Keeps a local copy of the history and only asks for new points
+  (/state/prices?since=<last seen trade_index>) after the first poll.
 - Plots ALL commodities (dynamic) as:
     * 3 charts per row
     * Each chart fairly big & square-ish
@@ -40,24 +42,59 @@ FIG_HEIGHT_PER_ROW = 3.5  # height per row (inches)
 # Helper functions
 # -------------------------------------------------------------------
 
+# path without query -> (ETag, parsed body) of its last 200 response.
+# One entry per endpoint: ?since= changes every poll, and the ETag names
+# the server state, not the query.
+_etag_cache = {}
+
+
+def _cache_key(path: str) -> str:
+    return path.partition("?")[0]
+
+
 def api_get(path: str):
     """
     Simple GET wrapper that also adds ngrok header if needed.
+    Sends If-None-Match with the endpoint's last ETag (whatever the query);
+    on 304 Not Modified the server state has not changed since that
+    response, and its cached body is returned.
     """
     url = f"{SERVER_URL}{path}"
     headers = {}
     if "ngrok-free" in SERVER_URL:
         headers["ngrok-skip-browser-warning"] = "true"
+    key = _cache_key(path)
+    cached = _etag_cache.get(key)
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
 
     try:
         r = requests.get(url, headers=headers, timeout=5)
+        if r.status_code == 304 and cached is not None:
+            return cached[1]
         r.raise_for_status()
-        return r.json()
+        data = r.json()
+        etag = r.headers.get("ETag")
+        if etag:
+            _etag_cache[key] = (etag, data)
+        return data
     except Exception as e:
         print(f"[chart_console] GET {path} error:", e)
         return {"error": str(e)}
 
 
+def response_epoch(path: str):
+    """
+    Game epoch of the last response for path's endpoint, from its ETag
+    (W/"<epoch>-<version>"); None if the server sent no ETag.
+    """
+    cached = _etag_cache.get(_cache_key(path))
+    if cached is None:
+        return None
+    epoch, _, _ = cached[0].removeprefix("W/").strip('"').rpartition("-")
+    return epoch or None
+
+
 # -------------------------------------------------------------------
 # Tkinter App
 # -------------------------------------------------------------------
@@ -123,6 +160,11 @@ class MarketChartsApp:
         )
         self.status_lbl.pack(anchor="ne", padx=10, pady=(0, 5))
 
+        # Local price history, extended with deltas from the server
+        self.price_history = {}
+        self.last_trade_index = None
+        self.epoch = None
+
         # Background refresh loop
         self.running = True
         t = threading.Thread(target=self.refresh_loop, daemon=True)
@@ -144,12 +186,49 @@ class MarketChartsApp:
     # Core refresh function
     # -----------------------------------------------------------------
 
-    def refresh_charts(self):
-        data = api_get("/state/prices")
+    def fetch_prices(self):
+        """
+        Update self.price_history with only the points we have not seen.
+        Falls back to a full fetch on first use or if a new game started
+        (the game epoch in the ETag changed, or the high-water mark went
+        backwards).
+        """
+        if self.last_trade_index is None:
+            path = "/state/prices"
+        else:
+            path = f"/state/prices?since={self.last_trade_index}"
+        data = api_get(path)
         if "error" in data:
+            return False
+
+        last = data.get("last_trade_index")
+        epoch = response_epoch(path)
+        if self.last_trade_index is not None and (
+                epoch != self.epoch or last is None or last < self.last_trade_index):
+            # New game on the server: start over
+            self.last_trade_index = None
+            self.price_history = {}
+            return self.fetch_prices()
+        if last == self.last_trade_index:
+            # Nothing new (or a 304: the body is the one already applied)
+            return True
+
+        new_points = data.get("price_history", {})
+        if data.get("since") is None:
+            # Copy: the series are extended in place, api_get may reuse the body
+            self.price_history = {cname: list(series) for cname, series in new_points.items()}
+        else:
+            for cname, series in new_points.items():
+                self.price_history.setdefault(cname, []).extend(series)
+        self.last_trade_index = last
+        self.epoch = epoch
+        return True
+
+    def refresh_charts(self):
+        if not self.fetch_prices():
             return
 
-        ph = data.get("price_history", {})
+        ph = self.price_history
         if not ph:
             return
 
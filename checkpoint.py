@@ -0,0 +1,383 @@
+"""
+checkpoint.py
+
+Compact, versioned binary checkpoints of a Barter Charter game.
+
+A checkpoint holds the GameState plus the server-side price history,
+trade counter and ended rounds, and the command-journal position it
+covers. Restart loads the newest checkpoint and replays only the
+journal records after that position (see server.recover_from_journal).
+
+File layout (all integers little-endian):
+
+    8 bytes   MAGIC
+    u32       FORMAT_VERSION
+    u64       header length
+    header    UTF-8 JSON: scalars, names, penalties, and the block table
+    blocks    zlib-compressed raw arrays (holdings matrix, trade log
+              columns, price history columns), in block-table order
+
+Taking a checkpoint is split in two:
+
+- capture_checkpoint(): called under state_lock. It only copies a few
+  small things and keeps references to the latest StateSnapshot (which
+  is immutable) and the append-only trade log / price history, with
+  their row-count watermarks.
+- write_checkpoint(): encodes and writes the file (temp file + fsync +
+  atomic rename). Runs on CheckpointWriter's thread, without the lock.
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from game_engine import (
+    Commodity,
+    GameState,
+    PenaltyBreakdown,
+    RoundInfo,
+    Team,
+    TradeLog,
+)
+from price_history import PriceHistory
+from state_snapshot import StateSnapshot
+
+
+MAGIC = b"BCCKPT\x00\x01"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sIQ")
+
+
+@dataclass
+class CheckpointData:
+    """
+    Everything needed to write one checkpoint, captured under the lock.
+    """
+    snapshot: StateSnapshot
+    rounds: List[List[Any]]
+    round_open_ratios: Dict[str, int]
+    max_trades_per_pair: int
+    meta: Dict[str, Any]
+
+
+@dataclass
+class LoadedCheckpoint:
+    game_state: GameState
+    price_history: PriceHistory
+    meta: Dict[str, Any]
+
+
+def capture_checkpoint(gs: GameState, snapshot: StateSnapshot,
+                       meta: Dict[str, Any]) -> CheckpointData:
+    """
+    Cheap capture (call under the state lock, right after publishing
+    `snapshot`). meta holds server-side values such as the journal
+    position, trade counter and ended rounds; it must be JSON-serializable.
+    """
+    return CheckpointData(
+        snapshot=snapshot,
+        rounds=[[r.round_no, r.news] for r in gs.rounds],
+        round_open_ratios=dict(getattr(gs, "round_open_ratios", None) or {}),
+        max_trades_per_pair=gs.max_trades_per_pair,
+        meta=dict(meta),
+    )
+
+
+# ---------------------------------------------------------------------
+# ENCODE / DECODE
+# ---------------------------------------------------------------------
+
+def _le_bytes(arr: array) -> bytes:
+    if sys.byteorder != "little" and arr.itemsize > 1:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_le_bytes(typecode: str, data: bytes) -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder != "little" and arr.itemsize > 1:
+        arr.byteswap()
+    return arr
+
+
+def encode_checkpoint(data: CheckpointData, level: int = 1) -> bytes:
+    snap = data.snapshot
+    team_names = list(snap.teams.keys())
+    commodity_names = list(snap.commodities.keys())
+
+    blocks: List[tuple] = []  # (name, array)
+
+    holdings = array("q")
+    for tname in team_names:
+        h = snap.teams[tname].holdings
+        holdings.extend(int(h.get(cname, 0)) for cname in commodity_names)
+    blocks.append(("holdings", holdings))
+
+    trades = snap.trades
+    for name, col in trades.columns(stop=snap.trade_count).items():
+        blocks.append(("trades." + name, col))
+
+    ph = snap.price_history
+    stop = snap.price_rows
+    blocks.append(("prices.trade_index", ph.trade_index[:stop]))
+    blocks.append(("prices.round_no", ph.round_no[:stop]))
+    price_names = list(ph.prices.keys())
+    for cname in price_names:
+        blocks.append(("prices." + cname, ph.prices[cname][:stop]))
+
+    payloads = [zlib.compress(_le_bytes(arr), level) for _, arr in blocks]
+
+    header = {
+        "meta": data.meta,
+        "version": snap.version,
+        "current_round": snap.current_round,
+        "base_commodity": snap.base_commodity,
+        "max_trades_per_pair": data.max_trades_per_pair,
+        "commodities": [dict(vars(snap.commodities[cname])) for cname in commodity_names],
+        "teams": team_names,
+        "rounds": data.rounds,
+        "round_open_ratios": data.round_open_ratios,
+        "penalties_rs": snap.penalties_rs,
+        "penalty_history": [
+            [round_no, [asdict(e) for e in entries.values()]]
+            for round_no, entries in snap.penalty_history.items()
+        ],
+        "trade_team_names": list(trades.team_names),
+        "trade_commodity_names": list(trades.commodity_names),
+        "price_commodities": price_names,
+        "blocks": [
+            {"name": name, "type": arr.typecode, "count": len(arr), "size": len(payload)}
+            for (name, arr), payload in zip(blocks, payloads)
+        ],
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return b"".join(
+        [_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)), header_bytes] + payloads
+    )
+
+
+def decode_checkpoint(raw: bytes) -> LoadedCheckpoint:
+    """
+    Rebuild GameState / PriceHistory from encode_checkpoint() output.
+    Raises ValueError for foreign, truncated or newer-format files.
+    """
+    if len(raw) < _PREFIX.size:
+        raise ValueError("Checkpoint is truncated.")
+    magic, version, header_len = _PREFIX.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a Barter Charter checkpoint.")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Checkpoint format {version} is newer than supported ({FORMAT_VERSION}).")
+    pos = _PREFIX.size
+    header = json.loads(raw[pos:pos + header_len])
+    pos += header_len
+
+    arrays: Dict[str, array] = {}
+    for block in header["blocks"]:
+        end = pos + block["size"]
+        if end > len(raw):
+            raise ValueError("Checkpoint is truncated.")
+        arr = _from_le_bytes(block["type"], zlib.decompress(raw[pos:end]))
+        if len(arr) != block["count"]:
+            raise ValueError(f"Checkpoint block {block['name']} is corrupt.")
+        arrays[block["name"]] = arr
+        pos = end
+
+    gs = GameState(max_trades_per_pair=header["max_trades_per_pair"])
+    for fields in header["commodities"]:
+        c = Commodity.__new__(Commodity)
+        c.__dict__.update(fields)
+        gs.commodities[c.name] = c
+    gs.base_commodity = header["base_commodity"]
+    gs.current_round = header["current_round"]
+    gs.rounds = [RoundInfo(round_no=r, news=news) for r, news in header["rounds"]]
+    if header["round_open_ratios"]:
+        gs.round_open_ratios = header["round_open_ratios"]
+
+    commodity_names = list(gs.commodities.keys())
+    holdings = arrays["holdings"]
+    n_c = len(commodity_names)
+    for i, tname in enumerate(header["teams"]):
+        row = holdings[i * n_c:(i + 1) * n_c].tolist()
+        gs.teams[tname] = Team(name=tname, holdings=dict(zip(commodity_names, row)))
+
+    gs.penalties_rs = dict(header["penalties_rs"])
+    gs.penalty_history = {
+        round_no: {e["team"]: PenaltyBreakdown(**e) for e in entries}
+        for round_no, entries in header["penalty_history"]
+    }
+
+    gs.trades = TradeLog.from_columns(
+        header["trade_team_names"],
+        header["trade_commodity_names"],
+        {name[len("trades."):]: arr for name, arr in arrays.items() if name.startswith("trades.")},
+    )
+    gs.rebuild_indexes()
+    gs.leaderboard_index.mark_all()
+    gs.version = header["version"]
+
+    ph = PriceHistory(header["price_commodities"])
+    ph.trade_index = arrays["prices.trade_index"]
+    ph.round_no = arrays["prices.round_no"]
+    for cname in header["price_commodities"]:
+        ph.prices[cname] = arrays["prices." + cname]
+
+    return LoadedCheckpoint(game_state=gs, price_history=ph, meta=header["meta"])
+
+
+# ---------------------------------------------------------------------
+# FILES
+# ---------------------------------------------------------------------
+
+def write_checkpoint(path: str, data: CheckpointData) -> int:
+    """
+    Encode and atomically replace `path`. Returns the file size.
+    """
+    raw = encode_checkpoint(data)
+    os.replace(_write_tmp(path, raw), path)
+    return len(raw)
+
+
+def _write_tmp(path: str, raw: bytes) -> str:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+
+def load_checkpoint(path: str) -> LoadedCheckpoint:
+    with open(path, "rb") as f:
+        return decode_checkpoint(f.read())
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints on a background thread.
+
+    submit() never blocks: if a write is already pending, the newer
+    capture replaces it (only the latest state matters). before_write
+    (e.g. flushing the Excel writer) runs on the writer thread too.
+    discard() drops pending work and deletes the file (new game); a
+    write that was in flight is thrown away instead of renamed into place.
+    """
+
+    def __init__(self, path: str, before_write: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.before_write = before_write
+        self._cond = threading.Condition()
+        self._pending: Optional[CheckpointData] = None
+        self._generation = 0
+        self._busy = False
+        self._closed = False
+
+        self.checkpoints_written = 0
+        self.last_journal_seq: Optional[int] = None
+        self.last_size_bytes = 0
+        self.last_write_duration_s = 0.0
+        self.last_written_ts: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, data: CheckpointData):
+        with self._cond:
+            if self._closed:
+                return
+            self._pending = data
+            self._cond.notify_all()
+
+    def discard(self):
+        with self._cond:
+            self._pending = None
+            self._generation += 1
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until nothing is pending or being written.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending is not None or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                data, self._pending = self._pending, None
+                generation = self._generation
+                self._busy = True
+            try:
+                self._write(data, generation)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, data: CheckpointData, generation: int):
+        started = time.perf_counter()
+        try:
+            if self.before_write is not None:
+                self.before_write()
+            raw = encode_checkpoint(data)
+            tmp = _write_tmp(self.path, raw)
+            with self._cond:
+                if generation != self._generation:
+                    os.remove(tmp)  # game was reset meanwhile
+                    return
+                os.replace(tmp, self.path)
+        except Exception as e:  # keep the thread alive; report via stats()
+            self.last_error = f"{type(e).__name__}: {e}"
+            return
+        self.checkpoints_written += 1
+        self.last_journal_seq = data.meta.get("journal_seq")
+        self.last_size_bytes = len(raw)
+        self.last_write_duration_s = time.perf_counter() - started
+        self.last_written_ts = time.time()
+        self.last_error = None
+
+    def close(self, timeout: float = 30.0):
+        self.wait_idle(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = self._pending is not None or self._busy
+        return {
+            "path": self.path,
+            "checkpoints_written": self.checkpoints_written,
+            "journal_seq": self.last_journal_seq,
+            "size_bytes": self.last_size_bytes,
+            "last_write_duration_s": self.last_write_duration_s,
+            "seconds_since_last_write": (
+                time.time() - self.last_written_ts if self.last_written_ts else None
+            ),
+            "write_pending": pending,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,231 @@
+"""
+command_journal.py
+
+Write-ahead journal of the commands that change Barter Charter state.
+
+Every mutating request (init_game, round start/end, trade, trade batch)
+is appended as one JSON line before the server acknowledges it:
+
+    {"seq": 17, "ts": 1760612345.12, "cmd": "trade", "args": {...request body...}}
+
+The engine is deterministic (portfolio generation is seeded from the game
+config, repricing depends only on the trades), so replaying the commands
+in order through the same code rebuilds exactly the same state:
+holdings, prices, price history, penalties, ended rounds.
+
+Durability is configurable:
+
+- fsync_every = 1   fsync after every command (nothing acknowledged is lost)
+- fsync_every = N   fsync after N commands, or after fsync_interval_s at
+                    the latest (background thread); a crash can lose at
+                    most that window
+- fsync_every = 0   never fsync explicitly; the OS decides
+
+Every line is written and flushed to the OS before append() returns,
+so a crash of the server process alone (not the machine) never loses
+an acknowledged command.
+
+A crash in the middle of a write leaves a torn last line; read_records()
+stops at the last complete line and truncate_torn_tail() cuts the rest.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CommandJournal:
+    """
+    Append-only JSON-lines command log with batched fsync.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 1, fsync_interval_s: float = 0.05):
+        if fsync_every < 0:
+            raise ValueError("fsync_every must be >= 0")
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+
+        self._lock = threading.Lock()
+        self._f = open(path, "ab")
+        # seq of the last record, and ts of the first one (identifies this
+        # game's journal, e.g. to match checkpoints against it)
+        self._seq, self._first_ts = _journal_bounds(path)
+        self._pending = 0          # written but not yet fsynced
+        self._oldest_pending: Optional[float] = None
+
+        self.records_written = 0
+        self.fsyncs = 0
+        self.last_fsync_duration_s = 0.0
+        self.last_error: Optional[str] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if fsync_every > 1 and fsync_interval_s > 0:
+            self._thread = threading.Thread(
+                target=self._sync_loop, name="command-journal-fsync", daemon=True
+            )
+            self._thread.start()
+
+    # -----------------------------------------------------
+    # Writing
+    # -----------------------------------------------------
+
+    def append(self, command: str, args: Dict[str, Any]) -> int:
+        """
+        Append one command and return its sequence number.
+        The line is flushed to the OS before returning; fsync follows
+        the fsync_every policy. Raises OSError if the write fails.
+        """
+        with self._lock:
+            seq = self._seq + 1
+            ts = time.time()
+            line = json.dumps(
+                {"seq": seq, "ts": ts, "cmd": command, "args": args},
+                separators=(",", ":"),
+            )
+            self._f.write(line.encode("utf-8") + b"\n")
+            self._f.flush()
+            self._seq = seq
+            if self._first_ts is None:
+                self._first_ts = ts
+            self.records_written += 1
+
+            self._pending += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            if self.fsync_every and self._pending >= self.fsync_every:
+                self._fsync_locked()
+            return seq
+
+    def reset(self):
+        """
+        Start an empty journal (a new game replaces the old one).
+        """
+        with self._lock:
+            self._f.seek(0)
+            self._f.truncate()
+            self._seq = 0
+            self._first_ts = None
+            self._fsync_locked()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def first_ts(self) -> Optional[float]:
+        return self._first_ts
+
+    def sync(self):
+        """
+        fsync everything written so far.
+        """
+        with self._lock:
+            if self._pending:
+                self._fsync_locked()
+
+    def _fsync_locked(self):
+        started = time.perf_counter()
+        try:
+            os.fsync(self._f.fileno())
+        except OSError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        self.last_fsync_duration_s = time.perf_counter() - started
+        self.fsyncs += 1
+        self._pending = 0
+        self._oldest_pending = None
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval_s):
+            with self._lock:
+                if (self._pending and self._oldest_pending is not None
+                        and time.monotonic() - self._oldest_pending >= self.fsync_interval_s):
+                    try:
+                        self._fsync_locked()
+                    except OSError:
+                        pass  # recorded in last_error, retried next tick
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        with self._lock:
+            if self._f.closed:
+                return
+            if self._pending:
+                self._fsync_locked()
+            self._f.close()
+
+    # -----------------------------------------------------
+    # Introspection
+    # -----------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = self._oldest_pending
+            return {
+                "path": self.path,
+                "last_seq": self._seq,
+                "records_written": self.records_written,
+                "unsynced_records": self._pending,
+                "unsynced_age_s": (time.monotonic() - oldest) if oldest is not None else 0.0,
+                "fsync_every": self.fsync_every,
+                "fsync_interval_s": self.fsync_interval_s,
+                "fsyncs": self.fsyncs,
+                "last_fsync_duration_s": self.last_fsync_duration_s,
+                "last_error": self.last_error,
+            }
+
+
+# ---------------------------------------------------------------------
+# READING
+# ---------------------------------------------------------------------
+
+def read_records(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    All complete records in the journal, plus the byte length of the
+    part that holds them (anything after it is a torn write).
+    """
+    records: List[Dict[str, Any]] = []
+    good_bytes = 0
+    if not os.path.exists(path):
+        return records, good_bytes
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos < len(data):
+        end = data.find(b"\n", pos)
+        if end < 0:
+            break  # no newline: torn last line
+        try:
+            records.append(json.loads(data[pos:end]))
+        except ValueError:
+            break
+        pos = end + 1
+        good_bytes = pos
+    return records, good_bytes
+
+
+def truncate_torn_tail(path: str, good_bytes: int) -> bool:
+    """
+    Cut a torn last line so new records start on a clean line.
+    Returns True if anything was cut.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) <= good_bytes:
+        return False
+    with open(path, "r+b") as f:
+        f.truncate(good_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def _journal_bounds(path: str) -> Tuple[int, Optional[float]]:
+    records, _ = read_records(path)
+    if not records:
+        return 0, None
+    return records[-1]["seq"], records[0]["ts"]
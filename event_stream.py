@@ -0,0 +1,165 @@
+"""
+event_stream.py
+
+Push stream of game events (trades, price ticks, rounds, penalties) for
+live viewers, served as Server-Sent Events by server.py (/stream).
+
+Design:
+- ONE EventBroadcaster per server. publish() is called from request
+  handlers (worker threads, usually under state_lock); it only appends
+  to a bounded ring buffer and wakes waiting subscribers, so it never
+  blocks on a slow client.
+- Every event has a sequence number. A subscriber reads everything after
+  the last number it has seen, so reconnecting with Last-Event-ID (or
+  ?since=) resumes without gaps while the events are still buffered.
+- Slow consumers: if a subscriber falls more than `coalesce_threshold`
+  events behind, price ticks in its backlog are collapsed to the latest
+  one (each tick carries every price). If it falls out of the buffer
+  entirely it gets a "resync" event and should reload state over REST.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+
+# Event types
+EVENT_GAME_INIT = "game_init"
+EVENT_TRADE = "trade"
+EVENT_PRICE = "price"
+EVENT_ROUND_START = "round_start"
+EVENT_ROUND_END = "round_end"
+EVENT_PENALTIES = "penalties"
+EVENT_RESYNC = "resync"
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    seq: int
+    type: str
+    data: Dict[str, Any]
+
+    def to_sse(self) -> str:
+        payload = json.dumps(self.data, separators=(",", ":"))
+        return f"id: {self.seq}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Thread-safe fan-out of StreamEvents to any number of asyncio subscribers.
+    """
+
+    def __init__(self, buffer_size: int = 10_000, coalesce_threshold: int = 500):
+        self.buffer_size = buffer_size
+        self.coalesce_threshold = coalesce_threshold
+        self._lock = threading.Lock()
+        self._events: "deque[StreamEvent]" = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._waiters)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        """
+        Append an event and wake subscribers. Safe to call from any thread.
+        """
+        with self._lock:
+            self._seq += 1
+            self._events.append(StreamEvent(self._seq, event_type, data))
+            waiters = list(self._waiters)
+            seq = self._seq
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # loop already closed
+                pass
+        return seq
+
+    def events_after(self, seq: int) -> Tuple[List[StreamEvent], bool]:
+        """
+        Buffered events with sequence number > seq, and whether some
+        events after seq were already dropped from the buffer.
+        """
+        with self._lock:
+            if not self._events or seq >= self._seq:
+                return [], False
+            first = self._events[0].seq
+            gap = seq + 1 < first
+            skip = max(0, seq + 1 - first)
+            return [self._events[i] for i in range(skip, len(self._events))], gap
+
+    def _coalesce(self, events: List[StreamEvent]) -> List[StreamEvent]:
+        last_price = None
+        for ev in events:
+            if ev.type == EVENT_PRICE:
+                last_price = ev
+        return [ev for ev in events if ev.type != EVENT_PRICE or ev is last_price]
+
+    async def subscribe(self, since: Optional[int] = None,
+                        heartbeat_s: float = 15.0) -> AsyncIterator[List[StreamEvent]]:
+        """
+        Yield batches of events after `since` (default: only new events).
+        Yields an empty list every heartbeat_s seconds while idle so the
+        caller can send a keep-alive.
+        """
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        waiter = (loop, wake)
+        with self._lock:
+            self._waiters.add(waiter)
+            current = self._seq
+        last = current if since is None else since
+        try:
+            if last > current:
+                # Id from another server run / game: start from now
+                last = current
+                yield [StreamEvent(current, EVENT_RESYNC,
+                                   {"reason": "unknown event id, restarting from the latest event"})]
+            while True:
+                wake.clear()
+                batch, gap = self.events_after(last)
+                if gap:
+                    # id = seq before the oldest buffered event, so resuming
+                    # from it continues with what is still available
+                    yield [StreamEvent(batch[0].seq - 1, EVENT_RESYNC,
+                                       {"reason": "missed events were dropped from the buffer"})]
+                if batch:
+                    last = batch[-1].seq
+                    if len(batch) > self.coalesce_threshold:
+                        batch = self._coalesce(batch)
+                    yield batch
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield []
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+async def sse_stream(broadcaster: EventBroadcaster, since: Optional[int] = None,
+                     types: Optional[Set[str]] = None) -> AsyncIterator[str]:
+    """
+    Server-Sent Events text for one client (see EventBroadcaster.subscribe).
+    """
+    yield f"retry: 3000\n: connected, last_seq={broadcaster.last_seq}\n\n"
+    async for batch in broadcaster.subscribe(since):
+        if not batch:
+            yield ": keep-alive\n\n"
+            continue
+        chunk = "".join(
+            ev.to_sse() for ev in batch
+            if types is None or ev.type in types or ev.type == EVENT_RESYNC
+        )
+        if chunk:
+            yield chunk
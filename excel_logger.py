@@ -3,7 +3,7 @@ excel_logger.py
 
 Excel logging for the Barter Charter simulation using openpyxl.
 
-Creates and maintains an Excel file with three sheets:
+Produces an Excel file with three sheets:
 
 1) Commodities
    - Round
@@ -29,101 +29,242 @@ Creates and maintains an Excel file with three sheets:
    - TotalValueRs
    - TotalValueBaseUnits
    - <CommodityName>_units (one column per commodity)
+
+Rows are first appended to an append-only journal (one JSON-lines file
+per sheet), which costs the same for every event no matter how long the
+game runs. materialize() builds the .xlsx from the journal with
+openpyxl's write-only mode, on demand or at round end.
+
+AsyncExcelWriter wraps an ExcelLogger in a background thread so request
+handlers only enqueue rows; journal flushes are coalesced.
 """
 
-from typing import Dict
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
 from openpyxl import Workbook
 
 from game_engine import Commodity, GameState
 
 
+COMMODITIES_HEADER = ["Round", "Commodity", "PriceRs", "RatioVsBase", "MinUnits", "MaxUnits"]
+TRADES_HEADER = [
+    "TradeID", "Round", "FromTeam", "ToTeam",
+    "GiveCommodity", "GiveQty", "ReceiveCommodity", "ReceiveQty"
+]
+PORTFOLIOS_HEADER = ["Round", "Team", "TotalValueRs", "TotalValueBaseUnits"]
+
+SHEETS = ("Commodities", "Trades", "Portfolios")
+
+# Unique key of a journal row, per sheet
+_ROW_KEYS = {
+    "Commodities": lambda row: (row[0], row[1]),   # Round, Commodity
+    "Trades": lambda row: row[0],                  # TradeID
+    "Portfolios": lambda row: (row[0], row[1]),    # Round, Team
+}
+
+
+def _cut_torn_tail(path: str):
+    """
+    Drop an incomplete last line (crash mid-write) from a journal file.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+
+
 class ExcelLogger:
     """
-    Excel logger using openpyxl.
+    Journal-backed Excel logger.
+
+    Each log_* call appends JSON-array lines to <journal_dir>/<Sheet>.jsonl.
+    Portfolio rows keep their holdings as a {commodity: units} object, so
+    the <CommodityName>_units columns can be laid out at materialize time.
 
     Usage pattern:
         logger = ExcelLogger("barter_charter.xlsx")
         logger.log_commodities(game_state.commodities, round_no=0)
         logger.log_portfolios_round(game_state)
         logger.log_trade(trade)
+        logger.materialize()   # writes barter_charter.xlsx
+
+    resume=True keeps the existing journal (restart from a checkpoint).
+    Rows replayed after the checkpoint may then be logged twice; the
+    journal is keyed (TradeID; Round + Commodity / Team), and
+    materialize() keeps only the first row per key.
     """
 
-    def __init__(self, filename: str = "barter_charter.xlsx"):
+    def __init__(self, filename: str = "barter_charter.xlsx", autosave: bool = True,
+                 journal_dir: Optional[str] = None, resume: bool = False):
         self.filename = filename
-        self.wb = Workbook()
-
-        # Create sheets
-        self.sheet_commodities = self.wb.active
-        self.sheet_commodities.title = "Commodities"
-        self.sheet_trades = self.wb.create_sheet("Trades")
-        self.sheet_portfolios = self.wb.create_sheet("Portfolios")
-
-        # Headers for Commodities sheet
-        self.sheet_commodities.append(
-            ["Round", "Commodity", "PriceRs", "RatioVsBase", "MinUnits", "MaxUnits"]
-        )
-
-        # Headers for Trades sheet
-        self.sheet_trades.append([
-            "TradeID", "Round", "FromTeam", "ToTeam",
-            "GiveCommodity", "GiveQty", "ReceiveCommodity", "ReceiveQty"
-        ])
-
-        # Headers for Portfolios sheet
-        self.sheet_portfolios.append(["Round", "Team", "TotalValueRs", "TotalValueBaseUnits"])
+        # When False, callers decide when to save() (see AsyncExcelWriter)
+        self.autosave = autosave
+        if journal_dir is None:
+            journal_dir = os.path.splitext(filename)[0] + "_journal"
+        self.journal_dir = journal_dir
+        os.makedirs(self.journal_dir, exist_ok=True)
+
+        # A new logger starts a new game: truncate any previous journal
+        # (unless resuming, where only a torn last line is cut)
+        if resume:
+            for sheet in SHEETS:
+                _cut_torn_tail(self.journal_path(sheet))
+        self._files = {
+            sheet: open(self.journal_path(sheet), "a" if resume else "w",
+                        encoding="utf-8", newline="\n")
+            for sheet in SHEETS
+        }
 
         # Internal counter for TradeID
         self.trade_counter = 0
 
-        # Save initial empty structure
-        self.save()
+        # Write the initial empty structure (a resumed journal already
+        # has its workbook; materialize() rebuilds it later)
+        if not resume:
+            self.materialize()
+
+    def journal_path(self, sheet: str) -> str:
+        return os.path.join(self.journal_dir, f"{sheet}.jsonl")
 
     # -----------------------------------------------------
-    # Core helper
+    # Core helpers
     # -----------------------------------------------------
 
+    def _append(self, sheet: str, rows: List[list]):
+        f = self._files[sheet]
+        for row in rows:
+            f.write(json.dumps(row, separators=(",", ":")))
+            f.write("\n")
+        self._autosave()
+
     def save(self):
         """
-        Save the workbook to disk.
+        Flush the journal files to disk (cheap; does not rebuild the .xlsx).
+        """
+        for f in self._files.values():
+            f.flush()
+
+    def _autosave(self):
+        if self.autosave:
+            self.save()
+
+    def close(self):
+        self.save()
+        for f in self._files.values():
+            f.close()
+
+    def _read_journal(self, sheet: str):
+        """
+        Journal rows of one sheet, first row per key only (see resume).
+        """
+        key = _ROW_KEYS[sheet]
+        seen = set()
+        with open(self.journal_path(sheet), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    k = key(row)
+                    if k in seen:
+                        continue
+                    seen.add(k)
+                    yield row
+
+    def materialize(self, filename: Optional[str] = None) -> str:
+        """
+        Build the .xlsx from the journal using openpyxl's write-only mode
+        (rows are streamed, not held in memory) and return its path.
+        The file is written to a temp name and swapped in atomically.
         """
-        self.wb.save(self.filename)
+        self.save()
+        filename = filename or self.filename
+
+        # Portfolio columns: every commodity seen, in first-seen order
+        commodity_cols: Dict[str, None] = {}
+        for row in self._read_journal("Portfolios"):
+            for cname in row[4]:
+                commodity_cols.setdefault(cname, None)
+        commodity_cols = list(commodity_cols)
+
+        wb = Workbook(write_only=True)
+
+        ws = wb.create_sheet("Commodities")
+        ws.append(COMMODITIES_HEADER)
+        for row in self._read_journal("Commodities"):
+            ws.append(row)
+
+        ws = wb.create_sheet("Trades")
+        ws.append(TRADES_HEADER)
+        for row in self._read_journal("Trades"):
+            ws.append(row)
+
+        ws = wb.create_sheet("Portfolios")
+        ws.append(PORTFOLIOS_HEADER + [f"{cname}_units" for cname in commodity_cols])
+        for round_no, team_name, total_rs, total_base, holdings in self._read_journal("Portfolios"):
+            ws.append(
+                [round_no, team_name, total_rs, total_base]
+                + [holdings.get(cname, 0) for cname in commodity_cols]
+            )
+
+        tmp = filename + ".tmp"
+        wb.save(tmp)
+        os.replace(tmp, filename)
+        return filename
 
     # -----------------------------------------------------
     # Commodities logging
     # -----------------------------------------------------
 
+    @staticmethod
+    def commodity_rows(commodities: Dict[str, Commodity], round_no: int) -> List[list]:
+        """
+        Rows for the Commodities sheet (values copied, safe to log later).
+        """
+        return [
+            [round_no, c.name, c.price, c.base_ratio, c.min_units, c.max_units]
+            for c in commodities.values()
+        ]
+
+    def append_commodity_rows(self, rows: List[list]):
+        self._append("Commodities", rows)
+
     def log_commodities(self, commodities: Dict[str, Commodity], round_no: int):
         """
         Append one row per commodity for the given round.
         """
-        for c in commodities.values():
-            self.sheet_commodities.append(
-                [round_no, c.name, c.price, c.base_ratio, c.min_units, c.max_units]
-            )
-        self.save()
+        self.append_commodity_rows(self.commodity_rows(commodities, round_no))
 
     # -----------------------------------------------------
     # Portfolio logging
     # -----------------------------------------------------
 
-    def ensure_portfolio_commodity_columns(self, commodities: Dict[str, Commodity]):
+    @staticmethod
+    def portfolio_rows(game_state: GameState) -> List[list]:
         """
-        Ensure the 'Portfolios' sheet has a _units column for each commodity.
-        If new commodities are added later, columns will be appended.
-
-        Columns will be named: <CommodityName>_units
+        Rows for the Portfolios sheet for the current round:
+        [round, team, total_rs, total_base, {commodity: units}].
+        Values are copied, so the rows can be appended later.
         """
-        header_row = self.sheet_portfolios[1]
-        headers = [cell.value for cell in header_row]
-
-        for cname in commodities.keys():
-            col_name = f"{cname}_units"
-            if col_name not in headers:
-                col_index = self.sheet_portfolios.max_column + 1
-                self.sheet_portfolios.cell(row=1, column=col_index, value=col_name)
-                headers.append(col_name)
-
-        self.save()
+        round_no = game_state.current_round
+        values_rs = game_state.team_values_rs()
+        values_base = game_state.team_values_in_base()
+        return [
+            [round_no, team.name, values_rs[tname], values_base[tname], dict(team.holdings)]
+            for tname, team in game_state.teams.items()
+        ]
+
+    def append_portfolio_rows(self, rows: List[list]):
+        """
+        Append rows built by portfolio_rows().
+        """
+        self._append("Portfolios", rows)
 
     def log_portfolios_round(self, game_state: GameState):
         """
@@ -136,39 +277,7 @@ class ExcelLogger:
         - TotalValueBaseUnits
         - <Commodity>_units...
         """
-        round_no = game_state.current_round
-        commodities = game_state.commodities
-        base = game_state.base_commodity
-
-        # Ensure columns exist for all commodities
-        self.ensure_portfolio_commodity_columns(commodities)
-
-        # Build mapping from commodity name to column index
-        header_row = self.sheet_portfolios[1]
-        headers = [cell.value for cell in header_row]
-        commodity_cols = {}
-        for cname in commodities.keys():
-            col_name = f"{cname}_units"
-            if col_name in headers:
-                commodity_cols[cname] = headers.index(col_name) + 1
-
-        # Append a row for each team
-        for team in game_state.teams.values():
-            row_idx = self.sheet_portfolios.max_row + 1
-            total_rs = team.value_rs(commodities)
-            total_base = team.value_in_base(commodities, base)
-
-            self.sheet_portfolios.cell(row=row_idx, column=1, value=round_no)
-            self.sheet_portfolios.cell(row=row_idx, column=2, value=team.name)
-            self.sheet_portfolios.cell(row=row_idx, column=3, value=total_rs)
-            self.sheet_portfolios.cell(row=row_idx, column=4, value=total_base)
-
-            # Commodity units
-            for cname, col_idx in commodity_cols.items():
-                units = team.holdings.get(cname, 0)
-                self.sheet_portfolios.cell(row=row_idx, column=col_idx, value=units)
-
-        self.save()
+        self.append_portfolio_rows(self.portfolio_rows(game_state))
 
     # -----------------------------------------------------
     # Trades logging
@@ -187,7 +296,7 @@ class ExcelLogger:
         give_name, give_qty = next(iter(trade.give.items())) if trade.give else ("", 0)
         recv_name, recv_qty = next(iter(trade.receive.items())) if trade.receive else ("", 0)
 
-        self.sheet_trades.append([
+        self._append("Trades", [[
             self.trade_counter,
             trade.round_no,
             trade.from_team,
@@ -196,6 +305,285 @@ class ExcelLogger:
             give_qty,
             recv_name,
             recv_qty
-        ])
+        ]])
 
-        self.save()
+
+class AsyncExcelWriter:
+    """
+    Runs an ExcelLogger on a dedicated writer thread.
+
+    Callers enqueue log events (rows are captured at call time, so the
+    game state may change afterwards); the writer appends them to the
+    journal and flushes it when `save_every_rows` rows are pending or the
+    oldest unflushed row is `save_interval_s` old, whichever comes first.
+    The .xlsx is only rebuilt on materialize() (e.g. at round end).
+
+    Producers never block (they run under the server's state_lock): when
+    `max_queue` row events are waiting, further rows are dropped and
+    counted in stats()["dropped_events"]. The command journal remains the
+    complete record; dropped trades still use up their TradeID. Control
+    events (flush, materialize, open_log, close) are never dropped. Call
+    close() on shutdown to flush and materialize.
+
+    open_log() switches to a new ExcelLogger on the writer thread, since
+    finishing the old workbook and creating the new one take a while.
+
+    Usage pattern:
+        writer = AsyncExcelWriter(ExcelLogger("barter_charter.xlsx"))
+        writer.open_log(lambda: ExcelLogger("barter_charter.xlsx"))   # new game
+        writer.log_trade(trade)
+        writer.materialize(wait=False)   # rebuild the .xlsx in the background
+        writer.stats()   # queue depth, lag, saves...
+        writer.close()
+
+    observer(kind, duration_s), if set, is called on the writer thread
+    after every journal save ("save") and .xlsx rebuild ("materialize").
+    """
+
+    def __init__(self, logger: Optional[ExcelLogger] = None, max_queue: int = 10_000,
+                 save_interval_s: float = 0.5, save_every_rows: int = 500):
+        # No logger: rows are discarded until open_log()
+        self.logger = logger
+        if logger is not None:
+            logger.autosave = False
+        self.max_queue = max_queue
+        self.save_interval_s = save_interval_s
+        self.save_every_rows = save_every_rows
+
+        # Unbounded, so control events always fit; rows are capped by _put_row
+        self._queue: "queue.Queue" = queue.Queue()
+        self._dropped = 0
+        self._trades_dropped = 0  # since the last queued trade (TradeIDs to skip)
+        self._unsaved_rows = 0
+        self._oldest_unsaved_ts: Optional[float] = None
+        self._save_due: Optional[float] = None
+        self._saves = 0
+        self._events_written = 0
+        self._last_save_ts: Optional[float] = None
+        self._last_save_duration_s = 0.0
+        self._materializations = 0
+        self._last_materialize_duration_s = 0.0
+        self._last_error: Optional[str] = None
+        self._closed = False
+        self.observer: Optional[Callable[[str, float], None]] = None
+
+        self._thread = threading.Thread(target=self._run, name="excel-writer", daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------
+    # Producer side (called from request handlers)
+    # -----------------------------------------------------
+
+    def _put(self, kind: str, payload: Any):
+        if self._closed:
+            raise RuntimeError("AsyncExcelWriter is closed.")
+        self._queue.put_nowait((kind, payload, time.monotonic()))
+
+    def _put_row(self, kind: str, payload: Any) -> bool:
+        """
+        Enqueue a row event, or drop it if the writer is max_queue behind.
+        """
+        if self._queue.qsize() >= self.max_queue:
+            self._dropped += 1
+            if self._dropped == 1 or self._dropped % 1000 == 0:
+                print(f"[excel_logger] writer is {self.max_queue} events behind, "
+                      f"{self._dropped} row event(s) dropped so far")
+            return False
+        self._put(kind, payload)
+        return True
+
+    def log_trade(self, trade):
+        # Trade objects are not mutated after recording, so no copy needed.
+        if self._put_row("trade", (trade, self._trades_dropped)):
+            self._trades_dropped = 0
+        else:
+            self._trades_dropped += 1
+
+    def log_commodities(self, commodities: Dict[str, Commodity], round_no: int):
+        self._put_row("commodities", ExcelLogger.commodity_rows(commodities, round_no))
+
+    def log_portfolios_round(self, game_state: GameState):
+        self._put_row("portfolios", ExcelLogger.portfolio_rows(game_state))
+
+    def open_log(self, make_logger: Callable[[], ExcelLogger]):
+        """
+        After everything enqueued so far: finish the current log (save,
+        materialize, close) and continue with make_logger(), all on the
+        writer thread.
+        """
+        self._trades_dropped = 0
+        self._put("open_log", make_logger)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until everything enqueued so far is written and saved.
+        """
+        done = threading.Event()
+        self._put("flush", done)
+        return done.wait(timeout)
+
+    def materialize(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Rebuild the .xlsx from the journal on the writer thread, after
+        everything enqueued so far. With wait=False this returns at once.
+        """
+        done = threading.Event()
+        self._put("materialize", done)
+        if not wait:
+            return True
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """
+        Flush pending events, materialize the .xlsx, and stop the writer thread.
+        """
+        if self._closed:
+            return
+        self.materialize(wait=True, timeout=timeout)
+        self._closed = True
+        self._queue.put(("stop", None, time.monotonic()))
+        self._thread.join(timeout)
+        if self.logger is not None:
+            self.logger.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue depth and lag (age of the oldest event not yet flushed to the journal).
+        """
+        now = time.monotonic()
+        oldest = self._oldest_unsaved_ts
+        with self._queue.mutex:
+            if self._queue.queue:
+                head_ts = self._queue.queue[0][2]
+                oldest = head_ts if oldest is None else min(oldest, head_ts)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "dropped_events": self._dropped,
+            "unsaved_rows": self._unsaved_rows,
+            "lag_s": 0.0 if oldest is None else now - oldest,
+            "events_written": self._events_written,
+            "saves": self._saves,
+            "last_save_duration_s": self._last_save_duration_s,
+            "seconds_since_last_save": None if self._last_save_ts is None else now - self._last_save_ts,
+            "materializations": self._materializations,
+            "last_materialize_duration_s": self._last_materialize_duration_s,
+            "last_error": self._last_error,
+        }
+
+    # -----------------------------------------------------
+    # Writer thread
+    # -----------------------------------------------------
+
+    def _save(self):
+        started = time.monotonic()
+        try:
+            self.logger.save()
+            self._last_error = None
+        except Exception as e:  # keep the writer alive (e.g. file open in Excel)
+            self._last_error = f"save failed: {e}"
+            print(f"[excel_logger] {self._last_error}")
+            self._save_due = time.monotonic() + self.save_interval_s  # retry later
+            return
+        self._last_save_ts = time.monotonic()
+        self._last_save_duration_s = self._last_save_ts - started
+        self._saves += 1
+        self._unsaved_rows = 0
+        self._oldest_unsaved_ts = None
+        self._save_due = None
+        if self.observer is not None:
+            self.observer("save", self._last_save_duration_s)
+
+    def _materialize(self):
+        started = time.monotonic()
+        try:
+            self.logger.materialize()
+            self._materializations += 1
+            self._last_materialize_duration_s = time.monotonic() - started
+            if self.observer is not None:
+                self.observer("materialize", self._last_materialize_duration_s)
+        except Exception as e:  # e.g. file open in Excel on Windows
+            self._last_error = f"materialize failed: {e}"
+            print(f"[excel_logger] {self._last_error}")
+
+    def _open_log(self, make_logger: Callable[[], ExcelLogger]):
+        if self.logger is not None:
+            if self._unsaved_rows:
+                self._save()
+            self._materialize()
+            self.logger.close()
+            self.logger = None
+            self._unsaved_rows = 0
+            self._oldest_unsaved_ts = None
+            self._save_due = None
+        try:
+            logger = make_logger()
+        except Exception as e:
+            self._last_error = f"open_log failed: {e}"
+            print(f"[excel_logger] {self._last_error}")
+            return
+        logger.autosave = False
+        self.logger = logger
+
+    def _apply(self, kind: str, payload: Any) -> int:
+        if kind == "trade":
+            trade, trades_dropped = payload
+            self.logger.trade_counter += trades_dropped
+            self.logger.log_trade(trade)
+            return 1
+        if kind == "commodities":
+            self.logger.append_commodity_rows(payload)
+            return len(payload)
+        if kind == "portfolios":
+            self.logger.append_portfolio_rows(payload)
+            return len(payload)
+        return 0
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._save_due is not None:
+                timeout = max(0.0, self._save_due - time.monotonic())
+            try:
+                kind, payload, ts = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._save()
+                continue
+
+            if kind == "stop":
+                if self._unsaved_rows:
+                    self._save()
+                return
+            if kind == "flush":
+                if self._unsaved_rows:
+                    self._save()
+                payload.set()
+                continue
+            if kind == "materialize":
+                if self._unsaved_rows:
+                    self._save()
+                if self.logger is not None:
+                    self._materialize()
+                payload.set()
+                continue
+            if kind == "open_log":
+                self._open_log(payload)
+                continue
+
+            if self.logger is None:
+                continue  # no log open yet (see open_log)
+            try:
+                rows = self._apply(kind, payload)
+            except Exception as e:
+                self._last_error = f"{kind} event failed: {e}"
+                print(f"[excel_logger] {self._last_error}")
+                continue
+            self._events_written += 1
+            self._unsaved_rows += rows
+            if self._oldest_unsaved_ts is None:
+                self._oldest_unsaved_ts = ts
+            if self._save_due is None:
+                self._save_due = ts + self.save_interval_s
+
+            if self._unsaved_rows >= self.save_every_rows or time.monotonic() >= self._save_due:
+                self._save()
@@ -13,14 +13,52 @@ Key concepts:
 All monetary logic is expressed in terms of a base commodity.
 """
 
+import hashlib
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it holdings stay plain dicts
+    np = None
+
+# Repricing modes for GameState.record_trades_batch
+REPRICE_PER_TRADE = "per_trade"   # ratios/prices recomputed after every trade
+REPRICE_PER_BATCH = "per_batch"   # ratios/prices recomputed once per batch
+
+# Why a trade was rejected (TradeRejected.reason)
+REJECT_NO_ACTIVE_ROUND = "no_active_round"
+REJECT_UNKNOWN_TEAM = "unknown_team"
+REJECT_UNKNOWN_COMMODITY = "unknown_commodity"
+REJECT_PAIR_LIMIT = "pair_limit"
+REJECT_NEGATIVE_QTY = "negative_qty"
+REJECT_INSUFFICIENT_HOLDINGS = "insufficient_holdings"
 
 # Hypothetical rupee price of 1 unit of the BASE commodity.
 # This is a global assumption – change if you want bigger/smaller nominal values.
 BASE_PRICE_RS = 1000.0
 
 
+class TradeRejected(ValueError):
+    """
+    A trade broke a game rule. str(e) is the user-facing message;
+    reason is one of the REJECT_* constants (stable, for counting).
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
 # ---------------------------------------------------------------------
 # DATA CLASSES
 # ---------------------------------------------------------------------
@@ -98,6 +136,35 @@ class Trade:
     receive: Dict[str, int]  # what from_team gets
 
 
+@dataclass
+class BatchTradeResult:
+    """
+    Outcome of one trade inside GameState.record_trades_batch.
+    """
+    index: int                     # position in the submitted batch (0-based)
+    ok: bool
+    trade: Optional[Trade] = None  # set when ok
+    error: str = ""                # set when rejected
+    reason: str = ""               # REJECT_* constant, set when rejected
+
+
+@dataclass
+class PenaltyBreakdown:
+    """
+    Penalties charged to one team at the end of one round (Rs).
+    """
+    team: str
+    value_rs: float                 # portfolio value the rates were applied to
+    traded: bool
+    no_trade_penalty_rs: float = 0.0
+    band_penalty_rs: float = 0.0
+    violated_commodities: List[str] = field(default_factory=list)
+
+    @property
+    def total_rs(self) -> float:
+        return self.no_trade_penalty_rs + self.band_penalty_rs
+
+
 @dataclass
 class RoundInfo:
     """
@@ -107,6 +174,443 @@ class RoundInfo:
     news: str
 
 
+# ---------------------------------------------------------------------
+# COLUMNAR TRADE LOG
+# ---------------------------------------------------------------------
+
+# Leg directions in TradeLog, from the from_team's point of view
+LEG_GIVE = -1     # from_team gives this commodity
+LEG_RECEIVE = 1   # from_team receives this commodity
+
+
+class TradeLog:
+    """
+    Compact, append-only, columnar store of all trades.
+
+    Per trade (row id = position in the log):
+        round_no, from_id, to_id       array columns
+        leg_start                      offset of the trade's first leg
+    Per leg (flat table):
+        leg_trade, leg_commodity, leg_direction, leg_qty
+
+    Team and commodity names are interned to small ints. Indexing and
+    iteration rebuild Trade objects on the fly, so callers that treat
+    this like the old List[Trade] keep working (the rebuilt dicts are
+    copies; editing them does not change the log).
+    """
+
+    def __init__(self, trades: Iterable[Trade] = ()):
+        self.team_names: List[str] = []
+        self.team_ids: Dict[str, int] = {}
+        self.commodity_names: List[str] = []
+        self.commodity_ids: Dict[str, int] = {}
+
+        self.round_no = array("i")
+        self.from_id = array("i")
+        self.to_id = array("i")
+        self.leg_start = array("q", [0])
+
+        self.leg_trade = array("i")
+        self.leg_commodity = array("i")
+        self.leg_direction = array("b")
+        self.leg_qty = array("q")
+
+        # round_no -> trade ids in that round (for cheap per-round reads)
+        self._round_ids: Dict[int, array] = {}
+
+        for tr in trades:
+            self.append(tr)
+
+    @staticmethod
+    def _intern(name: str, names: List[str], ids: Dict[str, int]) -> int:
+        i = ids.get(name)
+        if i is None:
+            i = len(names)
+            names.append(name)
+            ids[name] = i
+        return i
+
+    def append(self, trade: Trade):
+        tid = len(self.round_no)
+        self.round_no.append(trade.round_no)
+        self.from_id.append(self._intern(trade.from_team, self.team_names, self.team_ids))
+        self.to_id.append(self._intern(trade.to_team, self.team_names, self.team_ids))
+
+        for direction, legs in ((LEG_GIVE, trade.give), (LEG_RECEIVE, trade.receive)):
+            for cname, qty in legs.items():
+                self.leg_trade.append(tid)
+                self.leg_commodity.append(
+                    self._intern(cname, self.commodity_names, self.commodity_ids)
+                )
+                self.leg_direction.append(direction)
+                self.leg_qty.append(qty)
+        self.leg_start.append(len(self.leg_qty))
+
+        ids = self._round_ids.get(trade.round_no)
+        if ids is None:
+            ids = self._round_ids[trade.round_no] = array("i")
+        ids.append(tid)
+
+    def _build(self, tid: int) -> Trade:
+        give: Dict[str, int] = {}
+        receive: Dict[str, int] = {}
+        names = self.commodity_names
+        for k in range(self.leg_start[tid], self.leg_start[tid + 1]):
+            target = give if self.leg_direction[k] == LEG_GIVE else receive
+            target[names[self.leg_commodity[k]]] = self.leg_qty[k]
+        return Trade(
+            round_no=self.round_no[tid],
+            from_team=self.team_names[self.from_id[tid]],
+            to_team=self.team_names[self.to_id[tid]],
+            give=give,
+            receive=receive
+        )
+
+    def __len__(self) -> int:
+        return len(self.round_no)
+
+    def __bool__(self) -> bool:
+        return len(self.round_no) > 0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._build(tid) for tid in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("trade index out of range")
+        return self._build(i)
+
+    def __iter__(self):
+        for tid in range(len(self)):
+            yield self._build(tid)
+
+    # Column names, in the order used by columns() / from_columns()
+    TRADE_COLUMNS = ("round_no", "from_id", "to_id")
+    LEG_COLUMNS = ("leg_trade", "leg_commodity", "leg_direction", "leg_qty")
+
+    def columns(self, stop: Optional[int] = None) -> Dict[str, array]:
+        """
+        Copies of the raw columns for the first `stop` trades (default: all),
+        including leg_start. Used for binary checkpoints.
+        """
+        n = len(self) if stop is None else min(stop, len(self))
+        n_legs = self.leg_start[n]
+        cols = {name: getattr(self, name)[:n] for name in self.TRADE_COLUMNS}
+        cols["leg_start"] = self.leg_start[:n + 1]
+        for name in self.LEG_COLUMNS:
+            cols[name] = getattr(self, name)[:n_legs]
+        return cols
+
+    @classmethod
+    def from_columns(cls, team_names: List[str], commodity_names: List[str],
+                     columns: Dict[str, array]) -> "TradeLog":
+        """
+        Rebuild a log from columns() output and its interning tables.
+        """
+        log = cls()
+        log.team_names = list(team_names)
+        log.team_ids = {name: i for i, name in enumerate(log.team_names)}
+        log.commodity_names = list(commodity_names)
+        log.commodity_ids = {name: i for i, name in enumerate(log.commodity_names)}
+        for name in cls.TRADE_COLUMNS + ("leg_start",) + cls.LEG_COLUMNS:
+            setattr(log, name, columns[name])
+        for tid, round_no in enumerate(log.round_no):
+            ids = log._round_ids.get(round_no)
+            if ids is None:
+                ids = log._round_ids[round_no] = array("i")
+            ids.append(tid)
+        return log
+
+    def in_round(self, round_no: int, stop: Optional[int] = None):
+        """
+        Yield (trade_id, Trade) for the trades of one round only
+        (only trade ids < stop, if given).
+        """
+        for tid in self._round_ids.get(round_no, ()):
+            if stop is not None and tid >= stop:
+                break
+            yield tid, self._build(tid)
+
+
+# ---------------------------------------------------------------------
+# ARRAY-BACKED HOLDINGS (optional, requires numpy)
+# ---------------------------------------------------------------------
+
+class HoldingsView(MutableMapping):
+    """
+    Dict-like view of one team's row in a HoldingsMatrix.
+
+    Team.holdings can be either a plain dict or one of these; code that
+    reads/writes holdings[cname] or calls .get()/.items() works with both.
+    The commodity columns are fixed, so unknown keys raise KeyError.
+    """
+    __slots__ = ("_matrix", "_row")
+
+    def __init__(self, matrix: "HoldingsMatrix", row: int):
+        self._matrix = matrix
+        self._row = row
+
+    def __getitem__(self, cname: str) -> int:
+        col = self._matrix.commodity_index[cname]
+        return int(self._matrix.units[self._row, col])
+
+    def get(self, cname: str, default=None):
+        col = self._matrix.commodity_index.get(cname)
+        if col is None:
+            return default
+        return int(self._matrix.units[self._row, col])
+
+    def __setitem__(self, cname: str, qty: int):
+        col = self._matrix.commodity_index[cname]
+        self._matrix.units[self._row, col] = qty
+
+    def __delitem__(self, cname: str):
+        raise TypeError("Holdings columns are fixed; set the quantity to 0 instead.")
+
+    def __iter__(self):
+        return iter(self._matrix.commodity_names)
+
+    def __len__(self) -> int:
+        return len(self._matrix.commodity_names)
+
+    def to_dict(self) -> Dict[str, int]:
+        """
+        Plain-dict copy of the row (one array read instead of one per key).
+        """
+        return dict(zip(self._matrix.commodity_names, self._matrix.units[self._row].tolist()))
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class HoldingsMatrix:
+    """
+    Teams x commodities int64 matrix of holdings, plus name -> index maps
+    and a price vector, so every team's value comes from one
+    matrix-vector product instead of a Python loop per team.
+
+    Build it with GameState.enable_holdings_matrix(); that also swaps each
+    Team.holdings for a HoldingsView onto its row.
+    """
+
+    def __init__(self, team_names: List[str], commodity_names: List[str]):
+        self.team_names = list(team_names)
+        self.commodity_names = list(commodity_names)
+        self.team_index = {name: i for i, name in enumerate(self.team_names)}
+        self.commodity_index = {name: j for j, name in enumerate(self.commodity_names)}
+        self.units = np.zeros((len(self.team_names), len(self.commodity_names)), dtype=np.int64)
+        self.prices = np.zeros(len(self.commodity_names), dtype=np.float64)
+
+    def view(self, team_name: str) -> HoldingsView:
+        return HoldingsView(self, self.team_index[team_name])
+
+    def load_prices(self, commodities: Dict[str, Commodity]):
+        """
+        Refresh the price vector from the commodity definitions.
+        """
+        self.prices[:] = [commodities[cname].price for cname in self.commodity_names]
+
+    def values_rs(self, commodities: Dict[str, Commodity]):
+        """
+        Rupee value of every team (array in team_names order).
+        """
+        self.load_prices(commodities)
+        return self.units @ self.prices
+
+    def values_in_base(self, commodities: Dict[str, Commodity], base_commodity: str):
+        """
+        Value of every team in base units (array in team_names order).
+        Same weights as Team.value_in_base: base = 1, others = 1 / base_ratio.
+        """
+        weights = np.zeros(len(self.commodity_names), dtype=np.float64)
+        for j, cname in enumerate(self.commodity_names):
+            c = commodities[cname]
+            if cname == base_commodity:
+                weights[j] = 1.0
+            elif c.base_ratio > 0:
+                weights[j] = 1.0 / float(c.base_ratio)
+        return self.units @ weights
+
+
+# ---------------------------------------------------------------------
+# INCREMENTAL LEADERBOARD
+# ---------------------------------------------------------------------
+
+# Sort keys are rounded to this many decimals (Rs), so float noise never
+# decides the order of teams with the same value
+LEADERBOARD_KEY_DECIMALS = 6
+
+@dataclass
+class LeaderboardEntry:
+    """
+    One leaderboard row (all values in Rs).
+    """
+    name: str
+    value_rs: float
+    penalty_rs: float
+    effective_value_rs: float
+
+
+class IncrementalLeaderboard:
+    """
+    Leaderboard that only recomputes what changed since the last read.
+
+    - A trade or a penalty marks its teams dirty: only those values are
+      recomputed, and only those rows move (bisect on the sort key).
+    - A price change moves every team's value, so all values are
+      recomputed exactly (no accumulated float deltas) and re-sorted
+      (nearly sorted input, so this is close to linear).
+
+    The sort key is the effective value rounded to LEADERBOARD_KEY_DECIMALS
+    and then the team's insertion order, so teams of equal value keep a
+    stable order however their values were reached. refresh() bumps
+    `version` when anything changed; reads in between return the cached
+    entries. The entries list is replaced, never modified, on change.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._raw: Dict[str, float] = {}
+        self._penalty: Dict[str, float] = {}
+        self._prices: Dict[str, float] = {}
+        self._position: Dict[str, int] = {}  # team insertion order, for tie-breaks
+        self._order: List[str] = []
+        self._keys: List[Tuple[float, int]] = []  # sort key of each team in _order
+        self._dirty: set = set()
+        self._needs_rebuild = True
+        self._entries: List[LeaderboardEntry] = []
+
+    def mark_teams(self, *team_names: str):
+        self._dirty.update(team_names)
+
+    def mark_all(self):
+        self._needs_rebuild = True
+
+    def _key(self, tname: str) -> Tuple[float, int]:
+        effective = self._raw[tname] - self._penalty[tname]
+        return -round(effective, LEADERBOARD_KEY_DECIMALS), self._position[tname]
+
+    def _entry(self, tname: str) -> LeaderboardEntry:
+        raw, penalty = self._raw[tname], self._penalty[tname]
+        return LeaderboardEntry(
+            name=tname,
+            value_rs=raw,
+            penalty_rs=penalty,
+            effective_value_rs=raw - penalty,
+        )
+
+    def _recompute_all(self, gs: "GameState"):
+        self._raw = gs.team_values_rs()
+        self._penalty = {tname: gs.penalties_rs.get(tname, 0.0) for tname in gs.teams}
+        self._prices = {cname: c.price for cname, c in gs.commodities.items()}
+        self._dirty.clear()
+
+    def _recompute_team(self, gs: "GameState", tname: str):
+        self._raw[tname] = gs.teams[tname].value_rs(gs.commodities)
+        self._penalty[tname] = gs.penalties_rs.get(tname, 0.0)
+
+    def _resort(self):
+        self._order.sort(key=self._key)
+        self._keys = [self._key(tname) for tname in self._order]
+        self._entries = [self._entry(tname) for tname in self._order]
+
+    def _reposition(self, gs: "GameState", team_names: List[str]):
+        """
+        Recompute the given teams and move only their rows.
+        """
+        order, keys = self._order, self._keys
+        entries = list(self._entries)
+        for tname in team_names:
+            i = bisect_left(keys, self._key(tname))
+            del order[i], keys[i], entries[i]
+        for tname in team_names:
+            self._recompute_team(gs, tname)
+            key = self._key(tname)
+            i = bisect_left(keys, key)
+            order.insert(i, tname)
+            keys.insert(i, key)
+            entries.insert(i, self._entry(tname))
+        self._entries = entries
+
+    def refresh(self, gs: "GameState") -> int:
+        """
+        Bring the leaderboard up to date with gs and return its version.
+        """
+        if len(self._position) != len(gs.teams):
+            self._needs_rebuild = True
+
+        if self._needs_rebuild:
+            self._position = {tname: i for i, tname in enumerate(gs.teams)}
+            self._order = list(gs.teams)
+            self._recompute_all(gs)
+            self._resort()
+            self._needs_rebuild = False
+        elif any(c.price != self._prices.get(cname) for cname, c in gs.commodities.items()):
+            self._recompute_all(gs)
+            self._resort()
+        elif len(self._dirty) * 4 > len(self._order):
+            # Most rows move anyway (e.g. round-end penalties): sort once
+            for tname in self._dirty:
+                self._recompute_team(gs, tname)
+            self._dirty.clear()
+            self._resort()
+        elif self._dirty:
+            self._reposition(gs, list(self._dirty))
+            self._dirty.clear()
+        else:
+            return self.version
+
+        self.version += 1
+        return self.version
+
+    def entries(self, gs: "GameState") -> List[LeaderboardEntry]:
+        self.refresh(gs)
+        return self._entries
+
+
+@dataclass
+class RoundIndex:
+    """
+    Running per-round aggregates, maintained by GameState.record_trade
+    so that rule checks never have to rescan the whole trade log.
+
+    pair_counts:
+        Number of trades per unordered team pair, keyed by the
+        sorted (team_a, team_b) tuple.
+
+    net_demand:
+        Running net demand per commodity (received - given, from the
+        from_team's point of view), as used by update_ratios_auto.
+
+    gross_volume:
+        Running total units moved per commodity (both legs counted).
+
+    active_teams / team_trade_counts:
+        Teams that took part in at least one trade this round, and how
+        many trades each took part in (as either side).
+
+    active_flags:
+        The same activity as a bitmap: one byte per team position
+        (GameState.team_position), 1 if the team traded this round.
+    """
+    round_no: int
+    pair_counts: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    net_demand: Dict[str, float] = field(default_factory=dict)
+    gross_volume: Dict[str, float] = field(default_factory=dict)
+    active_teams: set = field(default_factory=set)
+    team_trade_counts: Dict[str, int] = field(default_factory=dict)
+    active_flags: bytearray = field(default_factory=bytearray)
+
+
+def pair_key(team_a: str, team_b: str) -> Tuple[str, str]:
+    """
+    Unordered pair key: (A,B) and (B,A) map to the same tuple.
+    """
+    return (team_a, team_b) if team_a <= team_b else (team_b, team_a)
+
+
 @dataclass
 class GameState:
     """
@@ -114,18 +618,232 @@ class GameState:
     - Definitions of commodities
     - Teams and their holdings
     - Base commodity name
-    - Trades and rounds
+    - Trades (columnar TradeLog) and rounds
     - Current round number
     - Penalties (rupee value) applied to teams
+    - Per-round indexes derived from the trade log (see RoundIndex)
+    - Optional array-backed holdings (see HoldingsMatrix)
+    - Per-round penalty breakdowns (see apply_round_penalties)
+    - An incrementally maintained leaderboard (see IncrementalLeaderboard)
+    - A version number, bumped after every mutation
+
+    max_trades_per_pair:
+        How many trades a pair of teams may make in one round.
+
+    version:
+        Increases after every change (trade, price update, round start,
+        penalties). Equal versions mean equal state, so readers can use it
+        to skip rebuilding / re-sending unchanged data. It is bumped AFTER
+        the change is applied: a reader that reads the version first and
+        the data second never pairs old data with a new version.
     """
     commodities: Dict[str, Commodity] = field(default_factory=dict)
     teams: Dict[str, Team] = field(default_factory=dict)
     base_commodity: str = ""
-    trades: List[Trade] = field(default_factory=list)
+    trades: TradeLog = field(default_factory=TradeLog)
     rounds: List[RoundInfo] = field(default_factory=list)
     current_round: int = 0
     penalties_rs: Dict[str, float] = field(default_factory=dict)
+    max_trades_per_pair: int = 1
+    portfolio_generation_s: float = 0.0  # wall time of the last portfolio generation
+    version: int = 0
+    round_index: Dict[int, RoundIndex] = field(default_factory=dict, repr=False)
+    holdings_matrix: Optional[HoldingsMatrix] = field(default=None, repr=False)
+    leaderboard_index: IncrementalLeaderboard = field(
+        default_factory=IncrementalLeaderboard, repr=False
+    )
+    penalty_history: Dict[int, Dict[str, PenaltyBreakdown]] = field(
+        default_factory=dict, repr=False
+    )
+    _team_positions: Dict[str, int] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        if not isinstance(self.trades, TradeLog):
+            self.trades = TradeLog(self.trades)
+        # State built from an existing trade list (load / replay) needs its indexes.
+        if self.trades:
+            self.rebuild_indexes()
+
+    def bump_version(self) -> int:
+        """
+        Mark the state as changed. Call after every mutation.
+        """
+        self.version += 1
+        return self.version
+
+    def rebuild_indexes(self):
+        """
+        Recompute every per-round index from self.trades.
+        Call this after loading or replaying trades from outside record_trade.
+        """
+        self.round_index = {}
+        for tr in self.trades:
+            self._index_trade(tr)
+
+    def team_position(self, team_name: str) -> int:
+        """
+        Stable position of a team in self.teams (row in bitmaps / matrices).
+        """
+        if len(self._team_positions) != len(self.teams):
+            self._team_positions = {tname: i for i, tname in enumerate(self.teams)}
+            # Positions may have shifted: rebuild the activity bitmaps.
+            for idx in self.round_index.values():
+                idx.active_flags = bytearray(len(self.teams))
+                for tname in idx.active_teams:
+                    if tname in self._team_positions:
+                        idx.active_flags[self._team_positions[tname]] = 1
+        return self._team_positions[team_name]
+
+    def round_activity_flags(self, round_no: int) -> bytearray:
+        """
+        Bitmap (one byte per team, in team order) of who traded in a round.
+        """
+        if self.teams:
+            self.team_position(next(iter(self.teams)))  # refresh if stale
+        idx = self.round_index.get(round_no)
+        flags = bytearray(len(self.teams))
+        if idx is not None:
+            flags[:len(idx.active_flags)] = idx.active_flags
+        return flags
+
+    def _round_index_for(self, round_no: int) -> RoundIndex:
+        idx = self.round_index.get(round_no)
+        if idx is None:
+            idx = RoundIndex(round_no=round_no)
+            self.round_index[round_no] = idx
+        return idx
+
+    def _index_trade(self, trade: Trade):
+        idx = self._round_index_for(trade.round_no)
+        key = pair_key(trade.from_team, trade.to_team)
+        idx.pair_counts[key] = idx.pair_counts.get(key, 0) + 1
+
+        for tname in (trade.from_team, trade.to_team):
+            idx.active_teams.add(tname)
+            idx.team_trade_counts[tname] = idx.team_trade_counts.get(tname, 0) + 1
+            pos = self.team_position(tname)
+            if pos >= len(idx.active_flags):
+                idx.active_flags.extend(bytes(len(self.teams) - len(idx.active_flags)))
+            idx.active_flags[pos] = 1
+
+        net = idx.net_demand
+        gross = idx.gross_volume
+        for cname, qty in trade.give.items():
+            net[cname] = net.get(cname, 0.0) - qty
+            gross[cname] = gross.get(cname, 0.0) + qty
+        for cname, qty in trade.receive.items():
+            net[cname] = net.get(cname, 0.0) + qty
+            gross[cname] = gross.get(cname, 0.0) + qty
+
+    def pair_trade_count(self, team_a: str, team_b: str, round_no: Optional[int] = None) -> int:
+        """
+        Number of trades between two teams (either direction) in a round.
+        Defaults to the current round.
+        """
+        if round_no is None:
+            round_no = self.current_round
+        idx = self.round_index.get(round_no)
+        if idx is None:
+            return 0
+        return idx.pair_counts.get(pair_key(team_a, team_b), 0)
+
+    def team_trade_count(self, team_name: str, round_no: Optional[int] = None) -> int:
+        """
+        Number of trades a team took part in during a round (default: current).
+        """
+        if round_no is None:
+            round_no = self.current_round
+        idx = self.round_index.get(round_no)
+        if idx is None:
+            return 0
+        return idx.team_trade_counts.get(team_name, 0)
+
+    def teams_without_trades(self, round_no: Optional[int] = None) -> List[str]:
+        """
+        Teams (in team order) that have not traded yet in a round (default: current).
+        """
+        if round_no is None:
+            round_no = self.current_round
+        idx = self.round_index.get(round_no)
+        if idx is None:
+            return list(self.teams.keys())
+        active = idx.active_teams
+        return [tname for tname in self.teams if tname not in active]
+
+    def round_net_demand(self, round_no: int) -> Dict[str, float]:
+        """
+        Net demand per commodity for a round (any round, past or current).
+        Every commodity is present; commodities nobody traded are 0.0.
+        """
+        net = {cname: 0.0 for cname in self.commodities.keys()}
+        idx = self.round_index.get(round_no)
+        if idx is not None:
+            net.update(idx.net_demand)
+        return net
+
+    def round_gross_volume(self, round_no: int) -> Dict[str, float]:
+        """
+        Total units traded per commodity for a round (give + receive legs).
+        """
+        gross = {cname: 0.0 for cname in self.commodities.keys()}
+        idx = self.round_index.get(round_no)
+        if idx is not None:
+            gross.update(idx.gross_volume)
+        return gross
+
+    def enable_holdings_matrix(self) -> bool:
+        """
+        Move all team holdings into a HoldingsMatrix and give every team a
+        dict-like HoldingsView onto its row. Safe to call again after teams
+        or holdings were replaced wholesale (it rebuilds from current data).
 
+        Returns False (and leaves plain dicts in place) if numpy is missing.
+        """
+        if np is None:
+            return False
+        current = {tname: dict(t.holdings) for tname, t in self.teams.items()}
+        matrix = HoldingsMatrix(list(self.teams.keys()), list(self.commodities.keys()))
+        for tname, team in self.teams.items():
+            row = matrix.team_index[tname]
+            for cname, qty in current[tname].items():
+                if qty:
+                    matrix.units[row, matrix.commodity_index[cname]] = qty
+            team.holdings = matrix.view(tname)
+        self.holdings_matrix = matrix
+        self.leaderboard_index.mark_all()
+        return True
+
+    def _matrix_current(self) -> Optional[HoldingsMatrix]:
+        m = self.holdings_matrix
+        if m is None:
+            return None
+        if len(m.team_names) != len(self.teams) or len(m.commodity_names) != len(self.commodities):
+            # Teams or commodities changed behind our back: rebuild.
+            self.enable_holdings_matrix()
+            m = self.holdings_matrix
+        return m
+
+    def team_values_rs(self) -> Dict[str, float]:
+        """
+        Rupee value of every team's holdings (before penalties).
+        """
+        m = self._matrix_current()
+        if m is None:
+            return {tname: t.value_rs(self.commodities) for tname, t in self.teams.items()}
+        return dict(zip(m.team_names, m.values_rs(self.commodities).tolist()))
+
+    def team_values_in_base(self) -> Dict[str, float]:
+        """
+        Value of every team's holdings in base units.
+        """
+        m = self._matrix_current()
+        if m is None:
+            return {
+                tname: t.value_in_base(self.commodities, self.base_commodity)
+                for tname, t in self.teams.items()
+            }
+        values = m.values_in_base(self.commodities, self.base_commodity)
+        return dict(zip(m.team_names, values.tolist()))
 
     def start_round(self, news: str):
         """
@@ -136,28 +854,76 @@ class GameState:
         self.round_open_ratios = {
             cname: int(c.base_ratio) for cname, c in self.commodities.items()
         }
+        self.bump_version()
 
-    def record_trade(self, from_team: str, to_team: str,
-                     give: Dict[str, int], receive: Dict[str, int]) -> Trade:
+    def validate_trade(self, from_team: str, to_team: str,
+                       give: Dict[str, int], receive: Dict[str, int]):
         """
-        Apply a trade to the teams and record it.
-
-        Rule: Only 1 trade is allowed between a pair of teams per round
-        (pair is unordered: (A,B) == (B,A)).
+        Check every rule for a trade without changing any state.
+        Raises TradeRejected (a ValueError) with a user-facing message if
+        the trade is invalid.
+
+        Rules:
+        - A round must be active.
+        - Both teams and all commodities must exist.
+        - Only max_trades_per_pair trades (default 1) are allowed between a
+          pair of teams per round (pair is unordered: (A,B) == (B,A)).
+          The check is a single lookup in the current round's pair index.
+        - Quantities are non-negative and both sides hold enough units
+          (checked in the same order apply_trade moves them).
         """
         if self.current_round == 0:
-            raise ValueError("No active round. Start a round first.")
-
-        # Enforce "only 1 trade per pair per round"
-        for tr in self.trades:
-            if tr.round_no != self.current_round:
-                continue
-            pair_existing = {tr.from_team, tr.to_team}
-            pair_new = {from_team, to_team}
-            if pair_existing == pair_new:
-                raise ValueError(
+            raise TradeRejected(REJECT_NO_ACTIVE_ROUND, "No active round. Start a round first.")
+
+        for tname in (from_team, to_team):
+            if tname not in self.teams:
+                raise TradeRejected(REJECT_UNKNOWN_TEAM, f"Unknown team: {tname}")
+
+        for cname in list(give) + list(receive):
+            if cname not in self.commodities:
+                raise TradeRejected(REJECT_UNKNOWN_COMMODITY, f"Unknown commodity: {cname}")
+
+        # Enforce "only N trades per pair per round"
+        limit = self.max_trades_per_pair
+        if self.pair_trade_count(from_team, to_team) >= limit:
+            if limit == 1:
+                raise TradeRejected(
+                    REJECT_PAIR_LIMIT,
                     f"Only one trade allowed between {from_team} and {to_team} in round {self.current_round}."
                 )
+            raise TradeRejected(
+                REJECT_PAIR_LIMIT,
+                f"Only {limit} trades allowed between {from_team} and {to_team} in round {self.current_round}."
+            )
+
+        t_from = self.teams[from_team]
+        t_to = self.teams[to_team]
+        for cname, qty in give.items():
+            if qty < 0:
+                raise TradeRejected(REJECT_NEGATIVE_QTY, "Quantity cannot be negative.")
+            if t_from.holdings.get(cname, 0) < qty:
+                raise TradeRejected(REJECT_INSUFFICIENT_HOLDINGS, f"{t_from.name} does not have enough {cname}")
+        for cname, qty in receive.items():
+            if qty < 0:
+                raise TradeRejected(REJECT_NEGATIVE_QTY, "Quantity cannot be negative.")
+            # to_team has already received the 'give' legs when apply_trade
+            # takes the 'receive' legs from it.
+            if t_to.holdings.get(cname, 0) + give.get(cname, 0) < qty:
+                raise TradeRejected(REJECT_INSUFFICIENT_HOLDINGS, f"{t_to.name} does not have enough {cname}")
+
+    def record_trade(self, from_team: str, to_team: str,
+                     give: Dict[str, int], receive: Dict[str, int],
+                     validated: bool = False) -> Trade:
+        """
+        Apply a trade to the teams and record it.
+
+        The trade is fully validated first (see validate_trade), so a
+        rejected trade never leaves holdings half-applied. Pass
+        validated=True only right after validate_trade() succeeded for
+        the same arguments, with no change to the state in between.
+        """
+        if not validated:
+            self.validate_trade(from_team, to_team, give, receive)
 
         trade = Trade(
             round_no=self.current_round,
@@ -168,23 +934,85 @@ class GameState:
         )
         apply_trade(trade, self.teams)
         self.trades.append(trade)
+        self._index_trade(trade)
+        self.leaderboard_index.mark_teams(from_team, to_team)
+        self.bump_version()
         return trade
 
+    def record_trades_batch(
+        self,
+        orders: Iterable[Tuple[str, str, Dict[str, int], Dict[str, int]]],
+        reprice: str = REPRICE_PER_TRADE,
+        after_reprice: Optional[Callable[[int], None]] = None,
+    ) -> List[BatchTradeResult]:
+        """
+        Validate and apply a batch of (from_team, to_team, give, receive)
+        orders in sequence. Invalid orders are rejected individually; the
+        rest are applied.
+
+        reprice:
+            REPRICE_PER_TRADE: update_ratios_auto + update_prices_from_ratios
+                after every applied trade (same results as one-by-one calls).
+            REPRICE_PER_BATCH: one ratio/price update after the whole batch.
+
+        after_reprice(n_trades):
+            Called after each ratio/price update with the number of trades
+            that update covers (e.g. to record a price snapshot).
+
+        The caller is responsible for holding any lock around the call.
+        """
+        if reprice not in (REPRICE_PER_TRADE, REPRICE_PER_BATCH):
+            raise ValueError(f"Unknown reprice mode: {reprice}")
+
+        results: List[BatchTradeResult] = []
+        applied = 0
+        for i, (from_team, to_team, give, receive) in enumerate(orders):
+            try:
+                trade = self.record_trade(from_team, to_team, give, receive)
+            except ValueError as e:
+                results.append(BatchTradeResult(
+                    index=i, ok=False, error=str(e), reason=getattr(e, "reason", "")
+                ))
+                continue
+            results.append(BatchTradeResult(index=i, ok=True, trade=trade))
+            applied += 1
+
+            if reprice == REPRICE_PER_TRADE:
+                update_ratios_auto(self)
+                update_prices_from_ratios(self)
+                if after_reprice is not None:
+                    after_reprice(1)
+
+        if reprice == REPRICE_PER_BATCH and applied:
+            update_ratios_auto(self)
+            update_prices_from_ratios(self)
+            if after_reprice is not None:
+                after_reprice(applied)
+
+        return results
+
     def leaderboard(self):
         """
         Teams sorted by effective portfolio value (Rs), descending.
         Effective value = holdings value - accumulated penalties.
+
+        Served from leaderboard_index, which only recomputes the teams and
+        prices that changed since the previous call.
         """
-        def effective_value(team: Team) -> float:
-            raw = team.value_rs(self.commodities)
-            penalty = self.penalties_rs.get(team.name, 0.0)
-            return raw - penalty
+        return [self.teams[e.name] for e in self.leaderboard_entries()]
 
-        return sorted(
-            self.teams.values(),
-            key=effective_value,
-            reverse=True
-        )
+    def leaderboard_entries(self) -> List[LeaderboardEntry]:
+        """
+        Leaderboard rows (raw value, penalty, effective value), best first.
+        """
+        return self.leaderboard_index.entries(self)
+
+    @property
+    def leaderboard_version(self) -> int:
+        """
+        Bumped every time the leaderboard content changes.
+        """
+        return self.leaderboard_index.refresh(self)
 
 
 # ---------------------------------------------------------------------
@@ -212,15 +1040,190 @@ def update_prices_from_ratios(game_state: GameState):
                 # avoid division by zero; fallback
                 c.base_ratio = 1
             c.price = BASE_PRICE_RS / float(c.base_ratio)
+    game_state.bump_version()
 
 
 # ---------------------------------------------------------------------
 # INITIAL PORTFOLIO GENERATION
 # ---------------------------------------------------------------------
 
+def _log_comb(n: int, k: int) -> float:
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+# Above this standard deviation the hypergeometric sampler switches from
+# inversion (cost ~ sd) to ratio-of-uniforms (constant expected cost).
+_HYPERGEOM_INVERSION_MAX_SD = 30.0
+
+
+def _hypergeometric_hrua(rng, good: int, bad: int, nsample: int) -> int:
+    """
+    Stadlober's ratio-of-uniforms sampler (H2PE/HRUA), as used by numpy.
+    Exact, O(1) expected work regardless of population size.
+    """
+    total = good + bad
+    m_sample = min(nsample, total - nsample)
+    min_gb = min(good, bad)
+    max_gb = max(good, bad)
+
+    p = min_gb / total
+    q = max_gb / total
+    a = m_sample * p + 0.5
+    var = (total - m_sample) * m_sample * p * q / (total - 1)
+    c = math.sqrt(var + 0.5)
+    h = 1.7155277699214135 * c + 0.8989161620588988
+    m = (m_sample + 1) * (min_gb + 1) // (total + 2)
+    lf = math.lgamma
+    g = lf(m + 1) + lf(min_gb - m + 1) + lf(m_sample - m + 1) + lf(max_gb - m_sample + m + 1)
+    b = min(min(m_sample, min_gb) + 1, math.floor(a + 16 * c))
+
+    while True:
+        u = 1.0 - rng.random()  # (0, 1]
+        v = rng.random()
+        x = a + h * (v - 0.5) / u
+        if x < 0.0 or x >= b:
+            continue
+        k = int(x)
+        t = g - (lf(k + 1) + lf(min_gb - k + 1) + lf(m_sample - k + 1)
+                 + lf(max_gb - m_sample + k + 1))
+        if u * (4.0 - u) - 3.0 <= t:
+            break
+        if u * (u - t) >= 1:
+            continue
+        if 2.0 * math.log(u) <= t:
+            break
+
+    if good > bad:
+        k = m_sample - k
+    if m_sample < nsample:
+        k = good - k
+    return k
+
+
+def sample_hypergeometric(rng, good: int, bad: int, nsample: int) -> int:
+    """
+    Number of 'good' items when drawing nsample items without replacement
+    from good + bad items.
+
+    Small spreads use inversion by chop-down search outward from the mode;
+    large spreads use ratio-of-uniforms. Both are exact, memory is O(1) and
+    the cost does not depend on the population size.
+    `rng` only needs a .random() method (random.Random or the random module).
+    """
+    total = good + bad
+    if nsample <= 0 or good <= 0:
+        return 0
+    if bad <= 0:
+        return nsample
+    if nsample >= total:
+        return good
+
+    lo = max(0, nsample - bad)
+    hi = min(good, nsample)
+    if lo == hi:
+        return lo
+
+    var = nsample * (good / total) * (bad / total) * (total - nsample) / (total - 1)
+    if var > _HYPERGEOM_INVERSION_MAX_SD ** 2:
+        return _hypergeometric_hrua(rng, good, bad, nsample)
+
+    mode = (nsample + 1) * (good + 1) // (total + 2)
+    mode = min(max(mode, lo), hi)
+    p_mode = math.exp(_log_comb(good, mode) + _log_comb(bad, nsample - mode)
+                      - _log_comb(total, nsample))
+
+    u = rng.random() - p_mode
+    if u <= 0:
+        return mode
+
+    up_x, up_p = mode, p_mode
+    down_x, down_p = mode, p_mode
+    while up_x < hi or down_x > lo:
+        if up_x < hi:
+            # p(x+1) / p(x)
+            up_p *= (good - up_x) * (nsample - up_x) / ((up_x + 1) * (bad - nsample + up_x + 1))
+            up_x += 1
+            u -= up_p
+            if u <= 0:
+                return up_x
+        if down_x > lo:
+            # p(x-1) / p(x)
+            down_p *= down_x * (bad - nsample + down_x) / ((good - down_x + 1) * (nsample - down_x + 1))
+            down_x -= 1
+            u -= down_p
+            if u <= 0:
+                return down_x
+    # Only reachable through float round-off in the pmf sum.
+    return mode
+
+
+def sample_multivariate_hypergeometric(rng, capacities: List[int], nsample: int) -> List[int]:
+    """
+    Draw nsample items without replacement from groups of the given sizes
+    and return how many came from each group.
+
+    Same distribution as random.sample() over a list holding capacities[i]
+    copies of item i, then counting the picks, but without building that list.
+    """
+    counts = [0] * len(capacities)
+    remaining = sum(capacities)
+    for i, cap in enumerate(capacities):
+        if nsample <= 0:
+            break
+        remaining -= cap
+        x = sample_hypergeometric(rng, cap, remaining, nsample)
+        counts[i] = x
+        nsample -= x
+    return counts
+
+
+def team_seed(game_seed: str, team_index: int) -> int:
+    """
+    Per-team RNG seed derived from the game seed and the team's position.
+    Stable across processes and Python versions (unlike hash()).
+    """
+    digest = hashlib.sha256(f"{game_seed}:{team_index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _draw_team_extras(seeds: List[int], capacities: List[int], k_extra: int) -> List[List[int]]:
+    """
+    Extras per commodity for each seed. Module-level so a process pool
+    can pickle it; each team only depends on its own seed.
+    """
+    return [
+        sample_multivariate_hypergeometric(random.Random(seed), capacities, k_extra)
+        for seed in seeds
+    ]
+
+
+# Initial allocations of recent configs, so re-initializing the game with the
+# same setup reuses them instead of drawing again.
+_PORTFOLIO_CACHE: "OrderedDict[tuple, List[Dict[str, int]]]" = OrderedDict()
+_PORTFOLIO_CACHE_SIZE = 4
+
+# Below this many teams a process pool costs more than it saves.
+_PARALLEL_MIN_TEAMS = 2000
+
+
+def new_portfolio_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for generate_initial_portfolios_with_ranges. Uses the
+    spawn start method: forking a multithreaded process (e.g. the server,
+    with its writer threads and held locks) is unsafe. The workers are
+    started here (spawning is slow), so create the pool up front and
+    reuse it.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    list(pool.map(abs, range(workers)))
+    return pool
+
+
 def generate_initial_portfolios_with_ranges(
     game_state: GameState,
-    target_value_hint: float = 2_000_000.0
+    target_value_hint: float = 2_000_000.0,
+    workers: int = 1,
+    pool: Optional[ProcessPoolExecutor] = None,
 ) -> float:
     """
     SAFEST & FINAL VERSION:
@@ -230,8 +1233,19 @@ def generate_initial_portfolios_with_ranges(
     - Slightly wider holding bands (for trading)
     - Ensures enough liquidity but prevents hoarding
     - Zero risk of slack_total / K_extra errors
+    - Extras are drawn per team from a multivariate hypergeometric over
+      per-commodity capacities (no per-unit slot list), so time and memory
+      do not grow with target_value_hint; elapsed time is stored in
+      game_state.portfolio_generation_s
+    - Each team has its own RNG seeded from (game seed, team index); the
+      global random module is never touched. With workers > 1 large team
+      counts are drawn in `workers` chunks on a process pool (`pool`, or a
+      temporary one from new_portfolio_pool), with identical results for
+      any number of workers.
+    - Allocations are cached per config (commodities, ratios, team count,
+      target) and reused when the game is re-initialized identically.
     """
-    import random
+    started = time.perf_counter()
 
     if not game_state.commodities:
         raise ValueError("No commodities defined.")
@@ -247,7 +1261,6 @@ def generate_initial_portfolios_with_ranges(
     # 0. Deterministic seed
     # -----------------------------------------
     seed_key = f"{len(game_state.teams)}-{len(commodities)}-{int(target_value_hint)}"
-    random.seed(seed_key)
 
     # -----------------------------------------
     # 1. Base units calculation
@@ -315,39 +1328,82 @@ def generate_initial_portfolios_with_ranges(
         K_extra = slack_total
 
     # -----------------------------------------
-    # 4. Build base-unit slots for allocating extras
+    # 4. Per-commodity capacity for extras (in base units)
     # -----------------------------------------
-    base_unit_slots = []
+    capacities = []
     for cname, c in commodities.items():
         r = c.base_ratio
-        capacity = (c.alloc_max_units - c.alloc_min_units) // r
-        if capacity > 0:
-            base_unit_slots.extend([cname] * capacity)
+        capacities.append(max(0, (c.alloc_max_units - c.alloc_min_units) // r))
 
     # Emergency safety
-    if len(base_unit_slots) == 0:
+    if sum(capacities) < K_extra:
         K_extra = 0
 
     # -----------------------------------------
-    # 5. Allocate per team
+    # 5. Allocate per team (or reuse a cached allocation)
     # -----------------------------------------
-    for team in game_state.teams.values():
-        team.holdings = {
-            cname: c.alloc_min_units for cname, c in commodities.items()
-        }
-
-        if K_extra > 0 and len(base_unit_slots) >= K_extra:
-            picks = random.sample(base_unit_slots, K_extra)
-            for cname in picks:
-                team.holdings[cname] += commodities[cname].base_ratio
-
-        # Enforce holding band
-        for cname, c in commodities.items():
-            q = team.holdings[cname]
-            if q < c.min_units:
-                team.holdings[cname] = c.min_units
-            if q > c.max_units:
-                team.holdings[cname] = c.max_units
+    cache_key = (
+        tuple((cname, c.base_ratio) for cname, c in commodities.items()),
+        len(game_state.teams),
+        int(target_value_hint),
+    )
+    cached = _PORTFOLIO_CACHE.get(cache_key)
+    if cached is not None:
+        _PORTFOLIO_CACHE.move_to_end(cache_key)
+        for team, holdings in zip(game_state.teams.values(), cached):
+            team.holdings = dict(holdings)
+    else:
+        n_teams = len(game_state.teams)
+        if K_extra > 0:
+            seeds = [team_seed(seed_key, i) for i in range(n_teams)]
+            if workers > 1 and n_teams >= _PARALLEL_MIN_TEAMS:
+                chunk = -(-n_teams // workers)
+                own_pool = pool is None
+                if own_pool:
+                    pool = new_portfolio_pool(workers)
+                try:
+                    parts = pool.map(
+                        _draw_team_extras,
+                        [seeds[i:i + chunk] for i in range(0, n_teams, chunk)],
+                        [capacities] * workers,
+                        [K_extra] * workers,
+                    )
+                    all_extras = [row for part in parts for row in part]
+                finally:
+                    if own_pool:
+                        pool.shutdown()
+            else:
+                all_extras = _draw_team_extras(seeds, capacities, K_extra)
+        else:
+            all_extras = [None] * n_teams
+
+        for team, extras in zip(game_state.teams.values(), all_extras):
+            team.holdings = {
+                cname: c.alloc_min_units for cname, c in commodities.items()
+            }
+
+            if extras is not None:
+                for (cname, c), n in zip(commodities.items(), extras):
+                    team.holdings[cname] += n * c.base_ratio
+
+            # Enforce holding band
+            for cname, c in commodities.items():
+                q = team.holdings[cname]
+                if q < c.min_units:
+                    team.holdings[cname] = c.min_units
+                if q > c.max_units:
+                    team.holdings[cname] = c.max_units
+
+        _PORTFOLIO_CACHE[cache_key] = [dict(t.holdings) for t in game_state.teams.values()]
+        while len(_PORTFOLIO_CACHE) > _PORTFOLIO_CACHE_SIZE:
+            _PORTFOLIO_CACHE.popitem(last=False)
+
+    # Re-attach array-backed holdings if the game uses them
+    if game_state.holdings_matrix is not None:
+        game_state.enable_holdings_matrix()
+    game_state.leaderboard_index.mark_all()
+    game_state.portfolio_generation_s = time.perf_counter() - started
+    game_state.bump_version()
 
     # -----------------------------------------
     # Return portfolio rupee value
@@ -400,16 +1456,11 @@ def compute_net_demand(game_state: GameState, round_no: int) -> Dict[str, float]
 
     Positive => net buying (more received than given)
     Negative => net selling (more given than received)
+
+    Reads the running per-round totals kept by GameState.record_trade,
+    so the cost does not grow with the length of the game.
     """
-    net = {cname: 0.0 for cname in game_state.commodities.keys()}
-    for tr in game_state.trades:
-        if tr.round_no != round_no:
-            continue
-        for cname, qty in tr.give.items():
-            net[cname] = net.get(cname, 0.0) - qty
-        for cname, qty in tr.receive.items():
-            net[cname] = net.get(cname, 0.0) + qty
-    return net
+    return game_state.round_net_demand(round_no)
 
 
 def update_ratios_auto(
@@ -426,9 +1477,12 @@ def update_ratios_auto(
     - base_ratio = units of this commodity equivalent to 1 base.
     - Higher demand => ratio decreases (more valuable).
     - Higher supply => ratio increases (cheaper).
+
+    Returns the names of the commodities whose proposed ratio was
+    clamped by the circuit breaker in this update.
     """
     if game_state.current_round == 0:
-        return
+        return []
 
     net = compute_net_demand(game_state, game_state.current_round)
     total_abs = sum(abs(v) for v in net.values()) or 1.0
@@ -436,6 +1490,7 @@ def update_ratios_auto(
     # Must exist (we'll add it in start_round)
     round_open = getattr(game_state, "round_open_ratios", None) or {}
 
+    clamped_names: List[str] = []
     for cname, c in game_state.commodities.items():
         if cname == game_state.base_commodity:
             c.base_ratio = 1
@@ -462,12 +1517,15 @@ def update_ratios_auto(
         upper = max(lower + 1, int(round(open_ratio * (1.0 + circuit_pct))))
 
         clamped = min(max(proposed, lower), upper)
+        if clamped != proposed:
+            clamped_names.append(cname)
 
         c.base_ratio = clamped
 
     # Ensure base stays 1
     if game_state.base_commodity in game_state.commodities:
         game_state.commodities[game_state.base_commodity].base_ratio = 1
+    return clamped_names
 
 
 # ---------------------------------------------------------------------
@@ -478,14 +1536,13 @@ def teams_with_trades_in_round(game_state: GameState, round_no: int) -> set[str]
     """
     Return set of team names that participated in at least one trade
     in the given round (as buyer or seller).
+
+    Read from the per-round index kept by GameState.record_trade.
     """
-    active = set()
-    for tr in game_state.trades:
-        if tr.round_no != round_no:
-            continue
-        active.add(tr.from_team)
-        active.add(tr.to_team)
-    return active
+    idx = game_state.round_index.get(round_no)
+    if idx is None:
+        return set()
+    return set(idx.active_teams)
 
 
 def check_min_max_violation(game_state: GameState, team: Team) -> bool:
@@ -501,28 +1558,83 @@ def check_min_max_violation(game_state: GameState, team: Team) -> bool:
     return False
 
 
+def band_violations(game_state: GameState, team: Team) -> List[str]:
+    """
+    Names of the commodities whose min/max holding band the team breaks.
+    """
+    out = []
+    for cname, c in game_state.commodities.items():
+        qty = team.holdings.get(cname, 0)
+        if (c.min_units and qty < c.min_units) or (c.max_units and qty > c.max_units):
+            out.append(cname)
+    return out
+
+
+def _round_violations(game_state: GameState) -> List[List[str]]:
+    """
+    Band violations for every team (in team order), in one batched pass
+    over the holdings matrix when it is available.
+    """
+    m = game_state._matrix_current()
+    if m is None:
+        return [band_violations(game_state, t) for t in game_state.teams.values()]
+
+    cols = m.commodity_names
+    mins = np.array([game_state.commodities[c].min_units or 0 for c in cols], dtype=np.int64)
+    maxs = np.array([game_state.commodities[c].max_units or 0 for c in cols], dtype=np.int64)
+    broken = ((m.units < mins) & (mins > 0)) | ((m.units > maxs) & (maxs > 0))
+
+    out = [[] for _ in m.team_names]
+    for row, col in zip(*np.nonzero(broken)):
+        out[row].append(cols[col])
+    return out
+
+
 def apply_round_penalties(
     game_state: GameState,
     round_no: int,
     no_trade_penalty_rate: float = 0.10,
     range_penalty_rate: float = 0.10
-):
+) -> Dict[str, PenaltyBreakdown]:
     """
     Apply penalties at end of a round:
 
     - 10% of total portfolio value if team did NOT trade in the round.
     - 10% of total portfolio value if team violates any min/max quantity.
-    """
-    active = teams_with_trades_in_round(game_state, round_no)
 
-    for tname, team in game_state.teams.items():
-        value = team.value_rs(game_state.commodities)
-        # 1) No-trade penalty
-        if tname not in active:
-            p = value * no_trade_penalty_rate
-            game_state.penalties_rs[tname] = game_state.penalties_rs.get(tname, 0.0) + p
+    All teams are evaluated in one batched pass: no-trade flags come from
+    the round's activity bitmap, band violations from comparing the
+    holdings matrix with the min/max vectors, values from one
+    matrix-vector product.
 
+    Returns (and stores in game_state.penalty_history[round_no]) a
+    per-team PenaltyBreakdown.
+    """
+    flags = game_state.round_activity_flags(round_no)
+    values = game_state.team_values_rs()
+    violations = _round_violations(game_state)
+
+    breakdown: Dict[str, PenaltyBreakdown] = {}
+    for pos, tname in enumerate(game_state.teams):
+        value = values[tname]
+        entry = PenaltyBreakdown(
+            team=tname,
+            value_rs=value,
+            traded=bool(flags[pos]),
+            violated_commodities=violations[pos],
+        )
+        # 1) No-trade penalty
+        if not entry.traded:
+            entry.no_trade_penalty_rs = value * no_trade_penalty_rate
         # 2) Min/max violation penalty
-        if check_min_max_violation(game_state, team):
-            p2 = value * range_penalty_rate
-            game_state.penalties_rs[tname] = game_state.penalties_rs.get(tname, 0.0) + p2
+        if entry.violated_commodities:
+            entry.band_penalty_rs = value * range_penalty_rate
+
+        if not entry.traded or entry.violated_commodities:
+            game_state.penalties_rs[tname] = game_state.penalties_rs.get(tname, 0.0) + entry.total_rs
+            game_state.leaderboard_index.mark_teams(tname)
+        breakdown[tname] = entry
+
+    game_state.penalty_history[round_no] = breakdown
+    game_state.bump_version()
+    return breakdown
@@ -0,0 +1,145 @@
+"""
+instrumented_lock.py
+
+A threading.Lock that measures contention, used for the server's state_lock.
+
+For every acquisition it records:
+
+- wait time: how long the caller blocked before getting the lock
+  (zero when the lock was free: an uncontended acquire is a single
+  non-blocking try, no clock read),
+- hold time: how long the lock was held.
+
+Totals and maxima cover every acquisition since the last reset(); the
+percentiles are computed over the most recent `window` contended waits
+and holds. An optional observer(wait_s, hold_s) is called after every
+release (e.g. to feed metrics histograms).
+
+    lock = InstrumentedLock()
+    with lock:
+        ...
+    lock.stats()   # {"acquisitions": ..., "wait": {...}, "hold": {...}}
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from percentiles import percentile
+
+
+def summarize(values) -> Dict[str, Any]:
+    """
+    count / mean / p50 / p95 / p99 / max of a list of durations in seconds.
+    """
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_s": (sum(ordered) / len(ordered)) if ordered else None,
+        "p50_s": percentile(ordered, 50),
+        "p95_s": percentile(ordered, 95),
+        "p99_s": percentile(ordered, 99),
+        "max_s": ordered[-1] if ordered else None,
+    }
+
+
+class InstrumentedLock:
+    """
+    Non-reentrant lock with wait / hold time statistics.
+    Supports `with lock:` and acquire() / release() like threading.Lock.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._window = window
+        self._acquired_at = 0.0
+        self._wait = 0.0
+        self.observer: Optional[Callable[[float, float], None]] = None
+        self.reset()
+
+    def reset(self):
+        with self._stats_lock:
+            self.acquisitions = 0
+            self.contended = 0
+            self.total_wait_s = 0.0
+            self.max_wait_s = 0.0
+            self.total_hold_s = 0.0
+            self.max_hold_s = 0.0
+            self._waits: Deque[float] = deque(maxlen=self._window)
+            self._holds: Deque[float] = deque(maxlen=self._window)
+            self._since = time.monotonic()
+
+    # -----------------------------------------------------
+    # Lock protocol
+    # -----------------------------------------------------
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        wait = 0.0
+        if not self._lock.acquire(False):
+            if not blocking:
+                return False
+            started = time.perf_counter()
+            if not self._lock.acquire(True, timeout):
+                return False
+            wait = time.perf_counter() - started
+        self._acquired_at = time.perf_counter()
+        self._wait = wait
+
+        with self._stats_lock:
+            self.acquisitions += 1
+            if wait:
+                self.contended += 1
+                self.total_wait_s += wait
+                if wait > self.max_wait_s:
+                    self.max_wait_s = wait
+                self._waits.append(wait)
+        return True
+
+    def release(self):
+        hold = time.perf_counter() - self._acquired_at
+        wait = self._wait
+        self._lock.release()
+        with self._stats_lock:
+            self.total_hold_s += hold
+            if hold > self.max_hold_s:
+                self.max_hold_s = hold
+            self._holds.append(hold)
+        observer = self.observer
+        if observer is not None:
+            observer(wait, hold)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    # -----------------------------------------------------
+    # Introspection
+    # -----------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits = list(self._waits)
+            holds = list(self._holds)
+            elapsed = time.monotonic() - self._since
+            return {
+                "window_s": elapsed,
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "contended_ratio": (self.contended / self.acquisitions) if self.acquisitions else None,
+                "total_wait_s": self.total_wait_s,
+                "max_wait_s": self.max_wait_s,
+                "total_hold_s": self.total_hold_s,
+                "max_hold_s": self.max_hold_s,
+                # Share of wall time the lock was held (1.0 = fully serialized)
+                "utilization": (self.total_hold_s / elapsed) if elapsed > 0 else None,
+                "wait": summarize(waits),    # contended acquisitions only
+                "hold": summarize(holds),
+            }
@@ -0,0 +1,427 @@
+"""
+load_test.py
+
+Load test for the Barter Charter server: a simulated trading floor.
+
+One client thread per team terminal (or fewer, see --clients) plus a few
+viewer threads that poll the leaderboard and prices the way the chart
+console does. For every round the master starts the round, all terminals
+are released at the same moment and submit randomized multi-leg trades
+for their teams, and the master ends the round once they are done.
+
+Reported per endpoint: request count, throughput, p50/p95/p99/max
+latency, rejected trades (4xx: pair limit, stale holdings) and errors
+(5xx, timeouts, connection failures). The server's state_lock wait and
+hold times come from /admin/lock_stats.
+
+    python load_test.py --teams 85 --rounds 3 --trades-per-team 5 --out run.json
+    python load_test.py --compare run.json        # same run, print the deltas
+    python load_test.py --url http://127.0.0.1:8000 ...
+
+Without --url the server app is started in-process on a free localhost
+port, with its journal, checkpoint and Excel files in a temporary
+directory; the usual BARTER_* environment variables still apply.
+With --url the test re-initializes the game on that server.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from percentiles import percentile
+
+
+COMMODITIES = [
+    ("Land", 1), ("Gold", 4), ("Oil", 8), ("Wheat", 20), ("Steel", 10),
+    ("Copper", 12), ("Cotton", 25), ("Silver", 6), ("Coal", 30), ("Rice", 18),
+]
+
+
+# ---------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------
+
+class Recorder:
+    """
+    Thread-safe log of (endpoint, outcome, latency) for every request.
+    outcome: "ok", "rejected" (4xx) or "error" (5xx / no response).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        self.error_details: Dict[str, int] = defaultdict(int)
+
+    def add(self, endpoint: str, outcome: str, latency_s: float, detail: Optional[str] = None):
+        with self._lock:
+            self.samples[endpoint].append((outcome, latency_s))
+            if outcome == "error" and detail:
+                self.error_details[f"{endpoint}: {detail}"] += 1
+
+    def summary(self, duration_s: float) -> Dict[str, Any]:
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+        endpoints = {}
+        for endpoint, rows in sorted(samples.items()):
+            latencies = sorted(lat for _, lat in rows)
+            counts = defaultdict(int)
+            for outcome, _ in rows:
+                counts[outcome] += 1
+            endpoints[endpoint] = {
+                "requests": len(rows),
+                "ok": counts["ok"],
+                "rejected": counts["rejected"],
+                "errors": counts["error"],
+                "error_rate": counts["error"] / len(rows),
+                "rejection_rate": counts["rejected"] / len(rows),
+                "throughput_rps": len(rows) / duration_s if duration_s > 0 else None,
+                "latency_ms": {
+                    "mean": sum(latencies) / len(latencies) * 1e3,
+                    "p50": percentile(latencies, 50) * 1e3,
+                    "p95": percentile(latencies, 95) * 1e3,
+                    "p99": percentile(latencies, 99) * 1e3,
+                    "max": latencies[-1] * 1e3,
+                },
+            }
+        return endpoints
+
+
+class Client:
+    """
+    One terminal: its own HTTP session, every request timed and recorded.
+    """
+
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call(self, method: str, path: str, endpoint: Optional[str] = None,
+             **kwargs) -> Optional[requests.Response]:
+        endpoint = endpoint or f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            r = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.add(endpoint, "error", time.perf_counter() - started, type(e).__name__)
+            return None
+        latency = time.perf_counter() - started
+        if r.status_code < 400:
+            self.recorder.add(endpoint, "ok", latency)
+        elif r.status_code < 500:
+            self.recorder.add(endpoint, "rejected", latency)
+        else:
+            self.recorder.add(endpoint, "error", latency, str(r.status_code))
+        return r
+
+    def close(self):
+        self.session.close()
+
+
+# ---------------------------------------------------------------------
+# Simulated traffic
+# ---------------------------------------------------------------------
+
+def random_trade(rng: random.Random, team: str, teams: List[str],
+                 holdings: Dict[str, Dict[str, int]], max_legs: int) -> Optional[Dict[str, Any]]:
+    """
+    A trade that is valid against `holdings` (the terminal's last view):
+    1..max_legs legs per side, each a small share of what the side owns.
+    """
+    partner = rng.choice([t for t in teams if t != team])
+    sides = []
+    for owner in (team, partner):
+        owned = [c for c, units in holdings[owner].items() if units > 0]
+        if not owned:
+            return None
+        legs = rng.sample(owned, rng.randint(1, min(max_legs, len(owned))))
+        sides.append([
+            {"commodity": c, "qty": rng.randint(1, max(1, holdings[owner][c] // 20))}
+            for c in legs
+        ])
+    return {"from_team": team, "to_team": partner, "give": sides[0], "receive": sides[1]}
+
+
+def run_terminal(client: Client, my_teams: List[str], teams: List[str],
+                 trades_per_team: int, max_legs: int, seed: int,
+                 start: threading.Barrier):
+    rng = random.Random(seed)
+    start.wait()
+    r = client.call("GET", "/state/teams")
+    if r is None or r.status_code != 200:
+        return
+    holdings = {t["name"]: t["holdings"] for t in r.json()["teams"]}
+    for _ in range(trades_per_team):
+        for team in my_teams:
+            trade = random_trade(rng, team, teams, holdings, max_legs)
+            if trade is not None:
+                client.call("POST", "/trade", json=trade)
+
+
+def run_viewer(client: Client, interval_s: float, stop: threading.Event):
+    """
+    Poll like the chart console: conditional GETs, incremental prices.
+    """
+    etags: Dict[str, str] = {}
+    since = 0
+    while not stop.is_set():
+        for path, endpoint, params in (
+            ("/state/leaderboard", None, None),
+            ("/state/prices", "GET /state/prices?since", {"since": since, "format": "columns"}),
+        ):
+            headers = {"If-None-Match": etags[path]} if path in etags else {}
+            r = client.call("GET", path, endpoint, params=params, headers=headers)
+            if r is not None and r.status_code == 200:
+                if "ETag" in r.headers:
+                    etags[path] = r.headers["ETag"]
+                if path == "/state/prices":
+                    since = r.json().get("last_trade_index", since)
+        stop.wait(interval_s)
+
+
+def play(base_url: str, args) -> Dict[str, Any]:
+    recorder = Recorder()
+    master = Client(base_url, recorder, args.timeout)
+
+    r = master.call("POST", "/admin/init_game", json={
+        "commodities": [{"name": n, "ratio": ratio} for n, ratio in COMMODITIES],
+        "base_commodity": "Land",
+        "num_teams": args.teams,
+        "target_value_hint": 2_000_000,
+        "max_trades_per_pair": args.max_trades_per_pair,
+    })
+    if r is None or r.status_code != 200:
+        raise SystemExit(f"init_game failed: {r.status_code if r is not None else 'no response'}")
+    teams = [t["name"] for t in master.call("GET", "/state/teams").json()["teams"]]
+    n_clients = min(args.clients or len(teams), len(teams))
+    clients = [Client(base_url, recorder, args.timeout) for _ in range(n_clients)]
+    viewers = [Client(base_url, recorder, args.timeout) for _ in range(args.viewers)]
+
+    # Only the trading floor counts, not the init above
+    recorder.samples.clear()
+    master.call("POST", "/admin/lock_stats/reset")
+
+    stop_viewers = threading.Event()
+    viewer_threads = [
+        threading.Thread(target=run_viewer, args=(v, args.viewer_interval, stop_viewers), daemon=True)
+        for v in viewers
+    ]
+    started = time.perf_counter()
+    for t in viewer_threads:
+        t.start()
+
+    for rnd in range(1, args.rounds + 1):
+        master.call("POST", "/round/start", json={"news": f"Load test round {rnd}"})
+        start = threading.Barrier(n_clients)
+        threads = [
+            threading.Thread(target=run_terminal, args=(
+                c, teams[i::n_clients], teams, args.trades_per_team, args.max_legs,
+                args.seed * 100_003 + rnd * 1_009 + i, start,
+            ))
+            for i, c in enumerate(clients)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        master.call("POST", "/round/end")
+
+    duration_s = time.perf_counter() - started
+    stop_viewers.set()
+    for t in viewer_threads:
+        t.join()
+
+    lock = master.call("GET", "/admin/lock_stats")
+    lock_stats = lock.json() if lock is not None and lock.status_code == 200 else None
+    endpoints = recorder.summary(duration_s)
+    for c in clients + viewers + [master]:
+        c.close()
+
+    trades = endpoints.get("POST /trade", {})
+    total = sum(e["requests"] for e in endpoints.values())
+    errors = sum(e["errors"] for e in endpoints.values())
+    return {
+        "summary": {
+            "duration_s": duration_s,
+            "requests": total,
+            "throughput_rps": total / duration_s,
+            "trades_accepted": trades.get("ok", 0),
+            "trades_per_s": trades.get("ok", 0) / duration_s,
+            "error_rate": errors / total if total else 0.0,
+        },
+        "endpoints": endpoints,
+        "lock": lock_stats,
+        "error_details": dict(recorder.error_details),
+    }
+
+
+# ---------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(workdir: str):
+    """
+    Run server.app under uvicorn on a background thread. Returns (url, stop).
+    """
+    import uvicorn
+
+    os.chdir(workdir)
+    # Always the temp dir: init_game resets the journal and discards the
+    # checkpoint, so never point them at an operator's real files
+    os.environ["BARTER_JOURNAL"] = os.path.join(workdir, "commands.jsonl")
+    os.environ["BARTER_CHECKPOINT"] = os.path.join(workdir, "checkpoint.bin")
+    import server
+
+    port = free_port()
+    srv = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=srv.run, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not srv.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise SystemExit("Server did not start.")
+        time.sleep(0.05)
+
+    def stop():
+        srv.should_exit = True
+        thread.join(timeout=60)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    s = result["summary"]
+    print(f"duration {s['duration_s']:.2f}s, {s['requests']} requests, "
+          f"{s['throughput_rps']:.0f} req/s, {s['trades_accepted']} trades "
+          f"({s['trades_per_s']:.0f}/s), error rate {s['error_rate']:.2%}")
+    print()
+    print(f"{'endpoint':32} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'rej':>6} {'err':>5}")
+    for endpoint, e in result["endpoints"].items():
+        lat = e["latency_ms"]
+        line = (f"{endpoint:32} {e['requests']:7d} {e['throughput_rps']:8.1f} {lat['p50']:8.2f} "
+                f"{lat['p95']:8.2f} {lat['p99']:8.2f} {lat['max']:8.2f} "
+                f"{e['rejected']:6d} {e['errors']:5d}")
+        old = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if old:
+            line += f"   p95 {_delta(lat['p95'], old['latency_ms']['p95'])}"
+        print(line)
+
+    lock = result.get("lock")
+    if lock:
+        wait = lock["wait"]
+        print()
+        print(f"state_lock: {lock['acquisitions']} acquisitions, "
+              f"{lock['contended_ratio'] or 0:.1%} contended, held {lock['utilization'] or 0:.1%} of the time, "
+              f"total wait {lock['total_wait_s']:.3f}s")
+        if wait["count"]:
+            print(f"  wait when contended: p50 {wait['p50_s'] * 1e3:.2f} ms, "
+                  f"p95 {wait['p95_s'] * 1e3:.2f} ms, p99 {wait['p99_s'] * 1e3:.2f} ms, "
+                  f"max {wait['max_s'] * 1e3:.2f} ms")
+    if result["error_details"]:
+        print()
+        for detail, count in sorted(result["error_details"].items()):
+            print(f"  {count:5d} x {detail}")
+    if baseline:
+        old = baseline["summary"]
+        print()
+        print(f"vs {baseline['meta'].get('git_revision')}: throughput "
+              f"{_delta(s['throughput_rps'], old['throughput_rps'])}, trades/s "
+              f"{_delta(s['trades_per_s'], old['trades_per_s'])}")
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old:+.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--url", help="test a running server instead of an in-process one")
+    parser.add_argument("--teams", type=int, default=85)
+    parser.add_argument("--clients", type=int, default=0,
+                        help="concurrent trading terminals (default: one per team)")
+    parser.add_argument("--viewers", type=int, default=4,
+                        help="threads polling leaderboard and prices")
+    parser.add_argument("--viewer-interval", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--trades-per-team", type=int, default=5,
+                        help="trades each team submits per round")
+    parser.add_argument("--max-legs", type=int, default=3, help="legs per side, at most")
+    parser.add_argument("--max-trades-per-pair", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+    if args.out:
+        args.out = os.path.abspath(args.out)  # the in-process server changes directory
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    stop = None
+    base_url = args.url
+    if base_url is None:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        base_url, stop = start_local_server(tempfile.mkdtemp(prefix="barter_load_"))
+    try:
+        result = play(base_url.rstrip("/"), args)
+    finally:
+        if stop is not None:
+            stop()
+
+    result["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": args.url or "in-process",
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nresults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
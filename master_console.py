@@ -322,7 +322,18 @@ class MasterConsoleApp:
         if "error" in resp:
             messagebox.showerror("Error", resp["error"])
         else:
-            messagebox.showinfo("End Round", str(resp))
+            msg = resp.get("message", str(resp))
+            penalized = resp.get("penalized_teams", [])
+            if penalized:
+                lines = [
+                    f"{p['team']}: Rs {p['total_rs']:,.0f}"
+                    + ("" if p["traded"] else " (no trade)")
+                    + (f" (band: {', '.join(p['violated_commodities'])})"
+                       if p["violated_commodities"] else "")
+                    for p in penalized
+                ]
+                msg += "\n\nPenalized teams:\n" + "\n".join(lines)
+            messagebox.showinfo("End Round", msg)
 
     # -------------------------------------------------------
     # LEADERBOARD
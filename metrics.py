@@ -0,0 +1,274 @@
+"""
+metrics.py
+
+Minimal Prometheus instrumentation for the Barter Charter server
+(no client library needed): counters, histograms and callback gauges in
+a Registry that renders the Prometheus text exposition format (0.0.4).
+
+Stage timing uses a StageClock: lap("name") records the time since the
+previous lap (or since the clock was created) in a histogram labelled
+with the command and the stage:
+
+    clock = registry.stage_clock("trade")   # or NULL_CLOCK when disabled
+    ...validate...
+    clock.lap("validate")
+    ...apply...
+    clock.lap("record_trade")
+
+When metrics are off the server uses NULL_CLOCK, whose lap() does
+nothing, and installs no middleware and no observers, so the hot paths
+only pay for a few no-op method calls.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Latency buckets in seconds: 50 us .. 10 s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter, optionally labelled.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+                for labels, v in items]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus semantics), optionally labelled.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last = +Inf), sum, count]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, labels: Labels = ()) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose value is read at scrape time.
+    fn returns a number, or {label values tuple: number}; None = no sample.
+    """
+
+    def __init__(self, kind: str, name: str, help: str,
+                 fn: Callable[[], Union[None, float, Dict[Labels, float]]],
+                 labelnames: Sequence[str] = ()):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        value = self.fn()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+                for labels, v in sorted(value.items())]
+
+
+class StageClock:
+    """
+    Times consecutive stages of one command (see module docstring).
+    """
+
+    __slots__ = ("histogram", "command", "_last")
+
+    def __init__(self, histogram: Histogram, command: str):
+        self.histogram = histogram
+        self.command = command
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.histogram.observe(now - self._last, (self.command, stage))
+        self._last = now
+
+
+class _NullClock:
+    __slots__ = ()
+
+    def lap(self, stage: str):
+        pass
+
+
+NULL_CLOCK = _NullClock()
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: request duration by method, route template and status.
+
+    The route template ("/state/trades", not the concrete URL) keeps the
+    label set bounded; requests that match no route are labelled
+    "unmatched". Paths in `skip` (long-lived streams, the scrape itself)
+    are not timed.
+    """
+
+    def __init__(self, app, histogram: Histogram, skip: Sequence[str] = ()):
+        self.app = app
+        self.histogram = histogram
+        self.skip = frozenset(skip)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.histogram.observe(
+                time.perf_counter() - started,
+                (scope["method"], path, str(status["code"])),
+            )
+
+
+class Registry:
+    """
+    Holds every metric and renders them for /metrics.
+    """
+
+    def __init__(self, stage_metric: str = "stage_duration_seconds", namespace: str = ""):
+        self.namespace = namespace
+        self._metrics: list = []
+        self._names = set()
+        self._stages = self.histogram(
+            stage_metric, "Time spent in each stage of a command.", ("command", "stage")
+        )
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def _register(self, metric):
+        if metric.name in self._names:
+            raise ValueError(f"Duplicate metric name: {metric.name}")
+        self._names.add(metric.name)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self._full_name(name), help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self._full_name(name), help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, fn, labelnames: Sequence[str] = ()):
+        return self._register(CallbackMetric("gauge", self._full_name(name), help, fn, labelnames))
+
+    def counter_callback(self, name: str, help: str, fn, labelnames: Sequence[str] = ()):
+        return self._register(CallbackMetric("counter", self._full_name(name), help, fn, labelnames))
+
+    def stage_clock(self, command: str) -> StageClock:
+        return StageClock(self._stages, command)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics:
+            lines = metric.render()
+            if not lines:
+                continue
+            out.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
@@ -0,0 +1,18 @@
+"""
+percentiles.py
+
+Small statistics helpers shared by the server instrumentation, the load
+test and the headless simulator. Standard library only.
+"""
+
+from typing import Optional
+
+
+def percentile(sorted_values, q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile (q in 0..100) of an already sorted sequence.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-q * len(sorted_values) // 100)))  # ceil
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,232 @@
+"""
+price_history.py
+
+Columnar price history for the Barter Charter live charts.
+
+One snapshot is recorded after every trade (and once at init). Instead of
+one small dict per commodity per snapshot, the history is kept as typed
+arrays:
+
+- trade_index   array('q')   shared x-axis column
+- round_no      array('i')   shared round column
+- prices[name]  array('d')   one float64 column per commodity
+
+Reads can return the original shape
+    {"Gold": [{"trade_index": 0, "round": 0, "price": 250.0}, ...], ...}
+a compact columnar shape, or a downsampled view (min/max-preserving
+buckets or LTTB) capped at N points per series.
+"""
+
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+
+
+DOWNSAMPLE_MINMAX = "minmax"
+DOWNSAMPLE_LTTB = "lttb"
+
+
+class PriceHistory:
+    """
+    Append-only, array-backed price history.
+
+    record() appends the price columns first and the trade_index column
+    last, and readers cut every column at len(trade_index), so a reader
+    running alongside a writer always sees whole snapshots.
+
+    Readers may pass `stop` (a row count seen earlier, e.g. by a state
+    snapshot) to read the history exactly as it was at that point.
+    """
+
+    def __init__(self, commodity_names: Iterable[str] = ()):
+        self.trade_index = array("q")
+        self.round_no = array("i")
+        self.prices: Dict[str, array] = {cname: array("d") for cname in commodity_names}
+
+    # -----------------------------------------------------
+    # Writing
+    # -----------------------------------------------------
+
+    def record(self, trade_index: int, round_no: int, prices: Dict[str, float]):
+        """
+        Append one snapshot (price of every commodity at this trade_index).
+        """
+        n = len(self.trade_index)
+        for cname, price in prices.items():
+            col = self.prices.get(cname)
+            if col is None:
+                # Commodity added mid-game: backfill earlier rows with its first price
+                col = self.prices[cname] = array("d", [price]) * n
+            col.append(price)
+        self.round_no.append(round_no)
+        self.trade_index.append(trade_index)
+
+    # -----------------------------------------------------
+    # Reading
+    # -----------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.trade_index)
+
+    @property
+    def commodity_names(self) -> List[str]:
+        return list(self.prices.keys())
+
+    def _stop(self, stop: Optional[int]) -> int:
+        n = len(self.trade_index)
+        return n if stop is None else min(stop, n)
+
+    def last_trade_index(self, stop: Optional[int] = None) -> Optional[int]:
+        n = self._stop(stop)
+        return self.trade_index[n - 1] if n else None
+
+    def start_after(self, since: Optional[int], stop: int) -> int:
+        """
+        Row of the first snapshot with trade_index > since (0 if since is None).
+        """
+        if since is None:
+            return 0
+        return bisect_right(self.trade_index, since, 0, stop)
+
+    def _names(self, commodities: Optional[List[str]]) -> List[str]:
+        if not commodities:
+            return list(self.prices.keys())
+        unknown = [c for c in commodities if c not in self.prices]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        return list(commodities)
+
+    def _rows_as_points(self, cname: str, rows: Iterable[int]) -> List[dict]:
+        ti, rn, col = self.trade_index, self.round_no, self.prices[cname]
+        return [{"trade_index": ti[i], "round": rn[i], "price": col[i]} for i in rows]
+
+    def as_points(self, since: Optional[int] = None,
+                  commodities: Optional[List[str]] = None,
+                  stop: Optional[int] = None) -> Dict[str, List[dict]]:
+        """
+        Original response shape: {commodity: [{"trade_index", "round", "price"}, ...]}.
+        Raises KeyError for unknown commodities.
+        """
+        names = self._names(commodities)
+        stop = self._stop(stop)
+        start = self.start_after(since, stop)
+        return {cname: self._rows_as_points(cname, range(start, stop)) for cname in names}
+
+    def as_columns(self, since: Optional[int] = None,
+                   commodities: Optional[List[str]] = None,
+                   stop: Optional[int] = None) -> Dict[str, object]:
+        """
+        Compact shape: shared trade_index / round columns plus one price list
+        per commodity.
+        """
+        names = self._names(commodities)
+        stop = self._stop(stop)
+        start = self.start_after(since, stop)
+        return {
+            "trade_index": self.trade_index[start:stop].tolist(),
+            "round": self.round_no[start:stop].tolist(),
+            "prices": {cname: self.prices[cname][start:stop].tolist() for cname in names},
+        }
+
+    def downsampled(self, max_points: int, method: str = DOWNSAMPLE_MINMAX,
+                    since: Optional[int] = None,
+                    commodities: Optional[List[str]] = None,
+                    stop: Optional[int] = None) -> Dict[str, List[dict]]:
+        """
+        Like as_points(), but each series has at most max_points points.
+        Raises KeyError for unknown commodities, ValueError for a bad method.
+        """
+        if method == DOWNSAMPLE_MINMAX:
+            pick = minmax_indices
+        elif method == DOWNSAMPLE_LTTB:
+            pick = lttb_indices
+        else:
+            raise ValueError(f"Unknown downsampling method: {method}")
+
+        names = self._names(commodities)
+        stop = self._stop(stop)
+        start = self.start_after(since, stop)
+        xs = self.trade_index[start:stop]
+        out = {}
+        for cname in names:
+            ys = self.prices[cname][start:stop]
+            rows = pick(xs, ys, max_points)
+            out[cname] = self._rows_as_points(cname, (start + i for i in rows))
+        return out
+
+
+# ---------------------------------------------------------------------
+# DOWNSAMPLING
+# ---------------------------------------------------------------------
+
+def minmax_indices(xs, ys, max_points: int) -> List[int]:
+    """
+    Split the series into buckets and keep each bucket's min and max
+    (in x order), plus the first and last point. Price spikes survive.
+    """
+    n = len(ys)
+    if n <= max_points or max_points < 4:
+        return list(range(n)) if n <= max_points else _evenly_spaced(n, max_points)
+
+    n_buckets = (max_points - 2) // 2
+    inner = n - 2
+    out = [0]
+    for b in range(n_buckets):
+        lo = 1 + b * inner // n_buckets
+        hi = 1 + (b + 1) * inner // n_buckets
+        if lo >= hi:
+            continue
+        i_min = i_max = lo
+        for i in range(lo + 1, hi):
+            if ys[i] < ys[i_min]:
+                i_min = i
+            elif ys[i] > ys[i_max]:
+                i_max = i
+        if i_min == i_max:
+            out.append(i_min)
+        else:
+            out.extend(sorted((i_min, i_max)))
+    out.append(n - 1)
+    return out
+
+
+def lttb_indices(xs, ys, max_points: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: keeps the points that best preserve
+    the visual shape of the line.
+    """
+    n = len(ys)
+    if n <= max_points or max_points < 3:
+        return list(range(n)) if n <= max_points else _evenly_spaced(n, max_points)
+
+    every = (n - 2) / (max_points - 2)
+    out = [0]
+    a = 0
+    for b in range(max_points - 2):
+        # Average of the next bucket (the third triangle vertex)
+        nxt_lo = int((b + 1) * every) + 1
+        nxt_hi = min(int((b + 2) * every) + 1, n)
+        if nxt_hi <= nxt_lo:
+            nxt_lo, nxt_hi = n - 1, n
+        cnt = nxt_hi - nxt_lo
+        avg_x = sum(xs[nxt_lo:nxt_hi]) / cnt
+        avg_y = sum(ys[nxt_lo:nxt_hi]) / cnt
+
+        lo = int(b * every) + 1
+        hi = int((b + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+def _evenly_spaced(n: int, k: int) -> List[int]:
+    if k <= 1:
+        return [n - 1] if k == 1 else []
+    return [round(i * (n - 1) / (k - 1)) for i in range(k)]
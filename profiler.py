@@ -0,0 +1,215 @@
+"""
+profiler.py
+
+In-process sampling profiler for the live server.
+
+A background thread wakes every `interval_s`, reads every thread's
+current Python stack with sys._current_frames() and counts identical
+stacks. Nothing is traced or patched, so the profiled code runs at full
+speed; the cost is one stack walk per thread per sample, paid by the
+sampler thread (under the GIL, never under state_lock).
+
+The result is in "collapsed stack" format, one line per distinct stack,
+root first, which flamegraph.pl, speedscope and inferno read directly:
+
+    MainThread;server.py:post_trade;server.py:run_command;game_engine.py:GameState.record_trade [engine] 42
+
+Frames from the engine and the Excel logger are tagged with [engine] /
+[excel] (see MARKED_MODULES) so they stand out in the text and can be
+searched / highlighted in a flame graph.
+
+Threads that are only waiting (event loop select, queue / condition
+waits, socket accept) are left out unless include_idle is set. Threads
+waiting for state_lock are kept: that is contention, not idleness.
+
+The sampler can only look at the other threads when it holds the GIL,
+so short pure-Python calls that never give the GIL up are
+under-sampled. With fast_switch=True, run() lowers the interpreter
+switch interval to a tenth of the sampling interval for the duration of
+the profile (and restores it), so busy threads are preempted often
+enough to be caught mid-call. That setting is process-wide and changes
+GIL / lock hand-off for the code being measured, so it is off by
+default.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# module file -> tag appended to its frames
+MARKED_MODULES = {
+    "game_engine.py": "[engine]",
+    "excel_logger.py": "[excel]",
+}
+
+# (file, function) of a leaf frame that means "this thread is idle"
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("base_events.py", "_run_once"),
+}
+
+
+def _frame_label(code, lineno: int, lines: bool) -> Tuple[str, str]:
+    filename = os.path.basename(code.co_filename)
+    name = getattr(code, "co_qualname", code.co_name)
+    label = f"{filename}:{name}:{lineno}" if lines else f"{filename}:{name}"
+    tag = MARKED_MODULES.get(filename)
+    if tag:
+        label = f"{label} {tag}"
+    return filename, label
+
+
+def _is_idle(leaf: Tuple[str, str]) -> bool:
+    return leaf in IDLE_LEAVES
+
+
+class SamplingProfiler:
+    """
+    One profiling run. start(), then stop() (or run(duration) for both).
+    """
+
+    def __init__(self, interval_s: float = 0.005, include_idle: bool = False, lines: bool = False,
+                 fast_switch: bool = False):
+        if interval_s <= 0:
+            raise ValueError("interval_s must be positive")
+        self.interval_s = interval_s
+        self.include_idle = include_idle
+        self.lines = lines
+        self.fast_switch = fast_switch
+
+        self.stacks: Counter = Counter()
+        self.samples = 0          # sampling ticks
+        self.thread_samples = 0   # stacks recorded (ticks x busy threads)
+        self.idle_skipped = 0
+        self.duration_s = 0.0
+        self.sampling_time_s = 0.0  # time spent walking stacks
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Threads not sampled: the sampler itself, and a caller of run()
+        # (it only sleeps)
+        self._skip: Set[int] = set()
+        # code object -> (filename, label): stack walks mostly hit the same code
+        self._labels: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+
+    def _label(self, frame) -> Tuple[str, str]:
+        code = frame.f_code
+        key = (code, frame.f_lineno if self.lines else 0)
+        cached = self._labels.get(key)
+        if cached is None:
+            cached = self._labels[key] = _frame_label(code, frame.f_lineno, self.lines)
+        return cached
+
+    def sample_once(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in self._skip:
+                continue
+            stack: List[str] = []
+            leaf = None
+            while frame is not None:
+                filename, label = self._label(frame)
+                if leaf is None:
+                    leaf = (filename, frame.f_code.co_name)
+                stack.append(label)
+                frame = frame.f_back
+            if not self.include_idle and leaf is not None and _is_idle(leaf):
+                self.idle_skipped += 1
+                continue
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.thread_samples += 1
+        self.samples += 1
+
+    def _run(self):
+        self._skip.add(threading.get_ident())
+        started = time.perf_counter()
+        next_tick = started
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            self.sample_once()
+            self.sampling_time_s += time.perf_counter() - t0
+            next_tick += self.interval_s
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                next_tick = time.perf_counter()  # fell behind: don't burst
+                delay = 0
+            self._stop.wait(delay)
+        self.duration_s = time.perf_counter() - started
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self, duration_s: float) -> "SamplingProfiler":
+        """
+        Profile for duration_s from the calling thread (which is not sampled).
+        """
+        self._skip.add(threading.get_ident())
+        old = sys.getswitchinterval()
+        if self.fast_switch:
+            sys.setswitchinterval(min(old, self.interval_s / 10))
+        self.start()
+        try:
+            time.sleep(duration_s)
+        finally:
+            self.stop()
+            if self.fast_switch:
+                sys.setswitchinterval(old)
+        return self
+
+    # -----------------------------------------------------
+    # Output
+    # -----------------------------------------------------
+
+    def collapsed(self) -> str:
+        """
+        Collapsed stacks, most frequent first.
+        """
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Totals, share of samples inside each marked module, hottest frames.
+        """
+        total = self.thread_samples
+        marked = {tag: 0 for tag in MARKED_MODULES.values()}
+        self_time: Counter = Counter()
+        per_thread: Counter = Counter()
+        for stack, count in self.stacks.items():
+            per_thread[stack[0]] += count
+            self_time[stack[-1]] += count
+            for tag in marked:
+                if any(frame.endswith(tag) for frame in stack[1:]):
+                    marked[tag] += count
+        return {
+            "duration_s": self.duration_s,
+            "interval_s": self.interval_s,
+            "fast_switch": self.fast_switch,
+            "samples": self.samples,
+            "thread_samples": total,
+            "idle_skipped": self.idle_skipped,
+            "sampler_overhead_s": self.sampling_time_s,
+            "threads": dict(per_thread.most_common()),
+            "inside": {tag: (n / total if total else 0.0) for tag, n in marked.items()},
+            "top_self": [
+                {"frame": frame, "samples": n, "share": n / total}
+                for frame, n in self_time.most_common(top)
+            ],
+        }
+
@@ -0,0 +1,131 @@
+"""
+response_cache.py
+
+Cache of encoded JSON response bodies for the Barter Charter read endpoints.
+
+- Entries are keyed by (endpoint path, normalized query string) and
+  belong to one state tag (the ETag, i.e. game epoch + state version).
+- The first lookup or store with a newer tag drops every entry:
+  a mutation invalidates the whole cache at once, without the writer
+  having to know which endpoints it affected. Lookups and stores with
+  an older tag of the same game (a reader still on the previous
+  snapshot) miss / are ignored and leave the cache alone.
+- Bounded size, least-recently-used entries are evicted first.
+
+So N viewers polling the same leaderboard cost one build + one JSON
+encode per state change instead of one per request.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def encode_json(payload: Any) -> bytes:
+    """
+    Same bytes FastAPI's JSONResponse would send.
+    """
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of encoded response bodies for one state tag.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._tag: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _switch_tag(self, tag: str):
+        # Caller holds self._lock
+        if tag != self._tag:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._tag = tag
+
+    def get(self, tag: str, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if tag != self._tag:
+                if self._tag is not None and _is_older(tag, self._tag):
+                    self.misses += 1
+                    return None
+                self._switch_tag(tag)
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, tag: str, key: Hashable, body: bytes):
+        with self._lock:
+            if tag != self._tag:
+                # Only store for the newest tag seen; an older tag means the
+                # body was built while the state was changing under it.
+                if self._tag is not None and _is_older(tag, self._tag):
+                    return
+                self._switch_tag(tag)
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(len(b) for b in self._entries.values()),
+                "tag": self._tag,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+def _split_tag(tag: str):
+    # W/"18deecbdda258098-42" -> ("18deecbdda258098", 42)
+    body = tag[2:] if tag.startswith("W/") else tag
+    epoch, _, version = body.strip('"').rpartition("-")
+    try:
+        return epoch, int(version)
+    except ValueError:
+        return epoch, None
+
+
+def _is_older(tag: str, than: str) -> bool:
+    """
+    True if both tags are from the same game and `tag` has the lower version.
+    """
+    epoch, version = _split_tag(tag)
+    other_epoch, other_version = _split_tag(than)
+    if epoch != other_epoch or version is None or other_version is None:
+        return False
+    return version < other_version
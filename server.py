@@ -5,14 +5,45 @@ FastAPI back-end for the Barter Charter simulation.
 
 Responsibilities:
 - Hold a single global GameState.
-- Hold a single ExcelLogger for barter_charter.xlsx.
+- Hold a single ExcelLogger for barter_charter.xlsx, driven by a
+  background writer thread (AsyncExcelWriter) so requests never wait
+  for logging. Rows go to an append-only journal; the .xlsx is rebuilt
+  from it at init, at each round end, on demand and at shutdown.
 - Expose HTTP endpoints for:
     * Initializing the game (commodities, teams, portfolios)
     * Starting / ending rounds
-    * Recording trades (multi-commodity)
+    * Recording trades (multi-commodity), singly or in batches
     * Exposing teams, leaderboard, commodities
     * Exposing price history for live charts
     * Exposing trades list for the Master Console log
+    * Exposing per-round net demand / volume totals
+    * Exposing which teams have not traded yet this round
+    * Exposing per-round penalty breakdowns
+    * Pushing trades, price ticks, rounds and penalties as they happen
+      over Server-Sent Events (/stream)
+- Serve every read (GET /state/*, /meta/*) from an immutable snapshot
+  of the state (state_snapshot.py), published after each committed
+  mutation, so reads never take state_lock and never see half-applied
+  trades.
+- Append every mutating command (init, round start/end, trade, trade
+  batch) to a write-ahead journal (command_journal.py) before
+  acknowledging it, and replay that journal on startup to rebuild the
+  exact state after a crash. If the journal cannot be written, the
+  server goes read-only (serving the last journaled state) until it is
+  restarted.
+- Write binary checkpoints (checkpoint.py) every CHECKPOINT_EVERY
+  commands and at each round end, in the background; startup loads the
+  checkpoint and replays only the journal records after it.
+- Tag every read with an ETag built from the snapshot's state version, and answer If-None-Match with 304 Not Modified
+  while nothing has changed. Encoded bodies are cached per
+  (endpoint, query, state version) in a bounded LRU (response_cache.py),
+  so many viewers polling the same data cost one encode per change.
+- With BARTER_METRICS=1, expose Prometheus metrics at /metrics (metrics.py):
+  request latency per endpoint, time per stage of each command, trades,
+  rejections by reason, state_lock wait/hold, price history and Excel
+  writer. Disabled, the instrumentation is a few no-op calls.
+- Profile the live server on demand (POST /admin/profile): an in-process
+  sampling profiler (profiler.py) returns collapsed stacks for flame graphs.
 
 Price behaviour:
 - After EACH trade:
@@ -25,11 +56,16 @@ Price behaviour:
     * Log the current commodity state and portfolios to Excel
 """
 
-from typing import List, Optional, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional, Dict, Any, Tuple
+import os
 import threading
+import time
 
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
 from game_engine import (
@@ -38,17 +74,77 @@ from game_engine import (
     Team,
     update_prices_from_ratios,
     generate_initial_portfolios_with_ranges,
+    new_portfolio_pool,
     update_ratios_auto,
     apply_round_penalties,
+    REPRICE_PER_TRADE,
+    REPRICE_PER_BATCH,
+)
+from excel_logger import ExcelLogger, AsyncExcelWriter
+from price_history import PriceHistory, DOWNSAMPLE_MINMAX, DOWNSAMPLE_LTTB
+from response_cache import ResponseCache, encode_json
+from state_snapshot import StateSnapshot, take_snapshot
+from command_journal import CommandJournal, read_records, truncate_torn_tail
+from checkpoint import CheckpointWriter, capture_checkpoint, load_checkpoint
+from instrumented_lock import InstrumentedLock
+from metrics import NULL_CLOCK, Registry, RequestMetricsMiddleware
+from profiler import SamplingProfiler
+from event_stream import (
+    EventBroadcaster,
+    sse_stream,
+    EVENT_GAME_INIT,
+    EVENT_TRADE,
+    EVENT_PRICE,
+    EVENT_ROUND_START,
+    EVENT_ROUND_END,
+    EVENT_PENALTIES,
 )
-from excel_logger import ExcelLogger
 
 
 # ---------------------------------------------------------------------
 # FastAPI app
 # ---------------------------------------------------------------------
 
-app = FastAPI(title="Barter Charter Server")
+# Command journal (write-ahead log of every state change).
+# Empty BARTER_JOURNAL disables journaling and startup recovery.
+JOURNAL_PATH = os.environ.get("BARTER_JOURNAL", "barter_charter_commands.jsonl")
+# fsync after this many commands (1 = every command, 0 = leave it to the OS)
+JOURNAL_FSYNC_EVERY = int(os.environ.get("BARTER_JOURNAL_FSYNC_EVERY", "1"))
+# ...or at the latest this long after the oldest unsynced command
+JOURNAL_FSYNC_INTERVAL_S = float(os.environ.get("BARTER_JOURNAL_FSYNC_INTERVAL_S", "0.05"))
+# Binary checkpoint (needs the journal). Empty BARTER_CHECKPOINT disables it.
+CHECKPOINT_PATH = os.environ.get("BARTER_CHECKPOINT", "barter_charter_checkpoint.bin")
+# Checkpoint after this many journaled commands (and at every round end)
+CHECKPOINT_EVERY = int(os.environ.get("BARTER_CHECKPOINT_EVERY", "500"))
+# Processes for initial portfolio generation, started once at startup
+# (0/1 = draw in the server process)
+PORTFOLIO_WORKERS = int(os.environ.get("BARTER_PORTFOLIO_WORKERS", "0"))
+# Prometheus metrics at /metrics (off by default)
+METRICS_ENABLED = os.environ.get("BARTER_METRICS", "0") not in ("", "0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global portfolio_pool
+
+    # Startup: rebuild the game from the command journal, if there is one
+    recover_from_journal()
+    # Portfolio workers are spawned now, not forked from a busy server later
+    if PORTFOLIO_WORKERS > 1:
+        portfolio_pool = new_portfolio_pool(PORTFOLIO_WORKERS)
+    yield
+    if portfolio_pool is not None:
+        portfolio_pool.shutdown()
+    # Shutdown: make sure every queued Excel row reaches the file
+    if excel_logger is not None:
+        excel_logger.close()
+    if checkpoint_writer is not None:
+        checkpoint_writer.close()
+    if command_journal is not None:
+        command_journal.close()
+
+
+app = FastAPI(title="Barter Charter Server", lifespan=lifespan)
 
 # CORS configuration so browser JS (including ngrok) can call the API
 app.add_middleware(
@@ -57,26 +153,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],          # includes custom 'ngrok-skip-browser-warning'
+    expose_headers=["ETag"],      # let browser JS read it for If-None-Match
 )
 
 
 # Global state (single game instance for the event)
 game_state: Optional[GameState] = None
-excel_logger: Optional[ExcelLogger] = None
+excel_logger: Optional[AsyncExcelWriter] = None
 # Global set to remember which rounds have already been ended
 ended_rounds = set()
+# Changes with every init_game, so ETags from an earlier game never match
+game_epoch: str = ""
+# Encoded read responses for the current state version
+response_cache = ResponseCache(max_entries=256)
+# Latest published read-only snapshot (replaced, never modified)
+state_snapshot: Optional[StateSnapshot] = None
 
 
-# Global price history for charts
-# price_history[commodity_name] = list of dicts:
-#   { "trade_index": int, "round": int, "price": float }
-price_history: Dict[str, List[Dict[str, Any]]] = {}
+# Global price history for charts (columnar, see price_history.py):
+# shared trade_index / round columns + one float64 column per commodity
+price_history = PriceHistory()
 
 # Global trade counter (for indexing price snapshots)
 global_trade_counter: int = 0
 
+# Live event stream (SSE fan-out) and how many trades have been published
+events = EventBroadcaster()
+trades_published: int = 0
+
+# Write-ahead command journal, and the result of the last startup replay
+command_journal: Optional[CommandJournal] = None
+replaying: bool = False
+last_replay: Optional[Dict[str, Any]] = None
+# Set when a journal write failed: every later command is refused until
+# restart (which recovers the last journaled state)
+journal_error: Optional[str] = None
+# Background checkpoint writer and the journal seq of the last capture
+checkpoint_writer: Optional[CheckpointWriter] = None
+last_checkpoint_seq: int = 0
+# Process pool for portfolio generation (BARTER_PORTFOLIO_WORKERS)
+portfolio_pool: Optional[ProcessPoolExecutor] = None
+
+# Metrics registry (None = disabled) and the stage clock of the command
+# running under state_lock (NULL_CLOCK outside run_command and when disabled)
+metrics: Optional[Registry] = None
+stage_clock = NULL_CLOCK
+# Event stream / Excel calls of the command running under state_lock, held
+# back until it is journaled (None = outside run_command: run them at once)
+deferred_effects: Optional[List[Tuple[Callable[..., Any], tuple]]] = None
+# Set by a handler whose command changed nothing: it is neither journaled
+# nor checkpointed (e.g. a repeated /round/end)
+command_noop: bool = False
+# Metrics updated from the command paths (created by setup_metrics)
+metric_commands = metric_trades = metric_rejections = metric_excel_write = None
+# One profiling run at a time
+profile_lock = threading.Lock()
+# Longest profile /admin/profile accepts
+PROFILE_MAX_SECONDS = 120.0
+
 # Lock to avoid race conditions when multiple terminals submit trades
-state_lock = threading.Lock()
+# (instrumented: /admin/lock_stats reports wait and hold times)
+state_lock = InstrumentedLock()
 
 
 # ---------------------------------------------------------------------
@@ -93,6 +230,9 @@ class InitGameRequest(BaseModel):
     base_commodity: str
     num_teams: int
     target_value_hint: float  # e.g. 2000000 (20 lakhs)
+    max_trades_per_pair: int = 1  # trades allowed per team pair per round
+    portfolio_workers: int = 1    # chunks for initial portfolio generation (on the
+                                  # BARTER_PORTFOLIO_WORKERS pool; same result for any value)
 
 
 class StartRoundRequest(BaseModel):
@@ -111,6 +251,11 @@ class TradeRequest(BaseModel):
     receive: List[TradeLeg]   # multi-commodity allowed
 
 
+class TradeBatchRequest(BaseModel):
+    trades: List[TradeRequest]
+    reprice: str = REPRICE_PER_TRADE  # or "per_batch"
+
+
 # ---------------------------------------------------------------------
 # Utility functions
 # ---------------------------------------------------------------------
@@ -123,6 +268,275 @@ def ensure_game_initialized():
         )
 
 
+def publish_snapshot(changed_teams: Optional[List[str]] = None, full: bool = False) -> None:
+    """
+    Publish a new read snapshot of game_state. Call under state_lock after
+    a mutation is complete (including its price snapshot).
+
+    changed_teams: teams whose holdings changed (None = all of them).
+    full: start over instead of sharing with the previous snapshot (new game).
+
+    Skipped while replaying the journal; replay publishes once at the end.
+    """
+    global state_snapshot
+
+    if replaying:
+        return
+    state_snapshot = take_snapshot(
+        game_state,
+        game_epoch,
+        price_history,
+        previous=None if full else state_snapshot,
+        changed_teams=changed_teams
+    )
+
+
+def current_snapshot() -> StateSnapshot:
+    snap = state_snapshot
+    if snap is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Game is not initialized. Call /admin/init_game first."
+        )
+    return snap
+
+
+def state_etag(snap: StateSnapshot) -> str:
+    """
+    Weak ETag for a snapshot (game epoch + GameState.version).
+    """
+    return f'W/"{snap.epoch}-{snap.version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    True if the request's If-None-Match already names this ETag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    # Weak comparison: W/"x" and "x" match
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+
+def versioned_response(request: Request,
+                       build: Callable[[StateSnapshot], Dict[str, Any]]) -> Response:
+    """
+    Serve a read endpoint from the latest snapshot, with its ETag.
+
+    - If-None-Match matches: 304 with no body, build() is not called.
+    - Cached body for this path + query at this version: sent as is.
+    - Otherwise: build(snapshot), encode once, cache.
+
+    No lock is taken: the snapshot is immutable, so body and ETag always
+    describe the same state.
+    """
+    snap = current_snapshot()
+    etag = state_etag(snap)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Query parameters sorted: ?a=1&b=2 and ?b=2&a=1 share an entry
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    body = response_cache.get(etag, key)
+    if body is None:
+        body = encode_json(build(snap))
+        response_cache.put(etag, key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Journaled command names
+CMD_INIT_GAME = "init_game"
+CMD_START_ROUND = "start_round"
+CMD_TRADE = "trade"
+CMD_TRADE_BATCH = "trade_batch"
+CMD_END_ROUND = "end_round"
+
+# Rejection reason for malformed legs (the engine's REJECT_* cover the rest)
+REJECT_INVALID_QTY = "invalid_qty"
+
+
+def run_command(name: str, req: Optional[BaseModel] = None) -> Dict[str, Any]:
+    """
+    Apply a mutating command under state_lock and journal it before
+    returning (i.e. before the client gets its acknowledgement).
+    Commands that raise (rejected trades, bad input) or report a no-op
+    (command_noop) are not journaled.
+
+    The command's event stream messages and Excel rows (see defer) are
+    released only once it is journaled. If the journal write fails, they
+    are dropped, the command's snapshot is withdrawn (reads go back to the
+    last journaled state) and the server refuses every further command
+    with 503 until it is restarted.
+    """
+    global stage_clock, state_snapshot, deferred_effects, command_noop
+
+    handler, _ = COMMANDS[name]
+    clock = metrics.stage_clock(name) if metrics is not None else NULL_CLOCK
+    with state_lock:
+        clock.lap("lock_wait")
+        stage_clock = clock
+        try:
+            if journal_error is not None:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server is read-only: the command journal could not be written "
+                           f"({journal_error}). Restart it to recover the journaled state."
+                )
+            journaled_snapshot = state_snapshot
+            deferred_effects = effects = []
+            command_noop = False
+            try:
+                result = handler(req)
+                if not command_noop:
+                    try:
+                        journal_command(name, req)
+                    except HTTPException:
+                        state_snapshot = journaled_snapshot
+                        response_cache.clear()
+                        raise
+            finally:
+                deferred_effects = None
+            clock.lap("journal")
+            for fn, args in effects:
+                fn(*args)
+            clock.lap("side_effects")
+            if not command_noop and (name == CMD_END_ROUND or (
+                    command_journal is not None
+                    and command_journal.last_seq - last_checkpoint_seq >= CHECKPOINT_EVERY)):
+                take_checkpoint()
+                clock.lap("checkpoint")
+        finally:
+            stage_clock = NULL_CLOCK
+    if metrics is not None:
+        metric_commands.inc((name,))
+    return result
+
+
+def defer(fn: Callable[..., Any], *args) -> None:
+    """
+    Call fn(*args) once the running command is journaled (at once outside
+    run_command, e.g. during replay). For side effects other processes see:
+    event stream messages and Excel rows.
+    """
+    if deferred_effects is None:
+        fn(*args)
+    else:
+        deferred_effects.append((fn, args))
+
+
+def journal_command(name: str, req: Optional[BaseModel]) -> None:
+    """
+    Append an applied command to the journal (no-op while replaying or
+    with journaling disabled). init_game starts a fresh journal.
+    Raises 503 on a write error and sets journal_error (read-only mode).
+    """
+    global command_journal, journal_error
+
+    if replaying or not JOURNAL_PATH:
+        return
+    try:
+        if name == CMD_INIT_GAME:
+            if command_journal is None:
+                command_journal = CommandJournal(
+                    JOURNAL_PATH, JOURNAL_FSYNC_EVERY, JOURNAL_FSYNC_INTERVAL_S
+                )
+            # Old checkpoint first: it must never be paired with the new journal
+            discard_checkpoint()
+            command_journal.reset()
+        if command_journal is not None:
+            command_journal.append(name, req.model_dump() if req is not None else {})
+    except OSError as e:
+        journal_error = f"{type(e).__name__}: {e}"
+        raise HTTPException(
+            status_code=503,
+            detail=f"Command could not be written to the journal ({e}); "
+                   f"the server is read-only until restarted."
+        )
+
+
+def new_excel_writer(logger: Optional[ExcelLogger] = None) -> AsyncExcelWriter:
+    writer = AsyncExcelWriter(logger)
+    if metrics is not None:
+        writer.observer = lambda kind, seconds: metric_excel_write.observe(seconds, (kind,))
+    return writer
+
+
+def count_trades(n: int) -> None:
+    if metrics is not None and not replaying:
+        metric_trades.inc(amount=n)
+
+
+def count_rejection(reason: str) -> None:
+    if metrics is not None and not replaying:
+        metric_rejections.inc((reason or "other",))
+
+
+def flush_excel_for_checkpoint() -> None:
+    # Every Excel row logged before the capture must be on disk before the
+    # checkpoint that covers it (restart does not re-log those rows).
+    if excel_logger is not None and not excel_logger.flush(timeout=60.0):
+        raise RuntimeError("Excel writer did not flush in time.")
+
+
+def take_checkpoint() -> None:
+    """
+    Capture the current state (cheap, under state_lock) and hand it to the
+    background writer, which encodes and writes it without the lock.
+    """
+    global checkpoint_writer, last_checkpoint_seq
+
+    if replaying or command_journal is None or not CHECKPOINT_PATH or state_snapshot is None:
+        return
+    if checkpoint_writer is None:
+        checkpoint_writer = CheckpointWriter(CHECKPOINT_PATH, before_write=flush_excel_for_checkpoint)
+    seq = command_journal.last_seq
+    checkpoint_writer.submit(capture_checkpoint(game_state, state_snapshot, meta={
+        "journal_seq": seq,
+        "journal_first_ts": command_journal.first_ts,
+        "trade_counter": global_trade_counter,
+        "ended_rounds": sorted(ended_rounds),
+    }))
+    last_checkpoint_seq = seq
+
+
+def discard_checkpoint() -> None:
+    global last_checkpoint_seq
+
+    last_checkpoint_seq = 0
+    if checkpoint_writer is not None:
+        checkpoint_writer.discard()
+    elif CHECKPOINT_PATH and os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+
+def legs_to_dict(legs: List[TradeLeg]) -> Dict[str, int]:
+    """
+    Merge trade legs into {commodity: qty}.
+    Raises ValueError if any quantity is not positive.
+    """
+    out: Dict[str, int] = {}
+    for leg in legs:
+        if leg.qty <= 0:
+            raise ValueError("Quantities must be positive.")
+        out[leg.commodity] = out.get(leg.commodity, 0) + leg.qty
+    return out
+
+
+def penalty_breakdown_to_dict(entry) -> Dict[str, Any]:
+    return {
+        "team": entry.team,
+        "value_rs": entry.value_rs,
+        "traded": entry.traded,
+        "no_trade_penalty_rs": entry.no_trade_penalty_rs,
+        "band_penalty_rs": entry.band_penalty_rs,
+        "violated_commodities": entry.violated_commodities,
+        "total_rs": entry.total_rs,
+    }
+
+
 def record_price_snapshot() -> None:
     """
     Take the current prices of all commodities and append to price_history.
@@ -133,15 +547,36 @@ def record_price_snapshot() -> None:
     if game_state is None:
         return
 
-    round_no = game_state.current_round
-    for cname, c in game_state.commodities.items():
-        if cname not in price_history:
-            price_history[cname] = []
-        price_history[cname].append({
-            "trade_index": global_trade_counter,
-            "round": round_no,
-            "price": c.price
+    prices = {cname: c.price for cname, c in game_state.commodities.items()}
+    price_history.record(global_trade_counter, game_state.current_round, prices)
+    # Prices were already bumped by the engine; the history changed after that
+    game_state.bump_version()
+    defer(events.publish, EVENT_PRICE, {
+        "trade_index": global_trade_counter,
+        "round": game_state.current_round,
+        "prices": prices
+    })
+
+
+def publish_new_trades() -> None:
+    """
+    Push every trade recorded since the last call to the event stream.
+    Call under state_lock, before the price snapshot that follows the trades.
+    """
+    global trades_published
+
+    trades = game_state.trades
+    for idx in range(trades_published, len(trades)):
+        tr = trades[idx]
+        defer(events.publish, EVENT_TRADE, {
+            "index": idx + 1,
+            "round_no": tr.round_no,
+            "from_team": tr.from_team,
+            "to_team": tr.to_team,
+            "give": tr.give,
+            "receive": tr.receive
         })
+    trades_published = len(trades)
 
 
 # ---------------------------------------------------------------------
@@ -164,92 +599,125 @@ def init_game(req: InitGameRequest):
     - Create Excel file and log Round 0
     - Initialize price history with snapshot 0
     """
-    global game_state, excel_logger, price_history, global_trade_counter
-
-    with state_lock:
-        if req.num_teams <= 0:
-            raise HTTPException(status_code=400, detail="num_teams must be positive.")
-        if not req.commodities:
-            raise HTTPException(status_code=400, detail="commodities list cannot be empty.")
+    return run_command(CMD_INIT_GAME, req)
 
-        # Create new GameState
-        gs = GameState()
 
-        # Add commodities
-        for ci in req.commodities:
-            if ci.ratio <= 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid ratio for {ci.name}. Must be positive int."
-                )
-            if ci.name in gs.commodities:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Duplicate commodity name: {ci.name}"
-                )
-            gs.commodities[ci.name] = Commodity(
-                name=ci.name,
-                price=0.0,        # will be set from ratios
-                base_ratio=ci.ratio
+def cmd_init_game(req: InitGameRequest) -> Dict[str, Any]:
+    """
+    Apply init_game (caller holds state_lock, see run_command).
+    """
+    global game_state, excel_logger, price_history, global_trade_counter, trades_published
+    global game_epoch
+
+    if req.num_teams <= 0:
+        raise HTTPException(status_code=400, detail="num_teams must be positive.")
+    if not req.commodities:
+        raise HTTPException(status_code=400, detail="commodities list cannot be empty.")
+    if req.max_trades_per_pair <= 0:
+        raise HTTPException(status_code=400, detail="max_trades_per_pair must be positive.")
+
+    # Create new GameState
+    gs = GameState(max_trades_per_pair=req.max_trades_per_pair)
+
+    # Add commodities
+    for ci in req.commodities:
+        if ci.ratio <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid ratio for {ci.name}. Must be positive int."
             )
-
-        # Base commodity must exist
-        if req.base_commodity not in gs.commodities:
+        if ci.name in gs.commodities:
             raise HTTPException(
                 status_code=400,
-                detail=f"Base commodity '{req.base_commodity}' not in commodities."
+                detail=f"Duplicate commodity name: {ci.name}"
             )
-
-        gs.base_commodity = req.base_commodity
-        # Ensure base has ratio 1
-        gs.commodities[req.base_commodity].base_ratio = 1
-
-        # Convert ratios to prices
-        update_prices_from_ratios(gs)
-
-        # Create teams
-        gs.teams = {}
-        for i in range(req.num_teams):
-            name = f"Team {i + 1}"
-            gs.teams[name] = Team(name=name)
-
-        # Round 0 (initial portfolios)
-        gs.current_round = 0
-
-        # Generate portfolios (equal value, integer-only, min/max logic)
-        common_value = generate_initial_portfolios_with_ranges(
-            gs,
-            target_value_hint=req.target_value_hint
+        gs.commodities[ci.name] = Commodity(
+            name=ci.name,
+            price=0.0,        # will be set from ratios
+            base_ratio=ci.ratio
         )
 
-        # Initialize Excel logger and log Round 0
-        excel_logger = ExcelLogger("barter_charter.xlsx")
-        excel_logger.log_commodities(gs.commodities, round_no=0)
-        excel_logger.log_portfolios_round(gs)
-
-        # Initialize global state
-        game_state = gs
+    # Base commodity must exist
+    if req.base_commodity not in gs.commodities:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Base commodity '{req.base_commodity}' not in commodities."
+        )
 
-        # Initialize price history & trade counter
-        price_history = {cname: [] for cname in gs.commodities.keys()}
-        global_trade_counter = 0
-        record_price_snapshot()  # snapshot 0
+    gs.base_commodity = req.base_commodity
+    # Ensure base has ratio 1
+    gs.commodities[req.base_commodity].base_ratio = 1
+
+    # Convert ratios to prices
+    update_prices_from_ratios(gs)
+
+    # Create teams
+    gs.teams = {}
+    for i in range(req.num_teams):
+        name = f"Team {i + 1}"
+        gs.teams[name] = Team(name=name)
+
+    # Round 0 (initial portfolios)
+    gs.current_round = 0
+
+    # Generate portfolios (equal value, integer-only, min/max logic)
+    # Parallel only on the pool started at startup: forking here, under
+    # state_lock and with the writer threads running, is not safe
+    common_value = generate_initial_portfolios_with_ranges(
+        gs,
+        target_value_hint=req.target_value_hint,
+        workers=max(1, req.portfolio_workers) if portfolio_pool is not None else 1,
+        pool=portfolio_pool
+    )
+
+    # Array-backed holdings for bulk valuation (no-op without numpy)
+    gs.enable_holdings_matrix()
+
+    # Start a new Excel log and log Round 0. The writer thread finishes the
+    # previous game's log and creates the new workbook (slow, so not here
+    # under state_lock).
+    if excel_logger is None:
+        excel_logger = new_excel_writer()
+    defer(excel_logger.open_log, lambda: ExcelLogger("barter_charter.xlsx"))
+    defer(excel_logger.log_commodities, gs.commodities, 0)
+    defer(excel_logger.log_portfolios_round, gs)
+    defer(excel_logger.materialize, False)
+
+    # Initialize global state
+    game_state = gs
+    game_epoch = f"{time.time_ns():x}"
+    ended_rounds.clear()
+
+    # Initialize price history & trade counter
+    price_history = PriceHistory(gs.commodities.keys())
+    global_trade_counter = 0
+    trades_published = 0
+    defer(events.publish, EVENT_GAME_INIT, {
+        "num_teams": req.num_teams,
+        "base_commodity": req.base_commodity,
+        "commodities": list(gs.commodities.keys())
+    })
+    record_price_snapshot()  # snapshot 0
+    publish_snapshot(full=True)
 
-        return {
-            "message": "Game initialized.",
-            "num_teams": req.num_teams,
-            "base_commodity": req.base_commodity,
-            "common_portfolio_value": common_value
-        }
+    return {
+        "message": "Game initialized.",
+        "num_teams": req.num_teams,
+        "base_commodity": req.base_commodity,
+        "common_portfolio_value": common_value,
+        "portfolio_generation_s": gs.portfolio_generation_s
+    }
 
 
 @app.get("/meta/commodities")
-def get_commodities():
+def get_commodities(request: Request):
     """
     Get current commodity definitions and prices.
     """
-    ensure_game_initialized()
-    gs = game_state
+    return versioned_response(request, build_commodities)
+
+
+def build_commodities(snap: StateSnapshot) -> Dict[str, Any]:
     return {
         "commodities": [
             {
@@ -263,62 +731,63 @@ def get_commodities():
                 "min_units": getattr(c, "min_units", None),
                 "max_units": getattr(c, "max_units", None),
             }
-            for c in gs.commodities.values()
+            for c in snap.commodities.values()
         ],
-        "base_commodity": gs.base_commodity
+        "base_commodity": snap.base_commodity
     }
 
 
 @app.get("/state/teams")
-def get_teams_state():
+def get_teams_state(request: Request):
     """
     Get current snapshot of all teams (holdings & values).
     """
-    ensure_game_initialized()
-    gs = game_state
-    base = gs.base_commodity
+    return versioned_response(request, build_teams_state)
+
+
+def build_teams_state(snap: StateSnapshot) -> Dict[str, Any]:
+    values_rs = snap.values_rs
+    values_base = snap.values_in_base
     return {
         "teams": [
             {
                 "name": t.name,
-                "holdings": t.holdings,
-                "value_rs": t.value_rs(gs.commodities),
-                "value_base": t.value_in_base(gs.commodities, base)
+                "holdings": dict(t.holdings),
+                "value_rs": values_rs[t.name],
+                "value_base": values_base[t.name]
             }
-            for t in gs.teams.values()
+            for t in snap.teams.values()
         ]
     }
 
 
 @app.get("/state/leaderboard")
-def get_leaderboard():
+def get_leaderboard(request: Request):
     """
     Get leaderboard sorted by effective portfolio value (Rs),
     including penalties breakdown.
     """
-    ensure_game_initialized()
-    gs = game_state
-    base = gs.base_commodity
-    leaders = gs.leaderboard()
+    return versioned_response(request, build_leaderboard)
+
+
+def build_leaderboard(snap: StateSnapshot) -> Dict[str, Any]:
+    values_base = snap.values_in_base
 
     result = []
-    for t in leaders:
-        raw_val = t.value_rs(gs.commodities)
-        penalty = gs.penalties_rs.get(t.name, 0.0)
-        effective = raw_val - penalty
+    for e in snap.leaderboard:
         result.append({
-            "name": t.name,
-            "value_rs": raw_val,
-            "penalty_rs": penalty,
-            "effective_value_rs": effective,
-            "value_base": t.value_in_base(gs.commodities, base)
+            "name": e.name,
+            "value_rs": e.value_rs,
+            "penalty_rs": e.penalty_rs,
+            "effective_value_rs": e.effective_value_rs,
+            "value_base": values_base[e.name]
         })
 
     return {"leaderboard": result}
 
 
 @app.get("/state/trades")
-def get_trades(round: Optional[int] = Query(None)):
+def get_trades(request: Request, round: Optional[int] = Query(None)):
     """
     Return list of trades, optionally filtered by round.
 
@@ -337,13 +806,13 @@ def get_trades(round: Optional[int] = Query(None)):
       ]
     }
     """
-    ensure_game_initialized()
-    gs = game_state
+    return versioned_response(request, lambda snap: build_trades(snap, round))
+
+
+def build_trades(snap: StateSnapshot, round: Optional[int]) -> Dict[str, Any]:
 
     out = []
-    for idx, tr in enumerate(gs.trades):
-        if round is not None and tr.round_no != round:
-            continue
+    for idx, tr in snap.trade_rows(round):
         out.append({
             "index": idx + 1,
             "round_no": tr.round_no,
@@ -356,22 +825,440 @@ def get_trades(round: Optional[int] = Query(None)):
     return {"trades": out}
 
 
+@app.get("/state/demand")
+def get_round_demand(request: Request, round: Optional[int] = Query(None)):
+    """
+    Return the running net demand and gross volume per commodity
+    for a round (defaults to the current round).
+
+    Response:
+    {
+      "round": 2,
+      "net_demand": {"Gold": -12.0, "Oil": 7.0, ...},
+      "gross_volume": {"Gold": 40.0, "Oil": 15.0, ...}
+    }
+    """
+    return versioned_response(request, lambda snap: build_round_demand(snap, round))
+
+
+def build_round_demand(snap: StateSnapshot, round: Optional[int]) -> Dict[str, Any]:
+    round_no = snap.current_round if round is None else round
+    return {
+        "round": round_no,
+        "net_demand": snap.round_net_demand(round_no),
+        "gross_volume": snap.round_gross_volume(round_no),
+    }
+
+
+@app.get("/state/inactive_teams")
+def get_inactive_teams(request: Request):
+    """
+    Teams that have not traded yet in the current round
+    (these will get the no-trade penalty if the round ends now).
+
+    Response:
+    {
+      "round": 2,
+      "teams": ["Team 4", "Team 17", ...],
+      "count": 2
+    }
+    """
+    return versioned_response(request, build_inactive_teams)
+
+
+def build_inactive_teams(snap: StateSnapshot) -> Dict[str, Any]:
+    teams = snap.teams_without_trades()
+    return {
+        "round": snap.current_round,
+        "teams": teams,
+        "count": len(teams),
+    }
+
+
+@app.get("/state/penalties")
+def get_penalties(request: Request, round: Optional[int] = Query(None)):
+    """
+    Per-team penalty breakdown for ended rounds.
+
+    - round given: only that round.
+    - round omitted: every ended round.
+
+    Response:
+    {
+      "penalties": {
+        "1": [
+          {"team": "Team 1", "value_rs": ..., "traded": true,
+           "no_trade_penalty_rs": 0.0, "band_penalty_rs": 265000.0,
+           "violated_commodities": ["Gold"], "total_rs": 265000.0},
+          ...
+        ]
+      },
+      "totals_rs": {"Team 1": 265000.0, ...}
+    }
+    """
+    return versioned_response(request, lambda snap: build_penalties(snap, round))
+
+
+def build_penalties(snap: StateSnapshot, round: Optional[int]) -> Dict[str, Any]:
+    if round is None:
+        rounds = sorted(snap.penalty_history.keys())
+    else:
+        rounds = [round] if round in snap.penalty_history else []
+
+    return {
+        "penalties": {
+            str(r): [penalty_breakdown_to_dict(e) for e in snap.penalty_history[r].values()]
+            for r in rounds
+        },
+        "totals_rs": dict(snap.penalties_rs)
+    }
+
+
+@app.get("/admin/excel_status")
+def get_excel_status():
+    """
+    Health of the background Excel writer.
+
+    Response:
+    {
+      "enabled": true,
+      "queue_depth": 0,          # events waiting to be written
+      "max_queue": 10000,
+      "dropped_events": 0,       # rows dropped while the queue was full
+      "unsaved_rows": 12,        # written to the journal, not yet flushed
+      "lag_s": 0.3,              # age of the oldest event not yet flushed
+      "events_written": 340,
+      "saves": 41,               # journal flushes
+      "last_save_duration_s": 0.0001,
+      "seconds_since_last_save": 0.2,
+      "materializations": 3,     # .xlsx rebuilds
+      "last_materialize_duration_s": 0.4,
+      "last_error": null
+    }
+    """
+    if excel_logger is None:
+        return {"enabled": False}
+    return {"enabled": True, **excel_logger.stats()}
+
+
+@app.post("/admin/excel_flush")
+def flush_excel():
+    """
+    Write everything queued so far to the journal.
+    """
+    if excel_logger is None:
+        raise HTTPException(status_code=400, detail="Excel logging is not active.")
+    if not excel_logger.flush(timeout=60.0):
+        raise HTTPException(status_code=503, detail="Excel writer did not finish in time.")
+    return {"message": "Excel log flushed.", **excel_logger.stats()}
+
+
+@app.post("/admin/excel_materialize")
+def materialize_excel():
+    """
+    Rebuild barter_charter.xlsx from the journal now and wait for it
+    (e.g. before copying the file mid-round).
+    """
+    if excel_logger is None:
+        raise HTTPException(status_code=400, detail="Excel logging is not active.")
+    if not excel_logger.materialize(wait=True, timeout=120.0):
+        raise HTTPException(status_code=503, detail="Excel writer did not finish in time.")
+    return {"message": "Excel file rebuilt.", **excel_logger.stats()}
+
+
+@app.get("/admin/journal_status")
+def get_journal_status():
+    """
+    Command journal health and the last startup replay.
+
+    Response:
+    {
+      "enabled": true,
+      "path": "barter_charter_commands.jsonl",
+      "last_seq": 412,
+      "records_written": 37,       # since this server started
+      "unsynced_records": 0,       # written, not yet fsynced
+      "unsynced_age_s": 0.0,
+      "fsync_every": 1,
+      "fsync_interval_s": 0.05,
+      "fsyncs": 37,
+      "last_fsync_duration_s": 0.002,
+      "last_error": null,
+      "read_only": null,          # journal write error that stopped commands
+      "last_replay": {"records": 375, "checkpoint_seq": 300,
+                      "checkpoint_load_s": 0.01, "replayed": 75,
+                      "applied": 75, "failed": 0,
+                      "torn_tail_cut": false, "duration_s": 0.05},
+      "checkpoint": {"path": ..., "checkpoints_written": 3, "journal_seq": 300,
+                     "size_bytes": 41230, "last_write_duration_s": 0.02,
+                     "seconds_since_last_write": 12.5, "write_pending": false,
+                     "last_error": null}
+    }
+    """
+    checkpoint = checkpoint_writer.stats() if checkpoint_writer is not None else None
+    if command_journal is None:
+        return {
+            "enabled": bool(JOURNAL_PATH),
+            "read_only": journal_error,
+            "last_replay": last_replay,
+            "checkpoint": checkpoint
+        }
+    return {
+        "enabled": True,
+        **command_journal.stats(),
+        "read_only": journal_error,
+        "last_replay": last_replay,
+        "checkpoint": checkpoint
+    }
+
+
+@app.post("/admin/checkpoint")
+def write_checkpoint_now():
+    """
+    Write a checkpoint now and wait for it (e.g. before planned downtime).
+    """
+    ensure_game_initialized()
+    if command_journal is None or not CHECKPOINT_PATH:
+        raise HTTPException(status_code=400, detail="Checkpoints need the command journal.")
+    with state_lock:
+        take_checkpoint()
+    if not checkpoint_writer.wait_idle(timeout=120.0):
+        raise HTTPException(status_code=503, detail="Checkpoint writer did not finish in time.")
+    return {"message": "Checkpoint written.", **checkpoint_writer.stats()}
+
+
+@app.get("/admin/cache_status")
+def get_cache_status():
+    """
+    Read-response cache statistics.
+
+    Response:
+    {
+      "entries": 5, "max_entries": 256, "bytes": 48211,
+      "tag": "W/\"18deecbdda258098-42\"",   # state version cached for
+      "hits": 950, "misses": 50, "hit_rate": 0.95,
+      "invalidations": 12,   # times a state change dropped the cache
+      "evictions": 0         # LRU evictions
+    }
+    """
+    return response_cache.stats()
+
+
+@app.get("/admin/lock_stats")
+def get_lock_stats():
+    """
+    Contention on state_lock since startup (or the last reset).
+
+    Response:
+    {
+      "window_s": 60.2,
+      "acquisitions": 5120, "contended": 830, "contended_ratio": 0.16,
+      "total_wait_s": 1.9, "max_wait_s": 0.04,
+      "total_hold_s": 2.7, "max_hold_s": 0.35,
+      "utilization": 0.045,     # share of wall time the lock was held
+      "wait": {"count": 830, "mean_s": ..., "p50_s": ..., "p95_s": ...,
+               "p99_s": ..., "max_s": ...},   # contended acquisitions
+      "hold": {...}
+    }
+    """
+    return state_lock.stats()
+
+
+@app.post("/admin/lock_stats/reset")
+def reset_lock_stats():
+    """
+    Zero the state_lock statistics (e.g. at the start of a load test).
+    """
+    state_lock.reset()
+    return {"message": "Lock statistics reset."}
+
+
+@app.post("/admin/profile")
+def profile_server(
+    seconds: float = Query(10.0),
+    interval_ms: float = Query(5.0),
+    format: str = Query("collapsed"),
+    include_idle: bool = Query(False),
+    lines: bool = Query(False),
+    fast_switch: bool = Query(False),
+):
+    """
+    Sample every server thread's Python stack for `seconds` while the
+    game keeps running, and return the profile.
+
+    - format=collapsed (default): collapsed stacks, text/plain, one line
+      per stack ("thread;frame;frame;... count"); feed to flamegraph.pl,
+      speedscope or inferno. game_engine frames end in [engine],
+      excel_logger frames in [excel].
+    - format=summary: JSON totals, share of samples inside [engine] /
+      [excel], samples per thread and the hottest leaf frames.
+    - include_idle: keep threads that are only waiting (event loop,
+      idle worker threads).
+    - lines: include line numbers in frames (finer, bigger output).
+    - fast_switch: lower the interpreter switch interval while sampling,
+      so short engine calls are caught more often. Process-wide: it also
+      changes GIL / state_lock hand-off for the trading being measured.
+
+    The profiler never takes state_lock; only one run at a time (409 otherwise).
+
+    Example:
+        curl -X POST 'http://host/admin/profile?seconds=15' > server.folded
+        flamegraph.pl server.folded > server.svg
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]."
+        )
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be at least 1.")
+    if format not in ("collapsed", "summary"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'summary'.")
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    try:
+        prof = SamplingProfiler(
+            interval_s=interval_ms / 1000.0, include_idle=include_idle, lines=lines,
+            fast_switch=fast_switch
+        ).run(seconds)
+    finally:
+        profile_lock.release()
+
+    if format == "summary":
+        return prof.summary()
+    return Response(prof.collapsed(), media_type="text/plain; charset=utf-8")
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text exposition of the server metrics (BARTER_METRICS=1).
+
+    - barter_http_request_duration_seconds{method,path,status}
+    - barter_stage_duration_seconds{command,stage}: lock_wait, parse,
+      validate, record_trade, ratio_update, price_update, price_snapshot,
+      publish_snapshot, excel_enqueue, journal, side_effects, checkpoint, ...
+    - barter_trades_total, barter_trade_rejections_total{reason},
+      barter_commands_total{command}
+    - barter_state_lock_wait_seconds / _hold_seconds (histograms),
+      barter_state_lock_acquisitions_total, barter_state_lock_contended_total
+    - barter_price_history_points, barter_trade_log_size, barter_state_version
+    - barter_excel_write_duration_seconds{kind}, barter_excel_queue_depth
+    """
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (set BARTER_METRICS=1).")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stream")
+async def stream_events(
+    request: Request,
+    since: Optional[int] = Query(None),
+    types: Optional[List[str]] = Query(None),
+):
+    """
+    Server-Sent Events stream of live game events:
+    game_init, trade, price, round_start, round_end, penalties
+    (plus "resync" if the client fell too far behind and should reload
+    state over REST).
+
+    - Each event has an id (sequence number). Browsers' EventSource sends
+      Last-Event-ID on reconnect and the stream resumes after it;
+      ?since=<id> does the same for other clients. Without either, only
+      new events are sent.
+    - types: only these event types (repeatable).
+
+    Example event:
+      id: 42
+      event: trade
+      data: {"index": 17, "round_no": 2, "from_team": "Team 3", ...}
+    """
+    if since is None:
+        last_id = request.headers.get("last-event-id", "")
+        if last_id.isdigit():
+            since = int(last_id)
+
+    return StreamingResponse(
+        sse_stream(events, since, set(types) if types else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/state/prices")
-def get_price_history():
+def get_price_history(
+    request: Request,
+    since: Optional[int] = Query(None),
+    commodity: Optional[List[str]] = Query(None),
+    max_points: Optional[int] = Query(None),
+    method: str = Query(DOWNSAMPLE_MINMAX),
+    format: str = Query("points"),
+):
     """
     Return price history for each commodity.
 
+    Query parameters:
+    - since: only snapshots with trade_index > since (the client's last-seen
+      index). Found by bisecting the trade_index column, so the cost is
+      O(log n + new points), not O(history).
+    - commodity: restrict to these commodities (repeatable).
+    - max_points: downsample each series to at most this many points,
+      using method = "minmax" (keeps each bucket's extremes) or "lttb".
+    - format: "points" (default, shape below) or "columns"
+      ({"trade_index": [...], "round": [...], "prices": {"Gold": [...]}}).
+      Downsampling always uses "points".
+
     Response structure:
     {
       "price_history": {
          "Land": [{"trade_index": 0, "round": 0, "price": 1000.0}, ...],
          "Gold": [...],
          ...
-      }
+      },
+      "last_trade_index": 57,   # high-water mark: pass as ?since= next time
+      "since": null
     }
     """
     ensure_game_initialized()
-    return {"price_history": price_history}
+
+    if max_points is not None and max_points <= 0:
+        raise HTTPException(status_code=400, detail="max_points must be positive.")
+    if method not in (DOWNSAMPLE_MINMAX, DOWNSAMPLE_LTTB):
+        raise HTTPException(
+            status_code=400,
+            detail=f"method must be '{DOWNSAMPLE_MINMAX}' or '{DOWNSAMPLE_LTTB}'."
+        )
+    if format not in ("points", "columns"):
+        raise HTTPException(status_code=400, detail="format must be 'points' or 'columns'.")
+
+    return versioned_response(
+        request,
+        lambda snap: build_price_history(snap, since, commodity, max_points, method, format)
+    )
+
+
+def build_price_history(snap: StateSnapshot, since: Optional[int],
+                        commodity: Optional[List[str]], max_points: Optional[int],
+                        method: str, format: str) -> Dict[str, Any]:
+    # Read the history as of the snapshot (rows before its watermark)
+    ph = snap.price_history
+    stop = snap.price_rows
+    last_trade_index = ph.last_trade_index(stop)
+    try:
+        if max_points is not None:
+            history = ph.downsampled(max_points, method, since=since,
+                                     commodities=commodity, stop=stop)
+        elif format == "columns":
+            history = ph.as_columns(since=since, commodities=commodity, stop=stop)
+        else:
+            history = ph.as_points(since=since, commodities=commodity, stop=stop)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown commodity: {e.args[0]}")
+
+    return {
+        "price_history": history,
+        "last_trade_index": last_trade_index,
+        "since": since
+    }
 
 
 @app.post("/round/start")
@@ -379,12 +1266,20 @@ def start_round(req: StartRoundRequest):
     """
     Start a new round with a news headline.
     """
+    return run_command(CMD_START_ROUND, req)
+
+
+def cmd_start_round(req: StartRoundRequest) -> Dict[str, Any]:
+    """
+    Apply round start (caller holds state_lock, see run_command).
+    """
     ensure_game_initialized()
     gs = game_state
 
-    with state_lock:
-        gs.start_round(req.news)
-        current_round = gs.current_round
+    gs.start_round(req.news)
+    current_round = gs.current_round
+    publish_snapshot(changed_teams=[])
+    defer(events.publish, EVENT_ROUND_START, {"round": current_round, "news": req.news})
 
     return {
         "message": f"Round {current_round} started.",
@@ -393,6 +1288,74 @@ def start_round(req: StartRoundRequest):
     }
 
 
+def cmd_trade(req: TradeRequest) -> Dict[str, Any]:
+    """
+    Apply one trade (caller holds state_lock, see run_command).
+    """
+    ensure_game_initialized()
+    global global_trade_counter
+
+    gs = game_state
+    clock = stage_clock
+
+    # ------------------ build dicts from legs ------------------ #
+    try:
+        give_dict = legs_to_dict(req.give)
+        receive_dict = legs_to_dict(req.receive)
+    except ValueError as e:
+        count_rejection(REJECT_INVALID_QTY)
+        raise HTTPException(status_code=400, detail=str(e))
+    clock.lap("parse")
+
+    # ------------------ apply trade ------------------ #
+    try:
+        gs.validate_trade(req.from_team, req.to_team, give_dict, receive_dict)
+        clock.lap("validate")
+        trade = gs.record_trade(
+            from_team=req.from_team,
+            to_team=req.to_team,
+            give=give_dict,
+            receive=receive_dict,
+            validated=True
+        )
+    except ValueError as e:
+        # expected game-rule errors: show as 400 for UI
+        count_rejection(getattr(e, "reason", ""))
+        raise HTTPException(status_code=400, detail=str(e))
+    clock.lap("record_trade")
+
+    # Update ratios based on net demand in this round
+    update_ratios_auto(gs)
+    clock.lap("ratio_update")
+    # Recompute rupee prices from updated ratios
+    update_prices_from_ratios(gs)
+    clock.lap("price_update")
+
+    # Update price history
+    global_trade_counter += 1
+    publish_new_trades()
+    record_price_snapshot()
+    clock.lap("price_snapshot")
+    publish_snapshot(changed_teams=[trade.from_team, trade.to_team])
+    clock.lap("publish_snapshot")
+
+    # Queue trade for the Excel writer (under the lock so TradeIDs
+    # follow trade order; the workbook save happens off this thread)
+    if excel_logger is not None:
+        defer(excel_logger.log_trade, trade)
+    clock.lap("excel_enqueue")
+    count_trades(1)
+
+    return {
+        "ok": True,
+        "round": trade.round_no,
+        "from_team": trade.from_team,
+        "to_team": trade.to_team,
+        "give": trade.give,
+        "receive": trade.receive
+    }
+
+
 @app.post("/trade")
 def post_trade(req: TradeRequest):
     """
@@ -400,87 +1363,135 @@ def post_trade(req: TradeRequest):
 
     - Validates quantities > 0.
     - Uses GameState.record_trade to enforce:
-        * Only 1 trade per pair per round.
+        * Only max_trades_per_pair trades (default 1) per pair per round.
     - After each trade:
         * Recompute ratios from net demand (update_ratios_auto)
         * Recompute prices from ratios (update_prices_from_ratios)
         * Increment global_trade_counter
         * Append price snapshot to price_history
-    - Logs trade to Excel.
-
-    Any unexpected error is caught and returned as a 400
-    instead of a 500, and printed in the server console.
+    - Queues the trade for the background Excel writer.
     """
-    ensure_game_initialized()
-    global game_state, excel_logger, global_trade_counter
+    return run_command(CMD_TRADE, req)
 
-    gs = game_state
 
-    try:
-        # ------------------ build dicts from legs ------------------ #
-        give_dict: Dict[str, int] = {}
-        for leg in req.give:
-            if leg.qty <= 0:
-                raise HTTPException(status_code=400, detail="Quantities must be positive.")
-            give_dict[leg.commodity] = give_dict.get(leg.commodity, 0) + leg.qty
-
-        receive_dict: Dict[str, int] = {}
-        for leg in req.receive:
-            if leg.qty <= 0:
-                raise HTTPException(status_code=400, detail="Quantities must be positive.")
-            receive_dict[leg.commodity] = receive_dict.get(leg.commodity, 0) + leg.qty
-
-        # ------------------ apply trade under lock ------------------ #
-        with state_lock:
-            try:
-                trade = gs.record_trade(
-                    from_team=req.from_team,
-                    to_team=req.to_team,
-                    give=give_dict,
-                    receive=receive_dict
-                )
-            except ValueError as e:
-                # expected game-rule errors: show as 400 for UI
-                raise HTTPException(status_code=400, detail=str(e))
+@app.post("/trade/batch")
+def post_trade_batch(req: TradeBatchRequest):
+    """
+    Record a batch of trades (e.g. a stack of paper trade slips).
+
+    - The whole batch is validated and applied under ONE state_lock
+      acquisition, in submission order.
+    - Each trade succeeds or fails on its own; failures do not stop
+      the rest of the batch.
+    - reprice = "per_trade": ratios, prices and the price snapshot are
+      updated after every trade (identical to calling /trade repeatedly).
+    - reprice = "per_batch": ratios and prices are updated once at the end,
+      with a single price snapshot covering all applied trades.
+    - Applied trades are queued for the background Excel writer.
 
-            # Update ratios based on net demand in this round
-            update_ratios_auto(gs)
-            # Recompute rupee prices from updated ratios
-            update_prices_from_ratios(gs)
+    Response:
+    {
+      "ok": false,
+      "applied": 2,
+      "rejected": 1,
+      "results": [
+        {"index": 0, "ok": true, "round": 1, "from_team": ..., "to_team": ...,
+         "give": {...}, "receive": {...}},
+        {"index": 1, "ok": false, "error": "Only one trade allowed ..."},
+        ...
+      ]
+    }
+    """
+    return run_command(CMD_TRADE_BATCH, req)
 
-            # Update price history
-            global_trade_counter += 1
-            record_price_snapshot()
 
-        # Log trade to Excel if logger exists
-        if excel_logger is not None:
-            # ExcelLogger.log_trade expects only the Trade object
-            excel_logger.log_trade(trade)
+def cmd_trade_batch(req: TradeBatchRequest) -> Dict[str, Any]:
+    """
+    Apply a trade batch (caller holds state_lock, see run_command).
+    """
+    ensure_game_initialized()
 
-        # If we reach here, trade succeeded
-        return {
-            "ok": True,
-            "round": trade.round_no,
-            "from_team": trade.from_team,
-            "to_team": trade.to_team,
-            "give": trade.give,
-            "receive": trade.receive
-        }
+    gs = game_state
+    clock = stage_clock
 
-    except HTTPException:
-        # Re-raise explicit HTTP errors unchanged
-        raise
-    except Exception as e:
-        # Catch-all for unexpected bugs; avoid 500s
-        import traceback
-        print("\n=== UNEXPECTED ERROR IN /trade ===")
-        traceback.print_exc()
-        print("==================================\n")
+    if req.reprice not in (REPRICE_PER_TRADE, REPRICE_PER_BATCH):
         raise HTTPException(
             status_code=400,
-            detail=f"Trade processing failed: {e}"
+            detail=f"reprice must be '{REPRICE_PER_TRADE}' or '{REPRICE_PER_BATCH}'."
         )
 
+    # Leg validation happens up front; bad slips are reported, not applied.
+    orders = []
+    leg_errors: Dict[int, str] = {}
+    for i, tr in enumerate(req.trades):
+        try:
+            orders.append((i, (tr.from_team, tr.to_team, legs_to_dict(tr.give), legs_to_dict(tr.receive))))
+        except ValueError as e:
+            leg_errors[i] = str(e)
+            count_rejection(REJECT_INVALID_QTY)
+    clock.lap("parse")
+
+    def after_reprice(n_trades: int):
+        global global_trade_counter
+        global_trade_counter += n_trades
+        publish_new_trades()
+        record_price_snapshot()
+
+    batch_results = gs.record_trades_batch(
+        [order for _, order in orders],
+        reprice=req.reprice,
+        after_reprice=after_reprice
+    )
+    clock.lap("record_batch")
+
+    changed_teams = set()
+    for res in batch_results:
+        if res.ok:
+            changed_teams.update((res.trade.from_team, res.trade.to_team))
+        else:
+            count_rejection(res.reason)
+    if changed_teams:
+        publish_snapshot(changed_teams=list(changed_teams))
+    clock.lap("publish_snapshot")
+
+    # Queue applied trades for the Excel writer
+    applied = 0
+    if excel_logger is not None:
+        for res in batch_results:
+            if res.ok:
+                defer(excel_logger.log_trade, res.trade)
+                applied += 1
+    else:
+        applied = sum(1 for res in batch_results if res.ok)
+    clock.lap("excel_enqueue")
+    count_trades(applied)
+
+    results: List[Dict[str, Any]] = [None] * len(req.trades)
+    for i, err in leg_errors.items():
+        results[i] = {"index": i, "ok": False, "error": err}
+    for (i, _), res in zip(orders, batch_results):
+        if res.ok:
+            trade = res.trade
+            results[i] = {
+                "index": i,
+                "ok": True,
+                "round": trade.round_no,
+                "from_team": trade.from_team,
+                "to_team": trade.to_team,
+                "give": trade.give,
+                "receive": trade.receive
+            }
+        else:
+            results[i] = {"index": i, "ok": False, "error": res.error}
+
+    applied = sum(1 for r in results if r["ok"])
+    return {
+        "ok": applied == len(results),
+        "applied": applied,
+        "rejected": len(results) - applied,
+        "results": results
+    }
+
 
 @app.post("/round/end")
 def end_round():
@@ -495,32 +1506,281 @@ def end_round():
     - If called again for the same round number, NO new penalties
       are applied and a message is returned.
     """
+    return run_command(CMD_END_ROUND)
+
+
+def cmd_end_round(req: None = None) -> Dict[str, Any]:
+    """
+    Apply round end (caller holds state_lock, see run_command).
+    """
+    global command_noop
+
     ensure_game_initialized()
-    global excel_logger, ended_rounds
     gs = game_state
 
-    with state_lock:
-        if gs.current_round == 0:
-            raise HTTPException(status_code=400, detail="No active round.")
+    if gs.current_round == 0:
+        raise HTTPException(status_code=400, detail="No active round.")
 
-        round_no = gs.current_round
+    round_no = gs.current_round
 
-        # If we already ended this round, do NOT re-apply penalties
-        if round_no in ended_rounds:
-            return {
-                "message": f"Round {round_no} was already ended earlier. "
-                           f"No additional penalties or logging applied."
-            }
+    # If we already ended this round, do NOT re-apply penalties
+    # (nor journal or checkpoint the repeat)
+    if round_no in ended_rounds:
+        command_noop = True
+        return {
+            "message": f"Round {round_no} was already ended earlier. "
+                       f"No additional penalties or logging applied."
+        }
+
+    clock = stage_clock
+
+    # Apply no-trade & min/max penalties for this round
+    breakdown = apply_round_penalties(gs, round_no)
+    clock.lap("penalties")
 
-        # Apply no-trade & min/max penalties for this round
-        apply_round_penalties(gs, round_no)
+    # Log commodities and portfolios for this round
+    if excel_logger is not None:
+        defer(excel_logger.log_commodities, gs.commodities, round_no)
+        defer(excel_logger.log_portfolios_round, gs)
+        # Rebuild barter_charter.xlsx in the background
+        defer(excel_logger.materialize, False)
+    clock.lap("excel_enqueue")
 
-        # Log commodities and portfolios for this round
+    # Mark this round as ended so we don't hit it twice
+    ended_rounds.add(round_no)
+    publish_snapshot(changed_teams=[])
+    clock.lap("publish_snapshot")
+
+    defer(events.publish, EVENT_PENALTIES, {
+        "round": round_no,
+        "teams": [
+            penalty_breakdown_to_dict(e) for e in breakdown.values() if e.total_rs > 0
+        ]
+    })
+    defer(events.publish, EVENT_ROUND_END, {"round": round_no})
+
+    penalized = [
+        penalty_breakdown_to_dict(e) for e in breakdown.values() if e.total_rs > 0
+    ]
+    return {
+        "message": f"Round {round_no} ended. Ratios, penalties and portfolios logged.",
+        "round": round_no,
+        "penalized_teams": penalized
+    }
+
+
+# ---------------------------------------------------------------------
+# Journal replay (crash recovery)
+# ---------------------------------------------------------------------
+
+# command name -> (handler, request model or None)
+COMMANDS: Dict[str, Any] = {
+    CMD_INIT_GAME: (cmd_init_game, InitGameRequest),
+    CMD_START_ROUND: (cmd_start_round, StartRoundRequest),
+    CMD_TRADE: (cmd_trade, TradeRequest),
+    CMD_TRADE_BATCH: (cmd_trade_batch, TradeBatchRequest),
+    CMD_END_ROUND: (cmd_end_round, None),
+}
+
+
+def replay_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Re-apply journal records in order, through the same command functions
+    the endpoints use. Does not write to the journal.
+    """
+    global replaying
+
+    started = time.perf_counter()
+    applied = 0
+    failed = 0
+    replaying = True
+    try:
+        for rec in records:
+            handler, model = COMMANDS.get(rec.get("cmd"), (None, None))
+            if handler is None:
+                print(f"[journal] seq {rec.get('seq')}: unknown command {rec.get('cmd')!r}, skipped")
+                failed += 1
+                continue
+            try:
+                req = model(**rec.get("args", {})) if model is not None else None
+                with state_lock:
+                    handler(req)
+                applied += 1
+            except HTTPException as e:
+                print(f"[journal] seq {rec.get('seq')}: {rec['cmd']} failed on replay: {e.detail}")
+                failed += 1
+            except ValidationError as e:
+                print(f"[journal] seq {rec.get('seq')}: {rec['cmd']} has invalid arguments, "
+                      f"skipped: {e.error_count()} error(s)")
+                failed += 1
+            except Exception as e:
+                # Malformed record (e.g. args not an object) or a handler bug:
+                # skip it like an unknown command instead of aborting recovery
+                print(f"[journal] seq {rec.get('seq')}: {rec['cmd']} raised on replay, "
+                      f"skipped: {type(e).__name__}: {e}")
+                failed += 1
+    finally:
+        replaying = False
+
+    if game_state is not None:
+        with state_lock:
+            publish_snapshot(full=True)
+
+    return {
+        "replayed": len(records),
+        "applied": applied,
+        "failed": failed,
+        "duration_s": time.perf_counter() - started,
+    }
+
+
+def restore_checkpoint(records: List[Dict[str, Any]]) -> int:
+    """
+    Install the state from CHECKPOINT_PATH if it belongs to this journal.
+    Returns the journal seq it covers (0 = nothing restored, replay all).
+    """
+    global game_state, price_history, global_trade_counter, trades_published
+    global game_epoch, excel_logger
+
+    if not CHECKPOINT_PATH or not records or not os.path.exists(CHECKPOINT_PATH):
+        return 0
+    try:
+        loaded = load_checkpoint(CHECKPOINT_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[checkpoint] ignoring {CHECKPOINT_PATH}: {e}")
+        return 0
+    meta = loaded.meta
+    if (meta.get("journal_first_ts") != records[0].get("ts")
+            or meta.get("journal_seq", 0) > records[-1].get("seq", 0)):
+        print(f"[checkpoint] {CHECKPOINT_PATH} does not match the journal, ignoring it")
+        return 0
+
+    with state_lock:
+        gs = loaded.game_state
+        gs.enable_holdings_matrix()
+        game_state = gs
+        game_epoch = f"{time.time_ns():x}"
+        price_history = loaded.price_history
+        global_trade_counter = meta["trade_counter"]
+        trades_published = len(gs.trades)
+        ended_rounds.clear()
+        ended_rounds.update(meta["ended_rounds"])
+
+        # Keep the Excel journal; rows re-logged by the replayed tail are
+        # de-duplicated when the workbook is built.
         if excel_logger is not None:
-            excel_logger.log_commodities(gs.commodities, round_no=round_no)
-            excel_logger.log_portfolios_round(gs)
+            excel_logger.close()
+        logger = ExcelLogger("barter_charter.xlsx", resume=True)
+        logger.trade_counter = len(gs.trades)
+        excel_logger = new_excel_writer(logger)
+
+        publish_snapshot(full=True)
+    return meta["journal_seq"]
+
 
-        # Mark this round as ended so we don't hit it twice
-        ended_rounds.add(round_no)
+def recover_from_journal() -> None:
+    """
+    Startup: load the checkpoint (if any), replay the journal after it,
+    and keep appending to the journal.
+    """
+    global command_journal, last_replay, last_checkpoint_seq
 
-    return {"message": f"Round {round_no} ended. Ratios, penalties and portfolios logged."}
+    if not JOURNAL_PATH:
+        return
+    if os.path.exists(JOURNAL_PATH):
+        records, good_bytes = read_records(JOURNAL_PATH)
+        torn = truncate_torn_tail(JOURNAL_PATH, good_bytes)
+
+        started = time.perf_counter()
+        checkpoint_seq = restore_checkpoint(records)
+        load_s = time.perf_counter() - started
+
+        last_replay = {
+            "records": len(records),
+            "checkpoint_seq": checkpoint_seq,
+            "checkpoint_load_s": load_s,
+            **replay_records([rec for rec in records if rec.get("seq", 0) > checkpoint_seq]),
+            "torn_tail_cut": torn,
+        }
+        last_replay["duration_s"] += load_s
+        last_checkpoint_seq = checkpoint_seq
+        print(
+            f"[journal] restored checkpoint at seq {checkpoint_seq}, replayed "
+            f"{last_replay['applied']}/{last_replay['replayed']} commands from {JOURNAL_PATH} "
+            f"in {last_replay['duration_s']:.3f}s"
+        )
+    command_journal = CommandJournal(JOURNAL_PATH, JOURNAL_FSYNC_EVERY, JOURNAL_FSYNC_INTERVAL_S)
+
+
+# ---------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------
+
+def setup_metrics() -> None:
+    """
+    Create the metrics registry and hook it into the app, state_lock and
+    Excel writer. Called once at import when BARTER_METRICS is set.
+    """
+    global metrics, metric_commands, metric_trades, metric_rejections, metric_excel_write
+
+    metrics = Registry(namespace="barter")
+    metric_commands = metrics.counter(
+        "commands_total", "Mutating commands applied.", ("command",)
+    )
+    metric_trades = metrics.counter("trades_total", "Trades applied.")
+    metric_rejections = metrics.counter(
+        "trade_rejections_total", "Trades rejected, by reason.", ("reason",)
+    )
+    metric_excel_write = metrics.histogram(
+        "excel_write_duration_seconds", "Excel writer journal saves and .xlsx rebuilds.", ("kind",)
+    )
+
+    lock_wait = metrics.histogram(
+        "state_lock_wait_seconds", "Time spent waiting for state_lock (0 when uncontended)."
+    )
+    lock_hold = metrics.histogram("state_lock_hold_seconds", "Time state_lock was held.")
+
+    def observe_lock(wait: float, hold: float):
+        lock_wait.observe(wait)
+        lock_hold.observe(hold)
+
+    state_lock.observer = observe_lock
+    metrics.counter_callback(
+        "state_lock_acquisitions_total", "state_lock acquisitions.",
+        lambda: state_lock.acquisitions
+    )
+    metrics.counter_callback(
+        "state_lock_contended_total", "state_lock acquisitions that had to wait.",
+        lambda: state_lock.contended
+    )
+    metrics.gauge_callback(
+        "price_history_points", "Price snapshots in the price history.",
+        lambda: len(price_history)
+    )
+    metrics.gauge_callback(
+        "trade_log_size", "Trades recorded in the current game.",
+        lambda: len(game_state.trades) if game_state is not None else None
+    )
+    metrics.gauge_callback(
+        "state_version", "Version of the published state snapshot.",
+        lambda: state_snapshot.version if state_snapshot is not None else None
+    )
+    metrics.gauge_callback(
+        "excel_queue_depth", "Events waiting for the Excel writer.",
+        lambda: excel_logger.stats()["queue_depth"] if excel_logger is not None else None
+    )
+    if excel_logger is not None:
+        excel_logger.observer = lambda kind, seconds: metric_excel_write.observe(seconds, (kind,))
+
+    app.add_middleware(
+        RequestMetricsMiddleware,
+        histogram=metrics.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.",
+            ("method", "path", "status")
+        ),
+        skip=("/stream", "/metrics"),
+    )
+
+
+if METRICS_ENABLED:
+    setup_metrics()
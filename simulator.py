@@ -0,0 +1,624 @@
+"""
+simulator.py
+
+Headless Monte Carlo simulator for tuning the market parameters. It
+covers the sensitivity and circuit_pct arguments of update_ratios_auto
+and the two penalty rates of apply_round_penalties.
+
+Each game drives a GameState directly, with no HTTP and no Excel, and
+follows the same order of operations as the server:
+
+- portfolios come from generate_initial_portfolios_with_ranges
+- in every round each team takes turns proposing trades to other teams
+- ratios and prices are updated after every accepted trade
+- penalties are applied when the round ends
+
+Teams are played by agent strategies (see STRATEGIES):
+
+- random:     random commodities to give and to receive
+- momentum:   buys what has risen since the previous round opened,
+              sells what has fallen
+- contrarian: the opposite of momentum
+- hoarder:    keeps buying one favourite commodity, ignoring its max band
+
+Trades are value-balanced at current prices. Every team keeps its own
+holdings inside the min/max bands, whether it proposes or accepts a
+trade; the only exception is a hoarder's favourite commodity. The agents
+do not react to the penalty rates, so sweeping the rates changes how
+much penalties cost but not how often they are charged.
+
+For every parameter set the simulator reports, as mean and spread over
+the games:
+
+- price volatility:
+  - the standard deviation of per-trade log price changes, averaged over
+    the non-base commodities
+  - the mean absolute log move from round open to round close
+- circuit-breaker hit rate:
+  - the share of per-commodity ratio updates that were clamped
+  - the share of (round, commodity) pairs clamped at least once
+- leaderboard spread at the end of the game:
+  - (best - worst) / mean effective value
+  - the coefficient of variation
+- penalty incidence:
+  - the share of team-rounds charged the no-trade penalty
+  - the share of team-rounds charged the band penalty
+  - total penalties as a share of the starting value
+- the mean return for each strategy (final effective value / starting
+  value - 1)
+
+Games run across a process pool in chunks. Game i uses the same seed
+under every parameter set (common random numbers), so game-to-game noise
+does not drown out the differences between parameter sets. Every game
+starts from the same portfolios, because portfolio generation is
+deterministic for a given config. Games differ in which team plays which
+strategy and in the agents' choices.
+
+    python simulator.py                                       # defaults, one parameter set
+    python simulator.py --sensitivity 0.3,0.5,0.7 --circuit-pct 0.1,0.2,0.3 --games 2000
+    python simulator.py --mix momentum=1 --games 500 --out momentum.json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from game_engine import (
+    Commodity,
+    GameState,
+    Team,
+    TradeRejected,
+    apply_round_penalties,
+    generate_initial_portfolios_with_ranges,
+    update_prices_from_ratios,
+    update_ratios_auto,
+)
+from percentiles import percentile
+
+COMMODITIES = [
+    ("Land", 1), ("Gold", 4), ("Oil", 8), ("Wheat", 20), ("Steel", 10),
+    ("Copper", 12), ("Cotton", 25), ("Silver", 6), ("Coal", 30), ("Rice", 18),
+]
+BASE_COMMODITY = "Land"
+TARGET_VALUE = 2_000_000.0
+
+# Games per task sent to a worker process
+CHUNK_SIZE = 25
+
+
+@dataclass(frozen=True)
+class Params:
+    """
+    One point of the parameter grid (engine defaults).
+    """
+    sensitivity: float = 0.5
+    circuit_pct: float = 0.20
+    no_trade_penalty_rate: float = 0.10
+    range_penalty_rate: float = 0.10
+
+
+@dataclass(frozen=True)
+class GameConfig:
+    """
+    Shape of every simulated game (the same for all parameter sets).
+    """
+    teams: int = 20
+    rounds: int = 3
+    turns: int = 4                  # turns per team per round
+    activity: float = 0.5           # chance a team uses a turn
+    trade_size: float = 0.05        # max share of its value a team trades at once
+    max_trades_per_pair: int = 1
+    partner_tries: int = 5          # partners asked before a turn is given up
+    mix: Tuple[Tuple[str, float], ...] = (
+        ("random", 0.4), ("momentum", 0.2), ("contrarian", 0.2), ("hoarder", 0.2),
+    )
+
+
+# ---------------------------------------------------------------------
+# Market view and agents
+# ---------------------------------------------------------------------
+
+class Market:
+    """
+    What agents see of the market: prices, and the move of every price
+    since the previous round opened (since the game started in round 1).
+    """
+
+    def __init__(self, gs: GameState):
+        self.gs = gs
+        self.names = list(gs.commodities)
+        self.base = gs.base_commodity
+        self._reference = self.prices()
+        self._last_open = self._reference
+
+    def prices(self) -> Dict[str, float]:
+        return {cname: c.price for cname, c in self.gs.commodities.items()}
+
+    def open_round(self):
+        self._reference = self._last_open
+        self._last_open = self.prices()
+
+    def trend(self, cname: str) -> float:
+        return self.gs.commodities[cname].price / self._reference[cname] - 1.0
+
+
+class Agent(ABC):
+    """
+    Base strategy. choose() returns the (give, receive) commodities for
+    this turn, or None to pass. The simulator picks the partner and the
+    quantities.
+    """
+
+    name = ""
+
+    def __init__(self, team: str, rng: random.Random):
+        self.team = team
+        self.rng = rng
+
+    def band_exempt(self, cname: str) -> bool:
+        """
+        True if the agent ignores the max band of this commodity.
+        """
+        return False
+
+    @abstractmethod
+    def choose(self, market: Market, holdings) -> Optional[Tuple[str, str]]:
+        """
+        (give, receive) commodity names for this turn, or None to pass.
+        """
+
+
+class RandomAgent(Agent):
+    name = "random"
+
+    def choose(self, market, holdings):
+        give, receive = self.rng.sample(market.names, 2)
+        return give, receive
+
+
+class MomentumAgent(Agent):
+    """
+    Receives one of the two best performers, gives one of the two worst.
+    """
+
+    name = "momentum"
+    direction = 1.0
+
+    def choose(self, market, holdings):
+        # Random tie-break: every trend is 0 before the first trade
+        ranked = sorted(
+            market.names,
+            key=lambda c: (self.direction * market.trend(c), self.rng.random()),
+            reverse=True,
+        )
+        receive = self.rng.choice(ranked[:2])
+        give = self.rng.choice([c for c in ranked[-2:] if c != receive] or ranked[-3:-2])
+        return give, receive
+
+
+class ContrarianAgent(MomentumAgent):
+    name = "contrarian"
+    direction = -1.0
+
+
+class HoarderAgent(Agent):
+    """
+    Always receives its favourite (non-base) commodity and gives whatever
+    else it holds the most of by value.
+    """
+
+    name = "hoarder"
+
+    def __init__(self, team, market, rng):
+        super().__init__(team, rng)
+        self.favourite = rng.choice([c for c in market.names if c != market.base])
+
+    def band_exempt(self, cname):
+        return cname == self.favourite
+
+    def choose(self, market, holdings):
+        commodities = market.gs.commodities
+        give = max(
+            (c for c in market.names if c != self.favourite),
+            key=lambda c: holdings.get(c, 0) * commodities[c].price,
+        )
+        return give, self.favourite
+
+
+STRATEGIES = {cls.name: cls for cls in (RandomAgent, MomentumAgent, ContrarianAgent, HoarderAgent)}
+
+
+def new_agent(name: str, team: str, market: Market, rng: random.Random) -> Agent:
+    """
+    Agent of the named strategy. Only the hoarder needs the market (to
+    pick its favourite commodity).
+    """
+    if name == HoarderAgent.name:
+        return HoarderAgent(team, market, rng)
+    return STRATEGIES[name](team, rng)
+
+
+def assign_strategies(n_teams: int, mix: Sequence[Tuple[str, float]], rng: random.Random) -> List[str]:
+    """
+    Strategy per team in proportion to the mix weights (largest
+    remainder), in random order.
+    """
+    total = sum(w for _, w in mix)
+    exact = [(name, n_teams * w / total) for name, w in mix]
+    counts = {name: int(x) for name, x in exact}
+    by_remainder = sorted(exact, key=lambda item: item[1] - int(item[1]), reverse=True)
+    for name, _ in by_remainder[:n_teams - sum(counts.values())]:
+        counts[name] += 1
+    out = [name for name, _ in mix for _ in range(counts[name])]
+    rng.shuffle(out)
+    return out
+
+
+# ---------------------------------------------------------------------
+# One game
+# ---------------------------------------------------------------------
+
+def new_game(config: GameConfig) -> GameState:
+    """
+    Game set up like /admin/init_game, with portfolios generated.
+    """
+    gs = GameState(max_trades_per_pair=config.max_trades_per_pair)
+    for name, ratio in COMMODITIES:
+        gs.commodities[name] = Commodity(name=name, price=0.0, base_ratio=ratio)
+    gs.base_commodity = BASE_COMMODITY
+    update_prices_from_ratios(gs)
+    gs.teams = {f"Team {i + 1}": Team(name=f"Team {i + 1}") for i in range(config.teams)}
+    generate_initial_portfolios_with_ranges(gs, TARGET_VALUE)
+    gs.enable_holdings_matrix()
+    return gs
+
+
+def _spare(gs: GameState, holdings, cname: str) -> int:
+    """
+    Units that can leave a team without breaking its min band.
+    """
+    return holdings.get(cname, 0) - gs.commodities[cname].min_units
+
+
+def _room(gs: GameState, agent: Agent, holdings, cname: str) -> int:
+    """
+    Units a team can take without breaking its max band.
+    """
+    max_units = gs.commodities[cname].max_units
+    if not max_units or agent.band_exempt(cname):
+        return sys.maxsize
+    return max_units - holdings.get(cname, 0)
+
+
+def propose(gs: GameState, market: Market, agents: Dict[str, Agent], agent: Agent,
+            config: GameConfig, rng: random.Random
+            ) -> Optional[Tuple[str, str, Dict[str, int], Dict[str, int]]]:
+    """
+    Turn the agent's choice into a value-balanced order with a partner
+    that can take it, or None if no deal fits both teams' bands.
+    """
+    teams = gs.teams
+    holdings = teams[agent.team].holdings
+    pick = agent.choose(market, holdings)
+    if pick is None:
+        return None
+    give, receive = pick
+    price_g = gs.commodities[give].price
+    price_r = gs.commodities[receive].price
+
+    budget = rng.uniform(0.2, 1.0) * config.trade_size * teams[agent.team].value_rs(gs.commodities)
+    max_give = min(int(budget / price_g), _spare(gs, holdings, give))
+    max_receive = _room(gs, agent, holdings, receive)
+    if max_give < 1 or max_receive < 1:
+        return None
+
+    others = [t for t in teams if t != agent.team]
+    for partner in rng.sample(others, min(config.partner_tries, len(others))):
+        if gs.pair_trade_count(agent.team, partner) >= gs.max_trades_per_pair:
+            continue
+        p_holdings = teams[partner].holdings
+        can_receive = min(max_receive, _spare(gs, p_holdings, receive))
+        qty_give = min(max_give, _room(gs, agents[partner], p_holdings, give),
+                       int(can_receive * price_r / price_g))
+        qty_receive = int(round(qty_give * price_g / price_r))
+        if qty_give >= 1 and 1 <= qty_receive <= can_receive:
+            return agent.team, partner, {give: qty_give}, {receive: qty_receive}
+    return None
+
+
+def play_game(params: Params, config: GameConfig, seed: int) -> Dict[str, Any]:
+    """
+    Play one full game and return its metrics.
+    """
+    rng = random.Random(seed)
+    gs = new_game(config)
+    start_values = gs.team_values_rs()
+    market = Market(gs)
+    strategies = assign_strategies(len(gs.teams), config.mix, rng)
+    agents = {
+        tname: new_agent(name, tname, market, rng)
+        for tname, name in zip(gs.teams, strategies)
+    }
+    order = list(agents.values())
+    traded = [c for c in market.names if c != market.base]
+
+    trades = no_deal = updates = clamp_hits = clamped_pairs = 0
+    rejected: Counter = Counter()
+    # per commodity: [n, sum, sum of squares] of per-trade log price changes
+    moments = {cname: [0, 0.0, 0.0] for cname in traded}
+    round_moves: List[float] = []
+    team_rounds = no_trade = band = 0
+    penalties_rs = 0.0
+
+    for round_no in range(1, config.rounds + 1):
+        gs.start_round(f"Simulated round {round_no}")
+        market.open_round()
+        open_prices = market.prices()
+        last = dict(open_prices)
+        clamped_round = set()
+
+        for _ in range(config.turns):
+            rng.shuffle(order)
+            for agent in order:
+                if rng.random() >= config.activity:
+                    continue
+                proposal = propose(gs, market, agents, agent, config, rng)
+                if proposal is None:
+                    no_deal += 1
+                    continue
+                try:
+                    gs.record_trade(*proposal)
+                except TradeRejected as e:
+                    rejected[e.reason] += 1
+                    continue
+                trades += 1
+                clamped = update_ratios_auto(gs, params.sensitivity, params.circuit_pct)
+                update_prices_from_ratios(gs)
+                updates += 1
+                clamp_hits += len(clamped)
+                clamped_round.update(clamped)
+                for cname in traded:
+                    price = gs.commodities[cname].price
+                    r = math.log(price / last[cname])
+                    m = moments[cname]
+                    m[0] += 1
+                    m[1] += r
+                    m[2] += r * r
+                    last[cname] = price
+
+        round_moves.extend(abs(math.log(last[c] / open_prices[c])) for c in traded)
+        clamped_pairs += len(clamped_round)
+
+        breakdown = apply_round_penalties(
+            gs, round_no, params.no_trade_penalty_rate, params.range_penalty_rate
+        )
+        for entry in breakdown.values():
+            team_rounds += 1
+            no_trade += not entry.traded
+            band += bool(entry.violated_commodities)
+            penalties_rs += entry.total_rs
+
+    stdevs = []
+    for n, total, squares in moments.values():
+        if n > 1:
+            mean = total / n
+            stdevs.append(math.sqrt(max(0.0, squares / n - mean * mean)))
+
+    effective = {e.name: e.effective_value_rs for e in gs.leaderboard_entries()}
+    values = list(effective.values())
+    mean_value = sum(values) / len(values)
+    sd_value = math.sqrt(sum((v - mean_value) ** 2 for v in values) / len(values))
+    returns: Dict[str, List[float]] = {}
+    for tname, agent in agents.items():
+        returns.setdefault(agent.name, []).append(effective[tname] / start_values[tname] - 1.0)
+
+    return {
+        "trades": trades,
+        "no_deal": no_deal,
+        "rejected": dict(rejected),
+        "volatility": sum(stdevs) / len(stdevs) if stdevs else 0.0,
+        "round_move": sum(round_moves) / len(round_moves) if round_moves else 0.0,
+        "circuit_hit_rate": clamp_hits / (updates * len(traded)) if updates else 0.0,
+        "circuit_round_rate": clamped_pairs / (config.rounds * len(traded)),
+        "spread": (max(values) - min(values)) / mean_value if mean_value else 0.0,
+        "cv": sd_value / mean_value if mean_value else 0.0,
+        "no_trade_rate": no_trade / team_rounds,
+        "band_rate": band / team_rounds,
+        "penalty_share": penalties_rs / sum(start_values.values()),
+        "returns": {name: sum(r) / len(r) for name, r in returns.items()},
+    }
+
+
+def run_chunk(params: Params, config: GameConfig, seeds: Sequence[int]) -> List[Dict[str, Any]]:
+    return [play_game(params, config, seed) for seed in seeds]
+
+
+# ---------------------------------------------------------------------
+# Sweep and aggregation
+# ---------------------------------------------------------------------
+
+METRICS = [
+    "volatility", "round_move", "circuit_hit_rate", "circuit_round_rate",
+    "spread", "cv", "no_trade_rate", "band_rate", "penalty_share", "trades",
+]
+
+
+def describe(values: List[float]) -> Dict[str, float]:
+    """
+    mean / sd / p5 / p50 / p95 over games.
+    """
+    ordered = sorted(values)
+    n = len(ordered)
+    mean = sum(ordered) / n
+    return {
+        "mean": mean,
+        "sd": math.sqrt(sum((v - mean) ** 2 for v in ordered) / n),
+        "p5": percentile(ordered, 5),
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+    }
+
+
+def aggregate(params: Params, games: List[Dict[str, Any]]) -> Dict[str, Any]:
+    returns: Dict[str, List[float]] = {}
+    rejected: Counter = Counter()
+    for g in games:
+        for name, r in g["returns"].items():
+            returns.setdefault(name, []).append(r)
+        rejected.update(g["rejected"])
+    return {
+        "params": asdict(params),
+        "games": len(games),
+        "metrics": {m: describe([g[m] for g in games]) for m in METRICS},
+        "returns": {name: describe(r) for name, r in sorted(returns.items())},
+        "no_deal": sum(g["no_deal"] for g in games),
+        "rejected": dict(rejected),
+    }
+
+
+def sweep(grid: List[Params], config: GameConfig, games: int, seed: int,
+          workers: int) -> List[Dict[str, Any]]:
+    """
+    Play `games` games for every parameter set. Game i has the same seed
+    under every parameter set.
+    """
+    seeds = [random.Random(f"{seed}-{i}").getrandbits(64) for i in range(games)]
+    chunks = [seeds[i:i + CHUNK_SIZE] for i in range(0, games, CHUNK_SIZE)]
+    if workers <= 1:
+        return [aggregate(p, run_chunk(p, config, seeds)) for p in grid]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [[pool.submit(run_chunk, p, config, chunk) for chunk in chunks] for p in grid]
+        return [
+            aggregate(p, [g for f in fs for g in f.result()])
+            for p, fs in zip(grid, futures)
+        ]
+
+
+# ---------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------
+
+def parse_floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def parse_mix(text: str) -> Tuple[Tuple[str, float], ...]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in STRATEGIES:
+            raise argparse.ArgumentTypeError(
+                f"unknown strategy {name!r} (choose from {', '.join(STRATEGIES)})"
+            )
+        mix.append((name, float(weight) if weight else 1.0))
+    if sum(w for _, w in mix) <= 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than 0")
+    return tuple(mix)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    print(f"{'sens':>5} {'circ':>5} {'nt%':>5} {'band%':>5} | {'vol/trade':>9} {'rnd move':>8} "
+          f"{'cb hit':>7} {'cb rnds':>7} | {'spread':>7} {'cv':>6} | {'no-trade':>8} "
+          f"{'band':>6} {'pen/val':>7} | {'trades':>6}")
+    for r in results:
+        p, m = r["params"], r["metrics"]
+        print(f"{p['sensitivity']:5.2f} {p['circuit_pct']:5.2f} {p['no_trade_penalty_rate']:5.2f} "
+              f"{p['range_penalty_rate']:5.2f} | {m['volatility']['mean']:9.4f} "
+              f"{m['round_move']['mean']:8.4f} {m['circuit_hit_rate']['mean']:7.1%} "
+              f"{m['circuit_round_rate']['mean']:7.1%} | {m['spread']['mean']:7.2%} "
+              f"{m['cv']['mean']:6.2%} | {m['no_trade_rate']['mean']:8.1%} "
+              f"{m['band_rate']['mean']:6.1%} {m['penalty_share']['mean']:7.2%} | "
+              f"{m['trades']['mean']:6.0f}")
+    print()
+    names = sorted({name for r in results for name in r["returns"]})
+    print(f"{'sens':>5} {'circ':>5} {'nt%':>5} {'band%':>5} | "
+          + " ".join(f"{name:>11}" for name in names) + "   (mean return per strategy)")
+    for r in results:
+        p = r["params"]
+        cells = [
+            f"{r['returns'][name]['mean']:11.2%}" if name in r["returns"] else f"{'-':>11}"
+            for name in names
+        ]
+        print(f"{p['sensitivity']:5.2f} {p['circuit_pct']:5.2f} {p['no_trade_penalty_rate']:5.2f} "
+              f"{p['range_penalty_rate']:5.2f} | " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sensitivity", type=parse_floats, default=[0.5],
+                        help="comma-separated values to sweep")
+    parser.add_argument("--circuit-pct", type=parse_floats, default=[0.20])
+    parser.add_argument("--no-trade-rate", type=parse_floats, default=[0.10])
+    parser.add_argument("--range-rate", type=parse_floats, default=[0.10])
+    parser.add_argument("--games", type=int, default=1000, help="games per parameter set")
+    parser.add_argument("--teams", type=int, default=GameConfig.teams)
+    parser.add_argument("--rounds", type=int, default=GameConfig.rounds)
+    parser.add_argument("--turns", type=int, default=GameConfig.turns,
+                        help="turns per team per round")
+    parser.add_argument("--activity", type=float, default=GameConfig.activity,
+                        help="chance a team uses a turn")
+    parser.add_argument("--trade-size", type=float, default=GameConfig.trade_size,
+                        help="max share of its value a team trades at once")
+    parser.add_argument("--max-trades-per-pair", type=int, default=GameConfig.max_trades_per_pair)
+    parser.add_argument("--mix", type=parse_mix, default=GameConfig.mix,
+                        help="strategy weights, e.g. random=2,momentum=1,hoarder=1")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.games <= 0 or args.teams < 2 or args.rounds <= 0:
+        parser.error("--games and --rounds must be positive and --teams at least 2")
+
+    config = GameConfig(
+        teams=args.teams, rounds=args.rounds, turns=args.turns, activity=args.activity,
+        trade_size=args.trade_size, max_trades_per_pair=args.max_trades_per_pair, mix=args.mix,
+    )
+    grid = [
+        Params(s, c, nt, rr)
+        for s, c, nt, rr in itertools.product(
+            args.sensitivity, args.circuit_pct, args.no_trade_rate, args.range_rate
+        )
+    ]
+
+    started = time.perf_counter()
+    results = sweep(grid, config, args.games, args.seed, args.workers)
+    elapsed = time.perf_counter() - started
+    total = args.games * len(grid)
+    print(f"{total} games ({len(grid)} parameter sets x {args.games}) in {elapsed:.1f}s "
+          f"({total / elapsed:.0f} games/s, {args.workers} workers)")
+    print()
+    print_report(results)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "config": asdict(config),
+                    "games": args.games,
+                    "seed": args.seed,
+                    "workers": args.workers,
+                    "elapsed_s": elapsed,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\nresults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+state_snapshot.py
+
+Immutable, copy-on-write snapshots of a GameState for lock-free reads.
+
+The server mutates GameState under state_lock. After each committed
+mutation it calls take_snapshot() (still under the lock) and swaps the
+result into a global in one assignment. Read endpoints only ever look
+at the latest snapshot, so they:
+
+- never wait for state_lock,
+- never see a half-applied trade or a trade without its price update.
+
+Publishing cost is proportional to what changed:
+
+- teams:        only the teams named in changed_teams are copied; every
+                other Team object is shared with the previous snapshot
+- commodities:  copied (prices change after every trade anyway)
+- penalties:    copied only when a round's penalties were applied
+- round totals: only the current round's entry is rebuilt
+- trades / price history: not copied at all; both are append-only, so
+                the snapshot keeps a reference plus a row-count watermark
+- team values / leaderboard: taken from the GameState, which keeps them
+                up to date incrementally (HoldingsMatrix,
+                IncrementalLeaderboard); values are reused from the
+                previous snapshot when neither holdings nor prices moved
+
+Nothing in a snapshot may be mutated after it is published.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from game_engine import (
+    Commodity,
+    GameState,
+    LeaderboardEntry,
+    PenaltyBreakdown,
+    Team,
+    Trade,
+    TradeLog,
+)
+from price_history import PriceHistory
+
+
+@dataclass(frozen=True)
+class RoundTotals:
+    """
+    Frozen copy of one round's RoundIndex aggregates.
+    """
+    net_demand: Dict[str, float]
+    gross_volume: Dict[str, float]
+    active_teams: FrozenSet[str]
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """
+    Read-only view of the game at one state version.
+
+    epoch + version identify the snapshot (the server's ETag).
+    trade_count / price_rows are the watermarks into the shared,
+    append-only trades and price_history.
+    leaderboard is GameState.leaderboard_entries() at this version (best
+    effective value first); values_rs / values_in_base are per team.
+    """
+    epoch: str
+    version: int
+    current_round: int
+    base_commodity: str
+    commodities: Dict[str, Commodity]
+    teams: Dict[str, Team]
+    penalties_rs: Dict[str, float]
+    penalty_history: Dict[int, Dict[str, PenaltyBreakdown]]
+    round_totals: Dict[int, RoundTotals]
+    trades: TradeLog
+    trade_count: int
+    price_history: PriceHistory
+    price_rows: int
+    values_rs: Dict[str, float]
+    values_in_base: Dict[str, float]
+    leaderboard: List[LeaderboardEntry]
+
+    # -----------------------------------------------------
+    # Round / trade reads
+    # -----------------------------------------------------
+
+    def teams_without_trades(self, round_no: Optional[int] = None) -> List[str]:
+        if round_no is None:
+            round_no = self.current_round
+        totals = self.round_totals.get(round_no)
+        if totals is None:
+            return list(self.teams.keys())
+        return [tname for tname in self.teams if tname not in totals.active_teams]
+
+    def round_net_demand(self, round_no: int) -> Dict[str, float]:
+        net = {cname: 0.0 for cname in self.commodities.keys()}
+        totals = self.round_totals.get(round_no)
+        if totals is not None:
+            net.update(totals.net_demand)
+        return net
+
+    def round_gross_volume(self, round_no: int) -> Dict[str, float]:
+        gross = {cname: 0.0 for cname in self.commodities.keys()}
+        totals = self.round_totals.get(round_no)
+        if totals is not None:
+            gross.update(totals.gross_volume)
+        return gross
+
+    def trade_rows(self, round_no: Optional[int] = None) -> Iterable[Tuple[int, Trade]]:
+        """
+        (trade_id, Trade) for trades up to the watermark, optionally one round only.
+        """
+        if round_no is None:
+            return ((tid, self.trades[tid]) for tid in range(self.trade_count))
+        return self.trades.in_round(round_no, stop=self.trade_count)
+
+
+def _copy_team(team: Team) -> Team:
+    holdings = team.holdings
+    if not isinstance(holdings, dict):
+        holdings = holdings.to_dict()  # HoldingsView: one row read
+    return Team(name=team.name, holdings=dict(holdings))
+
+
+def _copy_commodity(c: Commodity) -> Commodity:
+    # Shallow copy that keeps attributes set outside the dataclass fields
+    # (alloc_min_units / alloc_max_units); much cheaper than copy.copy.
+    dup = Commodity.__new__(Commodity)
+    dup.__dict__.update(c.__dict__)
+    return dup
+
+
+def _prices_changed(old: Dict[str, Commodity], new: Dict[str, Commodity]) -> bool:
+    if old.keys() != new.keys():
+        return True
+    for cname, c in new.items():
+        o = old[cname]
+        if o.price != c.price or o.base_ratio != c.base_ratio:
+            return True
+    return False
+
+
+def _round_totals(gs: GameState, round_no: int) -> Optional[RoundTotals]:
+    idx = gs.round_index.get(round_no)
+    if idx is None:
+        return None
+    return RoundTotals(
+        net_demand=dict(idx.net_demand),
+        gross_volume=dict(idx.gross_volume),
+        active_teams=frozenset(idx.active_teams),
+    )
+
+
+def take_snapshot(
+    gs: GameState,
+    epoch: str,
+    price_history: PriceHistory,
+    previous: Optional[StateSnapshot] = None,
+    changed_teams: Optional[Iterable[str]] = None,
+) -> StateSnapshot:
+    """
+    Snapshot gs. Call with the state lock held, after the mutation is complete.
+
+    previous:
+        The last published snapshot of the same game. Unchanged parts are
+        shared with it. Pass None for a full copy (e.g. after init).
+    changed_teams:
+        Teams whose holdings changed since `previous`. None means "unknown":
+        every team is copied.
+    """
+    reuse = (
+        previous is not None
+        and previous.epoch == epoch
+        and previous.trades is gs.trades
+        and len(previous.teams) == len(gs.teams)
+    )
+
+    # Teams: share unchanged Team copies with the previous snapshot
+    if reuse and changed_teams is not None:
+        teams = dict(previous.teams)
+        for tname in changed_teams:
+            teams[tname] = _copy_team(gs.teams[tname])
+    else:
+        teams = {tname: _copy_team(t) for tname, t in gs.teams.items()}
+
+    # Penalties only change when a round's penalties are applied
+    if reuse and len(previous.penalty_history) == len(gs.penalty_history):
+        penalties_rs = previous.penalties_rs
+        penalty_history = previous.penalty_history
+    else:
+        penalties_rs = dict(gs.penalties_rs)
+        penalty_history = dict(gs.penalty_history)
+
+    # Team values: unchanged unless holdings or prices / ratios moved
+    if (reuse and changed_teams is not None and not changed_teams
+            and not _prices_changed(previous.commodities, gs.commodities)):
+        values_rs = previous.values_rs
+        values_in_base = previous.values_in_base
+    else:
+        values_rs = gs.team_values_rs()
+        values_in_base = gs.team_values_in_base()
+
+    # Round totals: only the current round can have moved
+    if reuse:
+        round_totals = previous.round_totals
+        if (previous.trade_count != len(gs.trades)
+                or gs.current_round not in round_totals):
+            round_totals = dict(round_totals)
+            totals = _round_totals(gs, gs.current_round)
+            if totals is not None:
+                round_totals[gs.current_round] = totals
+    else:
+        round_totals = {}
+        for round_no in gs.round_index:
+            round_totals[round_no] = _round_totals(gs, round_no)
+
+    return StateSnapshot(
+        epoch=epoch,
+        version=gs.version,
+        current_round=gs.current_round,
+        base_commodity=gs.base_commodity,
+        commodities={cname: _copy_commodity(c) for cname, c in gs.commodities.items()},
+        teams=teams,
+        penalties_rs=penalties_rs,
+        penalty_history=penalty_history,
+        round_totals=round_totals,
+        trades=gs.trades,
+        trade_count=len(gs.trades),
+        price_history=price_history,
+        price_rows=len(price_history),
+        values_rs=values_rs,
+        values_in_base=values_in_base,
+        # Replaced (never modified) by IncrementalLeaderboard on change
+        leaderboard=gs.leaderboard_entries(),
+    )
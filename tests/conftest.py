@@ -0,0 +1,88 @@
+"""
+Shared fixtures. The modules live at the repository root, one level up.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_engine import Commodity, GameState, Team, update_prices_from_ratios  # noqa: E402
+
+
+def small_game(holdings=None, max_trades_per_pair: int = 1, matrix: bool = False) -> GameState:
+    """
+    Three teams, three commodities, round 1 open. holdings defaults to
+    10 of everything for every team.
+    """
+    gs = GameState(max_trades_per_pair=max_trades_per_pair)
+    for name, ratio in (("Land", 1), ("Gold", 4), ("Oil", 8)):
+        gs.commodities[name] = Commodity(name=name, price=0.0, base_ratio=ratio)
+    gs.base_commodity = "Land"
+    update_prices_from_ratios(gs)
+    if holdings is None:
+        holdings = {t: {"Land": 10, "Gold": 10, "Oil": 10} for t in ("A", "B", "C")}
+    gs.teams = {t: Team(name=t, holdings=dict(h)) for t, h in holdings.items()}
+    if matrix:
+        gs.enable_holdings_matrix()
+    gs.start_round("Test round")
+    return gs
+
+
+def state_of(gs: GameState) -> dict:
+    """
+    Everything a rejected trade must leave untouched.
+    """
+    return {
+        "holdings": {tname: dict(t.holdings) for tname, t in gs.teams.items()},
+        "ratios": {cname: c.base_ratio for cname, c in gs.commodities.items()},
+        "trades": len(gs.trades),
+        "version": gs.version,
+        "net_demand": gs.round_net_demand(gs.current_round),
+    }
+
+
+@pytest.fixture(params=[False, True], ids=["dict_holdings", "matrix_holdings"])
+def matrix(request):
+    if request.param:
+        pytest.importorskip("numpy")
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """
+    A fresh server module for each test module. server.py reads its
+    journal/checkpoint settings at import, so it is (re)imported inside a
+    temp directory with the env pointing there.
+    """
+    workdir = tmp_path_factory.mktemp("server")
+    env = {
+        "BARTER_JOURNAL": str(workdir / "commands.jsonl"),
+        "BARTER_JOURNAL_FSYNC_EVERY": "0",
+        "BARTER_CHECKPOINT": str(workdir / "checkpoint.bin"),
+        "BARTER_CHECKPOINT_EVERY": "25",
+    }
+    saved_env = {k: os.environ.get(k) for k in env}
+    saved_cwd = os.getcwd()
+    os.environ.update(env)
+    os.chdir(workdir)
+    try:
+        if "server" in sys.modules:
+            module = importlib.reload(sys.modules["server"])
+        else:
+            module = importlib.import_module("server")
+        yield module
+        for name in ("excel_logger", "checkpoint_writer", "command_journal"):
+            if getattr(module, name) is not None:
+                getattr(module, name).close()
+    finally:
+        os.chdir(saved_cwd)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
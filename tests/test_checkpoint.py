@@ -0,0 +1,110 @@
+"""
+Binary checkpoint encode/decode.
+"""
+
+import copy
+import random
+
+import pytest
+
+from checkpoint import capture_checkpoint, decode_checkpoint, encode_checkpoint
+from game_engine import apply_round_penalties
+from price_history import PriceHistory
+from state_snapshot import take_snapshot
+
+
+def played_game(matrix: bool):
+    """
+    Game with two ended rounds (penalties applied) and an open third one.
+    """
+    from bench_engine import TradeSource, new_game
+    from game_engine import generate_initial_portfolios_with_ranges, update_prices_from_ratios, \
+        update_ratios_auto
+
+    gs = new_game(12, 6)
+    generate_initial_portfolios_with_ranges(gs, 2_000_000.0)
+    if matrix:
+        gs.enable_holdings_matrix()
+    history = PriceHistory(gs.commodities.keys())
+    history.record(0, 0, {c: x.price for c, x in gs.commodities.items()})
+    source = TradeSource(gs, seed=4)
+    rng = random.Random(4)
+    n = 0
+    for round_no in (1, 2, 3):
+        gs.start_round(f"Round {round_no}")
+        for _ in range(20):
+            a, b, give, receive = source()
+            give = {c: rng.randint(1, 3) for c in give}
+            try:
+                gs.record_trade(a, b, give, receive)
+            except ValueError:
+                continue
+            update_ratios_auto(gs)
+            update_prices_from_ratios(gs)
+            n += 1
+            history.record(n, round_no, {c: x.price for c, x in gs.commodities.items()})
+        if round_no < 3:
+            apply_round_penalties(gs, round_no)
+    return gs, history
+
+
+def fingerprint(gs, history) -> dict:
+    return copy.deepcopy({
+        "holdings": {t: dict(team.holdings) for t, team in gs.teams.items()},
+        "commodities": {c: dict(vars(x)) for c, x in gs.commodities.items()},
+        "base": gs.base_commodity,
+        "round": gs.current_round,
+        "rounds": [(r.round_no, r.news) for r in gs.rounds],
+        "open_ratios": dict(gs.round_open_ratios),
+        "max_trades_per_pair": gs.max_trades_per_pair,
+        "trades": list(gs.trades),
+        "penalties": gs.penalties_rs,
+        "penalty_history": gs.penalty_history,
+        "version": gs.version,
+        "pairs": {r: idx.pair_counts for r, idx in gs.round_index.items()},
+        "net_demand": {r: gs.round_net_demand(r) for r in gs.round_index},
+        "leaderboard": [(e.name, round(e.effective_value_rs, 6)) for e in gs.leaderboard_entries()],
+        "prices": history.as_columns(),
+    })
+
+
+@pytest.mark.parametrize("matrix", [False, True], ids=["dict_holdings", "matrix_holdings"])
+def test_checkpoint_round_trip(matrix):
+    if matrix:
+        pytest.importorskip("numpy")
+    gs, history = played_game(matrix)
+    snap = take_snapshot(gs, "epoch", history)
+    meta = {"journal_seq": 42, "ended_rounds": [1, 2]}
+    raw = encode_checkpoint(capture_checkpoint(gs, snap, meta))
+
+    loaded = decode_checkpoint(raw)
+    assert loaded.meta == meta
+    assert fingerprint(loaded.game_state, loaded.price_history) == fingerprint(gs, history)
+    # The restored state keeps working like the original
+    assert loaded.game_state.teams_without_trades(3) == gs.teams_without_trades(3)
+
+
+def test_checkpoint_is_a_snapshot():
+    gs, history = played_game(matrix=False)
+    snap = take_snapshot(gs, "epoch", history)
+    data = capture_checkpoint(gs, snap, {})
+    expected = fingerprint(gs, history)
+
+    # Changes after the capture are not in the checkpoint
+    a, b = list(gs.teams)[:2]
+    gs.record_trade(a, b, {"C1": 1}, {})
+    history.record(999, 3, {c: x.price for c, x in gs.commodities.items()})
+
+    loaded = decode_checkpoint(encode_checkpoint(data))
+    assert fingerprint(loaded.game_state, loaded.price_history) == expected
+
+
+def test_checkpoint_rejects_bad_input():
+    gs, history = played_game(matrix=False)
+    raw = encode_checkpoint(capture_checkpoint(gs, take_snapshot(gs, "e", history), {}))
+    with pytest.raises(ValueError, match="Not a Barter Charter"):
+        decode_checkpoint(b"X" * len(raw))
+    with pytest.raises(ValueError, match="truncated"):
+        decode_checkpoint(raw[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        decode_checkpoint(raw[:5])
@@ -0,0 +1,65 @@
+"""
+AsyncExcelWriter: producers never block, and open_log switches logs on
+the writer thread.
+"""
+
+import json
+import threading
+
+from excel_logger import AsyncExcelWriter, ExcelLogger
+from game_engine import Trade
+
+
+def trade(i: int) -> Trade:
+    return Trade(1, f"Team {i}", "Team 0", {"Gold": i}, {"Oil": 1})
+
+
+def trade_ids(logger: ExcelLogger):
+    with open(logger.journal_path("Trades"), encoding="utf-8") as f:
+        return [json.loads(line)[0] for line in f]
+
+
+def test_full_queue_drops_rows_instead_of_blocking(tmp_path):
+    entered, release = threading.Event(), threading.Event()
+    logger = ExcelLogger(str(tmp_path / "log.xlsx"))
+
+    def slow_logger():
+        entered.set()
+        release.wait(10)
+        return logger
+
+    writer = AsyncExcelWriter(max_queue=2)
+    writer.open_log(slow_logger)   # writer thread is stuck here until release
+    assert entered.wait(10)
+    for i in range(1, 6):
+        writer.log_trade(trade(i))
+    stats = writer.stats()
+    assert stats["queue_depth"] == 2
+    assert stats["dropped_events"] == 3
+
+    release.set()
+    assert writer.flush(timeout=10)
+    writer.log_trade(trade(6))
+    writer.close()
+    # Dropped trades keep their TradeIDs
+    assert trade_ids(logger) == [1, 2, 6]
+
+
+def test_open_log_switches_logs(tmp_path):
+    first = ExcelLogger(str(tmp_path / "first.xlsx"))
+    second = []
+
+    def new_logger():
+        second.append(ExcelLogger(str(tmp_path / "second.xlsx")))
+        return second[0]
+
+    writer = AsyncExcelWriter(first)
+    writer.log_trade(trade(1))
+    writer.log_trade(trade(2))
+    writer.open_log(new_logger)
+    writer.log_trade(trade(3))
+    writer.close()
+
+    assert trade_ids(first) == [1, 2]
+    assert trade_ids(second[0]) == [1]
+    assert (tmp_path / "first.xlsx").exists() and (tmp_path / "second.xlsx").exists()
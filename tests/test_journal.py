@@ -0,0 +1,51 @@
+"""
+Command journal file format: append, reopen, reset and torn tails.
+"""
+
+import json
+
+from command_journal import CommandJournal, read_records, truncate_torn_tail
+
+
+def test_journal_append_read_reopen(tmp_path):
+    path = str(tmp_path / "commands.jsonl")
+    journal = CommandJournal(path, fsync_every=1)
+    assert journal.append("init_game", {"num_teams": 3}) == 1
+    assert journal.append("trade", {"from_team": "Team 1"}) == 2
+    first_ts = journal.first_ts
+    journal.close()
+
+    records, good_bytes = read_records(path)
+    assert [(r["seq"], r["cmd"], r["args"]) for r in records] == [
+        (1, "init_game", {"num_teams": 3}),
+        (2, "trade", {"from_team": "Team 1"}),
+    ]
+    assert records[0]["ts"] == first_ts
+
+    # Reopening continues the sequence; reset starts over
+    journal = CommandJournal(path, fsync_every=0)
+    assert journal.last_seq == 2 and journal.first_ts == first_ts
+    assert journal.append("end_round", {}) == 3
+    journal.reset()
+    assert journal.last_seq == 0 and journal.first_ts is None
+    journal.close()
+    assert read_records(path) == ([], 0)
+
+
+def test_journal_torn_tail(tmp_path):
+    path = str(tmp_path / "commands.jsonl")
+    journal = CommandJournal(path, fsync_every=0)
+    journal.append("start_round", {"news": "a"})
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(json.dumps({"seq": 2, "cmd": "trade"}).encode()[:12])
+
+    records, good_bytes = read_records(path)
+    assert [r["seq"] for r in records] == [1]
+    assert truncate_torn_tail(path, good_bytes)
+    assert not truncate_torn_tail(path, good_bytes)
+
+    journal = CommandJournal(path, fsync_every=0)
+    assert journal.append("end_round", {}) == 2
+    journal.close()
+    assert [r["seq"] for r in read_records(path)[0]] == [1, 2]
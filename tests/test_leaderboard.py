@@ -0,0 +1,69 @@
+"""
+IncrementalLeaderboard against a full recompute.
+"""
+
+import random
+
+from conftest import small_game
+from game_engine import IncrementalLeaderboard, apply_round_penalties, update_prices_from_ratios
+
+
+def full_recompute(gs):
+    return [(e.name, e.effective_value_rs) for e in IncrementalLeaderboard().entries(gs)]
+
+
+def rows(entries):
+    return [(e.name, e.effective_value_rs) for e in entries]
+
+
+def four_teams(matrix: bool):
+    # A and B hold the same portfolio: always tied
+    holdings = {
+        "A": {"Land": 10, "Gold": 10, "Oil": 10},
+        "B": {"Land": 10, "Gold": 10, "Oil": 10},
+        "C": {"Land": 40, "Gold": 40, "Oil": 40},
+        "D": {"Land": 40, "Gold": 40, "Oil": 40},
+    }
+    return small_game(holdings, max_trades_per_pair=1000, matrix=matrix)
+
+
+def test_matches_full_recompute(matrix):
+    gs = four_teams(matrix)
+    rng = random.Random(2)
+    for step in range(300):
+        if step % 7 == 0:
+            gs.commodities[rng.choice(["Gold", "Oil"])].base_ratio = rng.randint(2, 9)
+            update_prices_from_ratios(gs)
+        else:
+            a, b = rng.sample(["C", "D"], 2)
+            gs.record_trade(a, b, {"Gold": rng.randint(0, 1)}, {"Oil": rng.randint(0, 1)})
+        if step % 50 == 49:
+            apply_round_penalties(gs, gs.current_round)
+            gs.start_round("Next")
+        entries = gs.leaderboard_entries()
+        assert [n for n, _ in rows(entries)] == [n for n, _ in full_recompute(gs)]
+        for (_, got), (_, want) in zip(rows(entries), full_recompute(gs)):
+            assert abs(got - want) < 1e-6
+        # Tied teams keep their insertion order
+        names = [e.name for e in entries]
+        assert names.index("A") < names.index("B")
+
+
+def test_trade_moves_only_its_teams():
+    holdings = {f"T{i}": {"Land": 10 + i, "Gold": 10, "Oil": 10} for i in range(12)}
+    gs = small_game(holdings)
+    before = gs.leaderboard_entries()
+    version = gs.leaderboard_version
+
+    gs.record_trade("T0", "T11", {"Land": 5}, {"Gold": 1})
+    after = gs.leaderboard_entries()
+    assert gs.leaderboard_version == version + 1
+    assert after is not before                    # published lists are never modified
+    assert rows(before) != rows(after)
+    reused = {e.name for e in after if any(e is old for old in before)}
+    assert reused == set(holdings) - {"T0", "T11"}
+    assert rows(after) == full_recompute(gs)
+
+    # Nothing changed: same list, same version
+    assert gs.leaderboard_entries() is after
+    assert gs.leaderboard_version == version + 1
@@ -0,0 +1,36 @@
+"""
+Per-round pair index behind the one-trade-per-pair rule.
+"""
+
+import pytest
+
+from conftest import small_game, state_of
+from game_engine import REJECT_PAIR_LIMIT, TradeRejected
+
+
+def test_pair_limit_is_unordered(matrix):
+    gs = small_game(matrix=matrix, max_trades_per_pair=2)
+    gs.record_trade("A", "B", {"Gold": 1}, {"Oil": 1})
+    gs.record_trade("B", "A", {"Gold": 1}, {"Oil": 1})
+    assert gs.pair_trade_count("A", "B") == gs.pair_trade_count("B", "A") == 2
+    before = state_of(gs)
+    with pytest.raises(TradeRejected) as exc:
+        gs.record_trade("A", "B", {"Gold": 1}, {"Oil": 1})
+    assert exc.value.reason == REJECT_PAIR_LIMIT
+    assert "Only 2 trades" in str(exc.value)
+    assert state_of(gs) == before
+    gs.record_trade("A", "C", {"Gold": 1}, {"Oil": 1})  # other pairs unaffected
+
+
+def test_pair_limit_is_per_round():
+    gs = small_game()
+    gs.record_trade("A", "B", {"Gold": 1}, {"Oil": 1})
+    with pytest.raises(TradeRejected):
+        gs.record_trade("B", "A", {"Gold": 1}, {"Oil": 1})
+
+    gs.start_round("Next round")
+    assert gs.pair_trade_count("A", "B") == 0
+    assert gs.pair_trade_count("A", "B", round_no=1) == 1
+    gs.record_trade("B", "A", {"Gold": 1}, {"Oil": 1})
+    assert gs.pair_trade_count("A", "B", round_no=2) == 1
+    assert gs.pair_trade_count("A", "B", round_no=9) == 0
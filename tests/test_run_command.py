@@ -0,0 +1,81 @@
+"""
+run_command: what other processes see of a command, and when.
+"""
+
+import pytest
+from fastapi import HTTPException
+
+
+def start_game(server):
+    server.run_command(server.CMD_INIT_GAME, server.InitGameRequest(
+        commodities=[{"name": "Land", "ratio": 1}, {"name": "Gold", "ratio": 4}],
+        base_commodity="Land",
+        num_teams=4,
+        target_value_hint=100_000,
+    ))
+    server.run_command(server.CMD_START_ROUND, server.StartRoundRequest(news="Round"))
+
+
+def trade(server, a: str, b: str):
+    return server.TradeRequest(
+        from_team=a, to_team=b,
+        give=[{"commodity": "Land", "qty": 1}],
+        receive=[{"commodity": "Gold", "qty": 1}],
+    )
+
+
+def test_side_effects_follow_the_journal_write(server, monkeypatch):
+    start_game(server)
+    rows = []
+    monkeypatch.setattr(server.excel_logger, "log_trade", rows.append)
+    seq = server.events.last_seq
+    journaled = server.command_journal.last_seq
+
+    server.run_command(server.CMD_TRADE, trade(server, "Team 1", "Team 2"))
+    assert server.command_journal.last_seq == journaled + 1
+    assert server.events.last_seq == seq + 2    # trade + price tick
+    assert [(t.from_team, t.to_team) for t in rows] == [("Team 1", "Team 2")]
+
+
+def test_failed_journal_write_releases_no_side_effects(server, monkeypatch):
+    start_game(server)
+    rows = []
+    monkeypatch.setattr(server.excel_logger, "log_trade", rows.append)
+    monkeypatch.setattr(server, "journal_error", None)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(server.command_journal, "append", fail)
+    seq = server.events.last_seq
+    snapshot = server.state_snapshot
+
+    with pytest.raises(HTTPException) as exc:
+        server.run_command(server.CMD_TRADE, trade(server, "Team 1", "Team 2"))
+    assert exc.value.status_code == 503
+    assert server.events.last_seq == seq
+    assert rows == []
+    assert server.state_snapshot is snapshot
+
+    # Read-only from now on
+    with pytest.raises(HTTPException) as exc:
+        server.run_command(server.CMD_TRADE, trade(server, "Team 3", "Team 4"))
+    assert exc.value.status_code == 503
+    assert "read-only" in exc.value.detail
+
+
+def test_repeated_round_end_is_not_journaled(server, monkeypatch):
+    start_game(server)
+    checkpoints = []
+    monkeypatch.setattr(server, "take_checkpoint", lambda: checkpoints.append(1))
+    journaled = server.command_journal.last_seq
+
+    first = server.run_command(server.CMD_END_ROUND)
+    assert first["round"] == 1
+    assert server.command_journal.last_seq == journaled + 1
+    assert checkpoints == [1]
+
+    again = server.run_command(server.CMD_END_ROUND)
+    assert "already ended" in again["message"]
+    assert server.command_journal.last_seq == journaled + 1
+    assert checkpoints == [1]
@@ -0,0 +1,163 @@
+"""
+Hypergeometric samplers and portfolio generation built on them.
+"""
+
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import game_engine
+from game_engine import (
+    _hypergeometric_hrua,
+    generate_initial_portfolios_with_ranges,
+    new_portfolio_pool,
+    sample_hypergeometric,
+    sample_multivariate_hypergeometric,
+)
+
+
+def hypergeometric_pmf(good: int, bad: int, nsample: int):
+    total = math.comb(good + bad, nsample)
+    lo, hi = max(0, nsample - bad), min(good, nsample)
+    return {k: math.comb(good, k) * math.comb(bad, nsample - k) / total for k in range(lo, hi + 1)}
+
+
+def total_variation(draws, pmf) -> float:
+    n = len(draws)
+    counts = Counter(draws)
+    return 0.5 * sum(abs(counts.get(k, 0) / n - p) for k, p in pmf.items()) \
+        + 0.5 * sum(c / n for k, c in counts.items() if k not in pmf)
+
+
+@pytest.mark.parametrize("good, bad, nsample, expected", [
+    (5, 5, 0, 0),
+    (0, 5, 3, 0),
+    (5, 0, 3, 3),
+    (4, 6, 10, 4),
+    (4, 6, 12, 4),
+    (9, 1, 10, 9),   # lo == hi
+])
+def test_degenerate_cases(good, bad, nsample, expected):
+    assert sample_hypergeometric(random.Random(1), good, bad, nsample) == expected
+
+
+@pytest.mark.parametrize("good, bad, nsample", [
+    (3, 7, 4),        # tiny
+    (30, 50, 40),     # inversion, symmetric-ish
+    (200, 20, 50),    # good > bad
+    (10, 990, 300),   # rare goods
+])
+def test_inversion_matches_exact_pmf(good, bad, nsample):
+    rng = random.Random(7)
+    draws = [sample_hypergeometric(rng, good, bad, nsample) for _ in range(20_000)]
+    assert total_variation(draws, hypergeometric_pmf(good, bad, nsample)) < 0.02
+
+
+@pytest.mark.parametrize("good, bad, nsample", [
+    (30, 50, 40),
+    (50, 30, 60),     # good > bad and nsample > total / 2
+    (400, 600, 300),
+])
+def test_hrua_matches_exact_pmf(good, bad, nsample):
+    rng = random.Random(11)
+    draws = [_hypergeometric_hrua(rng, good, bad, nsample) for _ in range(20_000)]
+    assert total_variation(draws, hypergeometric_pmf(good, bad, nsample)) < 0.025
+
+
+def test_large_population_uses_hrua_and_has_right_moments():
+    good, bad, nsample = 600_000, 400_000, 500_000
+    total = good + bad
+    mean = nsample * good / total
+    var = nsample * (good / total) * (bad / total) * (total - nsample) / (total - 1)
+    assert var > game_engine._HYPERGEOM_INVERSION_MAX_SD ** 2
+
+    rng = random.Random(3)
+    draws = [sample_hypergeometric(rng, good, bad, nsample) for _ in range(5_000)]
+    sample_mean = sum(draws) / len(draws)
+    sample_var = sum((d - sample_mean) ** 2 for d in draws) / (len(draws) - 1)
+    assert abs(sample_mean - mean) < 5 * math.sqrt(var / len(draws))
+    assert 0.9 < sample_var / var < 1.1
+    assert all(nsample - bad <= d <= min(good, nsample) for d in draws)
+
+
+def test_multivariate_respects_capacities_and_total():
+    rng = random.Random(5)
+    capacities = [0, 3, 50, 7, 200, 1]
+    for nsample in (0, 1, 10, 100, sum(capacities)):
+        counts = sample_multivariate_hypergeometric(rng, capacities, nsample)
+        assert sum(counts) == nsample
+        assert all(0 <= c <= cap for c, cap in zip(counts, capacities))
+
+
+def test_multivariate_marginals():
+    rng = random.Random(9)
+    capacities = [10, 40, 25, 25]
+    nsample = 30
+    n = 10_000
+    sums = [0] * len(capacities)
+    for _ in range(n):
+        for i, c in enumerate(sample_multivariate_hypergeometric(rng, capacities, nsample)):
+            sums[i] += c
+    total = sum(capacities)
+    for i, cap in enumerate(capacities):
+        assert abs(sums[i] / n - nsample * cap / total) < 0.1
+
+
+def test_multivariate_is_deterministic_per_seed():
+    capacities = [12, 40, 7, 300]
+    a = sample_multivariate_hypergeometric(random.Random(42), capacities, 90)
+    b = sample_multivariate_hypergeometric(random.Random(42), capacities, 90)
+    assert a == b
+
+
+def portfolio_game(n_teams: int):
+    from bench_engine import new_game
+    return new_game(n_teams, 10)
+
+
+def test_portfolios_identical_for_any_worker_count():
+    n_teams = game_engine._PARALLEL_MIN_TEAMS
+    game_engine._PORTFOLIO_CACHE.clear()
+    serial = portfolio_game(n_teams)
+    value = generate_initial_portfolios_with_ranges(serial, 2_000_000.0, workers=1)
+
+    game_engine._PORTFOLIO_CACHE.clear()
+    pooled = portfolio_game(n_teams)
+    assert generate_initial_portfolios_with_ranges(pooled, 2_000_000.0, workers=2) == value
+
+    assert [dict(t.holdings) for t in serial.teams.values()] == \
+        [dict(t.holdings) for t in pooled.teams.values()]
+
+
+def test_portfolios_on_a_long_lived_pool():
+    n_teams = game_engine._PARALLEL_MIN_TEAMS
+    game_engine._PORTFOLIO_CACHE.clear()
+    serial = portfolio_game(n_teams)
+    generate_initial_portfolios_with_ranges(serial, 2_000_000.0, workers=1)
+    expected = [dict(t.holdings) for t in serial.teams.values()]
+
+    pool = new_portfolio_pool(2)
+    try:
+        for workers in (2, 3):  # the same pool serves any chunk count
+            game_engine._PORTFOLIO_CACHE.clear()
+            gs = portfolio_game(n_teams)
+            generate_initial_portfolios_with_ranges(gs, 2_000_000.0, workers=workers, pool=pool)
+            assert [dict(t.holdings) for t in gs.teams.values()] == expected
+    finally:
+        pool.shutdown()
+
+
+def test_portfolios_stay_inside_bands_and_reuse_cache():
+    game_engine._PORTFOLIO_CACHE.clear()
+    gs = portfolio_game(50)
+    generate_initial_portfolios_with_ranges(gs, 2_000_000.0)
+    first = [dict(t.holdings) for t in gs.teams.values()]
+    for team in gs.teams.values():
+        for cname, c in gs.commodities.items():
+            assert c.min_units <= team.holdings[cname] <= c.max_units
+
+    again = portfolio_game(50)
+    generate_initial_portfolios_with_ranges(again, 2_000_000.0)
+    assert [dict(t.holdings) for t in again.teams.values()] == first
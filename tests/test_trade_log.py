@@ -0,0 +1,83 @@
+"""
+Columnar TradeLog: Trade round-trips, per-round reads, columns() / from_columns().
+"""
+
+import pytest
+
+from game_engine import Commodity, GameState, Team, Trade, TradeLog
+
+TRADES = [
+    Trade(1, "A", "B", {"Gold": 2}, {"Oil": 1}),
+    Trade(1, "B", "C", {"Oil": 3, "Land": 1}, {"Gold": 4}),
+    Trade(2, "C", "A", {}, {"Land": 5}),
+    Trade(2, "A", "D", {"Silver": 7}, {"Gold": 1, "Oil": 2}),
+    Trade(3, "D", "B", {"Gold": 1}, {}),
+]
+
+
+def test_trades_round_trip():
+    log = TradeLog(TRADES)
+    assert len(log) == len(TRADES)
+    assert bool(log) and not TradeLog()
+    assert list(log) == TRADES
+    assert [log[i] for i in range(len(TRADES))] == TRADES
+    assert log[-1] == TRADES[-1]
+    assert log[1:4] == TRADES[1:4]
+    with pytest.raises(IndexError):
+        log[len(TRADES)]
+    with pytest.raises(IndexError):
+        log[-len(TRADES) - 1]
+
+
+def test_rebuilt_trades_are_copies():
+    log = TradeLog(TRADES[:1])
+    log[0].give["Gold"] = 99
+    assert log[0].give == {"Gold": 2}
+
+
+def test_in_round():
+    log = TradeLog(TRADES)
+    assert list(log.in_round(2)) == [(2, TRADES[2]), (3, TRADES[3])]
+    assert list(log.in_round(2, stop=3)) == [(2, TRADES[2])]
+    assert list(log.in_round(9)) == []
+
+
+@pytest.mark.parametrize("stop", [None, 0, 2, 5, 50])
+def test_columns_from_columns_round_trip(stop):
+    log = TradeLog(TRADES)
+    kept = TRADES if stop is None else TRADES[:stop]
+    copy = TradeLog.from_columns(log.team_names, log.commodity_names, log.columns(stop=stop))
+    assert list(copy) == kept
+    for round_no in (1, 2, 3):
+        assert [t for _, t in copy.in_round(round_no)] == [t for t in kept if t.round_no == round_no]
+
+    # The copy is independent and keeps appending correctly
+    extra = Trade(3, "E", "A", {"Copper": 1}, {"Gold": 1})
+    copy.append(extra)
+    assert list(copy) == kept + [extra]
+    assert list(log) == TRADES
+
+
+def test_columns_are_copies():
+    log = TradeLog(TRADES)
+    cols = log.columns()
+    cols["leg_qty"][0] = 1000
+    assert log[0].give == {"Gold": 2}
+
+
+def test_game_state_from_trade_list_rebuilds_indexes():
+    gs = GameState(
+        commodities={c: Commodity(name=c, price=1.0, base_ratio=1)
+                     for c in ("Land", "Gold", "Oil", "Silver")},
+        teams={t: Team(name=t) for t in "ABCD"},
+        trades=TRADES,
+    )
+    assert isinstance(gs.trades, TradeLog)
+    assert gs.pair_trade_count("A", "B", round_no=1) == 1
+    assert gs.pair_trade_count("D", "A", round_no=2) == 1
+    assert gs.team_trade_count("A", round_no=2) == 2
+    # Net demand from from_team's point of view: receive +, give -
+    demand = gs.round_net_demand(1)
+    assert demand["Gold"] == -2 + 4
+    assert demand["Oil"] == 1 - 3
+    assert gs.teams_without_trades(3) == ["A", "C"]
@@ -0,0 +1,150 @@
+"""
+validate_trade / record_trade atomicity and record_trades_batch.
+"""
+
+import pytest
+
+from conftest import small_game, state_of
+from game_engine import (
+    REJECT_INSUFFICIENT_HOLDINGS,
+    REJECT_NEGATIVE_QTY,
+    REJECT_NO_ACTIVE_ROUND,
+    REJECT_PAIR_LIMIT,
+    REJECT_UNKNOWN_COMMODITY,
+    REJECT_UNKNOWN_TEAM,
+    REPRICE_PER_BATCH,
+    REPRICE_PER_TRADE,
+    GameState,
+    TradeRejected,
+    update_prices_from_ratios,
+    update_ratios_auto,
+)
+
+
+@pytest.mark.parametrize("args, reason", [
+    (("A", "Z", {"Gold": 1}, {"Oil": 1}), REJECT_UNKNOWN_TEAM),
+    (("A", "B", {"Tin": 1}, {"Oil": 1}), REJECT_UNKNOWN_COMMODITY),
+    (("A", "B", {"Gold": -1}, {"Oil": 1}), REJECT_NEGATIVE_QTY),
+    (("A", "B", {"Gold": 1}, {"Oil": -1}), REJECT_NEGATIVE_QTY),
+    (("A", "B", {"Gold": 11}, {"Oil": 1}), REJECT_INSUFFICIENT_HOLDINGS),
+    (("A", "B", {"Gold": 1}, {"Oil": 11}), REJECT_INSUFFICIENT_HOLDINGS),
+    # First give leg fits, second does not: nothing may be moved
+    (("A", "B", {"Gold": 5, "Oil": 11}, {"Land": 1}), REJECT_INSUFFICIENT_HOLDINGS),
+    # Both receive legs are checked before anything moves
+    (("A", "B", {"Gold": 1}, {"Land": 2, "Oil": 11}), REJECT_INSUFFICIENT_HOLDINGS),
+])
+def test_rejected_trade_changes_nothing(matrix, args, reason):
+    gs = small_game(matrix=matrix)
+    before = state_of(gs)
+    with pytest.raises(TradeRejected) as exc:
+        gs.record_trade(*args)
+    assert exc.value.reason == reason
+    assert isinstance(exc.value, ValueError)
+    assert state_of(gs) == before
+
+
+def test_no_active_round():
+    gs = GameState()
+    with pytest.raises(TradeRejected) as exc:
+        gs.validate_trade("A", "B", {}, {})
+    assert exc.value.reason == REJECT_NO_ACTIVE_ROUND
+
+
+def test_receive_legs_may_use_what_was_just_given(matrix):
+    holdings = {
+        "A": {"Land": 0, "Gold": 5, "Oil": 0},
+        "B": {"Land": 0, "Gold": 0, "Oil": 0},
+    }
+    gs = small_game(holdings, matrix=matrix)
+    # B owns no Gold, but receives 5 before handing 2 back
+    gs.record_trade("A", "B", {"Gold": 5}, {"Gold": 2})
+    assert gs.teams["A"].holdings["Gold"] == 2
+    assert gs.teams["B"].holdings["Gold"] == 3
+
+
+def test_validate_then_record_validated_matches_record(matrix):
+    a = small_game(matrix=matrix)
+    b = small_game(matrix=matrix)
+    args = ("A", "B", {"Gold": 3, "Land": 1}, {"Oil": 2})
+    a.validate_trade(*args)
+    a.record_trade(*args, validated=True)
+    b.record_trade(*args)
+    assert state_of(a) == state_of(b)
+    assert a.trades[0] == b.trades[0]
+
+
+ORDERS = [
+    ("A", "B", {"Gold": 2}, {"Oil": 1}),
+    ("A", "B", {"Gold": 1}, {"Oil": 1}),      # pair limit
+    ("B", "C", {"Oil": 3}, {"Land": 2}),
+    ("C", "A", {"Gold": 50}, {"Land": 1}),    # insufficient holdings
+    ("C", "A", {"Land": 4}, {"Gold": 1, "Oil": 1}),
+]
+
+
+def sequential(gs, orders, reprice_each: bool):
+    for order in orders:
+        try:
+            gs.record_trade(*order)
+        except ValueError:
+            continue
+        if reprice_each:
+            update_ratios_auto(gs)
+            update_prices_from_ratios(gs)
+    if not reprice_each:
+        update_ratios_auto(gs)
+        update_prices_from_ratios(gs)
+
+
+def prices_of(gs):
+    return {cname: (c.base_ratio, c.price) for cname, c in gs.commodities.items()}
+
+
+def test_batch_per_trade_matches_one_by_one(matrix):
+    batch = small_game(matrix=matrix)
+    one_by_one = small_game(matrix=matrix)
+    calls = []
+    results = batch.record_trades_batch(ORDERS, REPRICE_PER_TRADE, after_reprice=calls.append)
+    sequential(one_by_one, ORDERS, reprice_each=True)
+
+    assert [r.ok for r in results] == [True, False, True, False, True]
+    assert [r.index for r in results] == list(range(len(ORDERS)))
+    assert results[1].reason == REJECT_PAIR_LIMIT
+    assert results[3].reason == REJECT_INSUFFICIENT_HOLDINGS
+    assert results[3].error
+    assert calls == [1, 1, 1]
+    assert state_of(batch)["holdings"] == state_of(one_by_one)["holdings"]
+    assert prices_of(batch) == prices_of(one_by_one)
+    assert list(batch.trades) == list(one_by_one.trades)
+
+
+def test_batch_per_batch_reprices_once(matrix):
+    batch = small_game(matrix=matrix)
+    one_by_one = small_game(matrix=matrix)
+    calls = []
+    results = batch.record_trades_batch(ORDERS, REPRICE_PER_BATCH, after_reprice=calls.append)
+    sequential(one_by_one, ORDERS, reprice_each=False)
+
+    assert sum(r.ok for r in results) == 3
+    assert calls == [3]
+    assert state_of(batch)["holdings"] == state_of(one_by_one)["holdings"]
+    assert prices_of(batch) == prices_of(one_by_one)
+
+
+def test_batch_per_batch_without_applied_trades_does_not_reprice():
+    gs = small_game()
+    before = prices_of(gs)
+    calls = []
+    results = gs.record_trades_batch(
+        [("A", "Z", {"Gold": 1}, {"Oil": 1})], REPRICE_PER_BATCH, after_reprice=calls.append
+    )
+    assert not results[0].ok and results[0].reason == REJECT_UNKNOWN_TEAM
+    assert calls == []
+    assert prices_of(gs) == before
+
+
+def test_batch_rejects_unknown_reprice_mode():
+    gs = small_game()
+    with pytest.raises(ValueError):
+        gs.record_trades_batch(ORDERS, reprice="sometimes")
+    assert len(gs.trades) == 0